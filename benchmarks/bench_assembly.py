@@ -0,0 +1,62 @@
+"""
+Сравнение сборки таблицы фичей: цепочка merge (как было в FeatureManager) против FeatureAssembler.
+
+Запуск: python benchmarks/bench_assembly.py --customers 1500000 --features 11
+"""
+import argparse
+import gc
+import numpy as np
+import pandas as pd
+from functools import partial
+from common import measure_isolated
+from feature_assembler import FeatureAssembler
+
+
+def make_data(n_customers: int, n_features: int, coverage: float = 0.7, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(n_customers).astype(np.int64) * 13 + 1_000_000
+    customers = pd.DataFrame({"customer_mindbox_id": ids})
+    results = []
+    for i in range(n_features):
+        feature_ids = rng.permutation(ids)[: int(n_customers * coverage)]
+        values = rng.integers(0, 1000, size=len(feature_ids)) if i % 2 else rng.random(len(feature_ids))
+        results.append(pd.DataFrame({"customer_mindbox_id": feature_ids, f"feature_{i}": values}))
+    return customers, results
+
+
+def merge_chain(data) -> pd.DataFrame:
+    customers, results = data
+    for df in results:
+        customers = customers.merge(df, on="customer_mindbox_id", how="left")
+        gc.collect()
+    return customers
+
+
+def assemble(data) -> pd.DataFrame:
+    customers, results = data
+    assembler = FeatureAssembler(customers)
+    for df in results:
+        assembler.add(df)
+    return assembler.build()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=1_500_000)
+    parser.add_argument("--features", type=int, default=11)
+    args = parser.parse_args()
+
+    setup = partial(make_data, args.customers, args.features)
+    expected = merge_chain(setup())
+    pd.testing.assert_frame_equal(assemble(setup()), expected)
+    del expected
+
+    print(f"{args.customers} клиентов, {args.features} фичей")
+    print(f"{'метод':<12} {'время, с':>10} {'пик RSS, МБ':>12} {'прирост RSS, МБ':>16}")
+    for name, stage in (("merge", merge_chain), ("assembler", assemble)):
+        result = measure_isolated(setup, stage)
+        print(f"{name:<12} {result['seconds']:>10.2f} {result['peak_rss_mb']:>12.0f} {result['stage_rss_mb']:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
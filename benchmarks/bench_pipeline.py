@@ -0,0 +1,223 @@
+"""
+Бенчмарки этапов конвейера на синтетических данных dbo_mb (synthetic_data) в локальной
+SQLite (sqlite_standin): Feature.calculate, FeatureManager.generate_features, upload_file
+и Model.predict. Каждый этап выполняется в отдельном процессе (measure_isolated).
+
+Результаты сохраняются в benchmarks/results/<commit>.json; --compare печатает отношение
+к сохраненному ранее результату другого коммита.
+
+Запуск: python benchmarks/bench_pipeline.py --customers 20000
+        python benchmarks/bench_pipeline.py --customers 20000 --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import io
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import pandas as pd
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Optional
+from common import measure_isolated
+from synthetic_data import customer_ids, ensure_dataset
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASE_DIR = BENCH_DIR.parent
+FEATURES_PATH = BASE_DIR / "features.yaml"
+DATA_DIR = BENCH_DIR / ".data"
+RESULTS_DIR = BENCH_DIR / "results"
+# Имена столбцов в data.csv, на которых обучена модель, отличаются от имен в features.yaml
+SNAPSHOT_COLUMNS = {"bonuses_spisanie": "bonus_write_offs", "bonuses_nachislenie": "bonus_accrual"}
+
+
+def make_loader(dbo_mb_path: str):
+    from connection import DatabaseConnection
+    from data_loader import DataLoader
+    from sqlite_standin import create_standin_engine
+    return DataLoader(DatabaseConnection(engine=create_standin_engine(dbo_mb_path)))
+
+
+def customers_frame(n_customers: int) -> pd.DataFrame:
+    return pd.DataFrame({"customer_mindbox_id": customer_ids(n_customers)})
+
+
+def setup_features(dbo_mb_path: str, n_customers: int, **manager_kwargs: Any):
+    from feature_manager import FeatureManager
+    manager = FeatureManager(str(FEATURES_PATH), make_loader(dbo_mb_path), **manager_kwargs)
+    return manager, customers_frame(n_customers)
+
+
+def setup_adaptive(dbo_mb_path: str, n_customers: int):
+    from batch_sizing import BatchSizer
+    # Размеры, выученные на первом прогоне, используются в замеряемом
+    sizer = BatchSizer(str(Path(dbo_mb_path).with_name("batch_sizes.json")), target_seconds=0.2)
+    manager, customers = setup_features(dbo_mb_path, n_customers, batch_sizer=sizer)
+    if not sizer.stats:
+        manager.generate_features(customers)
+    return manager, customers
+
+
+def calculate_first_unit(data) -> pd.DataFrame:
+    manager, customers = data
+    unit = manager.units[0]
+    return unit.calculate(customers, manager.select_for(unit))
+
+
+def generate_features(data) -> pd.DataFrame:
+    manager, customers = data
+    return manager.generate_features(customers)
+
+
+def build_snapshot(dbo_mb_path: str, n_customers: int) -> Path:
+    """
+    Выгружает фичи из стенда в parquet-снимок (как data.csv в проде). Снимок переиспользуется.
+    """
+    path = Path(dbo_mb_path).with_name("features.parquet")
+    if not path.exists():
+        manager, customers = setup_features(dbo_mb_path, n_customers)
+        manager.generate_features(customers).rename(columns=SNAPSHOT_COLUMNS).to_parquet(path, index=False)
+    return path
+
+
+def setup_app(snapshot_path: str, n_customers: int):
+    import app as app_module
+    from feature_snapshot import FeatureSnapshot, SnapshotProvider
+    from model_registry import ModelRegistry
+    from preprocessing import DataPreprocessor
+    from score_cache import ScoreCache
+
+    models_dir = Path(tempfile.mkdtemp(prefix="bench_models_"))
+    version = app_module.model_registry.current_version()
+    for suffix in (".pkl", ".json"):
+        shutil.copy(app_module.models_path / f"{version}{suffix}", models_dir / f"{version}{suffix}")
+    # Обучающих данных модели в бенчмарке нет: препроцессор регистрируется по синтетическому снимку
+    registry = ModelRegistry(models_dir)
+    training = app_module.derived_features.transform(FeatureSnapshot.read_source(Path(snapshot_path)))
+    preprocessor = DataPreprocessor(fill_strategy="zero", scale_method="standard")
+    registry.save_preprocessor(version, preprocessor.fit(training, columns=registry.metadata(version)["features"]))
+    (models_dir / "CURRENT").write_text(version, encoding="utf-8")
+
+    app_module.snapshot_provider = SnapshotProvider(snapshot_path)
+    app_module.models_path = models_dir
+    app_module.model_registry = registry
+    app_module.preprocessors = {}
+    app_module.score_cache = ScoreCache()
+    app_module.temp_result_path = str(models_dir / "result.xlsx")
+    # Модель, препроцессор и снимок загружаются до замера, как в прогретом сервисе
+    app_module.get_preprocessor(app_module.model_registry.get())
+    app_module.snapshot_provider.get()
+
+    upload = io.BytesIO()
+    pd.DataFrame({"user_id": customer_ids(n_customers)}).to_csv(upload, index=False)
+    return app_module.app.test_client(), upload.getvalue()
+
+
+def upload_file(data) -> None:
+    client, payload = data
+    response = client.post("/", data={"file": (io.BytesIO(payload), "ids.csv")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200, response.data
+
+
+def setup_predict(snapshot_path: str, n_customers: int):
+    import app as app_module
+    from feature_snapshot import FeatureSnapshot
+
+    setup_app(snapshot_path, 0)
+    model = app_module.model_registry.get()
+    df = app_module.derived_features.transform(FeatureSnapshot.read_source(Path(snapshot_path)),
+                                               drop=app_module.COLUMNS_TO_DROP)
+    df = app_module.get_preprocessor(model).preprocess(df.head(n_customers))
+    return model, df.drop(columns=["customer_mindbox_id", "target"], errors="ignore")
+
+
+def model_predict(data) -> pd.DataFrame:
+    model, X = data
+    return model.predict(X)
+
+
+def current_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "src", "features.yaml"], cwd=BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run(n_customers: int, workers: int, seed: int) -> Dict[str, Any]:
+    dbo_mb_path = str(ensure_dataset(str(DATA_DIR), n_customers, seed))
+    snapshot_path = str(build_snapshot(dbo_mb_path, n_customers))
+
+    stages = {
+        "feature_calculate": (partial(setup_features, dbo_mb_path, n_customers), calculate_first_unit),
+        "generate_features": (partial(setup_features, dbo_mb_path, n_customers), generate_features),
+        "generate_features_parallel": (partial(setup_features, dbo_mb_path, n_customers, max_workers=workers),
+                                       generate_features),
+        "generate_features_ship_ids": (partial(setup_features, dbo_mb_path, n_customers, ship_ids=True),
+                                       generate_features),
+        "generate_features_adaptive": (partial(setup_adaptive, dbo_mb_path, n_customers), generate_features),
+        "upload_file": (partial(setup_app, snapshot_path, n_customers), upload_file),
+        "model_predict": (partial(setup_predict, snapshot_path, n_customers), model_predict),
+    }
+    results = {}
+    for name, (setup, stage) in stages.items():
+        results[name] = measure_isolated(setup, stage)
+        print(f"{name:<28} {results[name]['seconds']:>10.2f} {results[name]['peak_rss_mb']:>12.0f} "
+              f"{results[name]['stage_rss_mb']:>16.0f}")
+
+    return {
+        "commit": current_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "params": {"customers": n_customers, "workers": workers, "seed": seed},
+        "stages": results,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    print(f"\nсравнение с {baseline['commit']} ({baseline['params']})")
+    print(f"{'этап':<28} {'время, x':>10} {'пик RSS, x':>12}")
+    for name, result in report["stages"].items():
+        base: Optional[dict] = baseline["stages"].get(name)
+        if base is None:
+            print(f"{name:<28} {'—':>10} {'—':>12}")
+            continue
+        print(f"{name:<28} {result['seconds'] / base['seconds']:>10.2f} "
+              f"{result['peak_rss_mb'] / base['peak_rss_mb']:>12.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--compare", help="JSON с результатами другого коммита")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{args.customers} клиентов")
+    print(f"{'этап':<28} {'время, с':>10} {'пик RSS, МБ':>12} {'прирост RSS, МБ':>16}")
+    report = run(args.customers, args.workers, args.seed)
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    path = RESULTS_DIR / f"{report['commit']}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nрезультаты: {path}")
+
+    if baseline is not None:
+        compare(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Сравнение инференса: GradientBoostingClassifier.predict_proba против CompiledEnsemble на батчах от 1 до 1M строк.
+
+Запуск: python benchmarks/bench_tree_engine.py --model models/model_01_04_2025.pkl
+Без --model обучается синтетическая модель того же размера (218 деревьев глубины 3, 9 признаков).
+"""
+import argparse
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingClassifier
+import common  # noqa: F401  (добавляет src в sys.path)
+from model import Model
+from tree_engine import CompiledEnsemble
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def synthetic_model(n_features: int = 9, seed: int = 42) -> GradientBoostingClassifier:
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.normal(size=(20_000, n_features)), columns=[f"f{i}" for i in range(n_features)])
+    y = (X["f0"] + X["f1"] * X["f2"] + rng.normal(scale=0.5, size=len(X)) > 0).astype(int)
+    return GradientBoostingClassifier(n_estimators=218, max_depth=3, learning_rate=0.02, random_state=seed).fit(X, y)
+
+
+def best_time(func, batch: pd.DataFrame) -> float:
+    repeats = max(1, min(200, 100_000 // len(batch)))
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(batch)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--max-batch", type=int, default=BATCH_SIZES[-1])
+    args = parser.parse_args()
+
+    if args.model:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            model = Model.load_model(args.model)
+    else:
+        model = synthetic_model()
+    compiled = CompiledEnsemble.from_sklearn(model)
+    columns = list(model.feature_names_in_)
+
+    rng = np.random.default_rng(0)
+    print(f"{model.n_estimators_} деревьев, {len(columns)} признаков")
+    print(f"{'строк':>9} {'sklearn, мс':>12} {'compiled, мс':>13} {'ускорение':>10} {'max |dp|':>10}")
+    for size in [size for size in BATCH_SIZES if size <= args.max_batch]:
+        batch = pd.DataFrame(rng.normal(scale=3, size=(size, len(columns))), columns=columns)
+        diff = np.abs(model.predict_proba(batch)[:, 1] - compiled.predict_proba(batch)[:, 1]).max()
+        sklearn_time = best_time(model.predict_proba, batch)
+        compiled_time = best_time(compiled.predict_proba, batch)
+        print(f"{size:>9} {sklearn_time * 1000:>12.3f} {compiled_time * 1000:>13.3f} "
+              f"{sklearn_time / compiled_time:>9.1f}x {diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
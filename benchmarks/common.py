@@ -0,0 +1,90 @@
+import gc
+import os
+import sys
+import time
+import multiprocessing
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.append(str(SRC_DIR))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+def current_rss_mb() -> float:
+    """
+    Текущий RSS процесса в МБ.
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сбрасывает счетчик пикового RSS (Linux, /proc/self/clear_refs).
+
+    :return: True, если сброс поддерживается.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """
+    Пиковый RSS процесса в МБ (с момента запуска или последнего reset_peak_rss).
+    """
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2 ** 10
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+    return psutil.Process().memory_info().peak_wset / 2 ** 20
+
+
+def _run_stage(queue: multiprocessing.Queue, setup: Callable[[], Any], stage: Callable[[Any], Any]) -> None:
+    data = setup()
+    gc.collect()
+    reset_peak_rss()
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    stage(data)
+    seconds = time.perf_counter() - started
+    peak = peak_rss_mb()
+    queue.put({"seconds": seconds, "peak_rss_mb": peak, "stage_rss_mb": max(peak - rss_before, 0.0)})
+
+
+def measure_isolated(setup: Callable[[], Any], stage: Callable[[Any], Any]) -> Dict[str, float]:
+    """
+    Выполняет setup и stage в отдельном процессе, чтобы пиковый RSS не зависел от других замеров.
+
+    :param setup: Подготовка входных данных (не замеряется по времени).
+    :param stage: Замеряемый этап, получает результат setup.
+    :return: Время этапа, пиковый RSS за этап (если ОС позволяет сбросить счетчик, иначе
+        за весь процесс) и прирост RSS за этап (МБ).
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(queue, setup, stage))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
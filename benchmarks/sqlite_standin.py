@@ -0,0 +1,154 @@
+"""
+Локальная замена SQL Server для бенчмарков: SQLite-база со схемой dbo_mb, в которой
+выполняются запросы из features.yaml без изменений в самом YAML.
+
+Диалектные конструкции T-SQL переписываются перед выполнением (translate), недостающие
+функции (GETDATE, DATEDIFF, DATEADD, FORMAT) регистрируются в каждом соединении.
+GETDATE() возвращает фиксированную дату, чтобы результаты были воспроизводимыми.
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from synthetic_data import REFERENCE_DATE
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+FORMAT_TOKENS = [("yyyy", "%Y"), ("MM", "%m"), ("dd", "%d"), ("HH", "%H"), ("mm", "%M"), ("ss", "%S")]
+DATE_PART = re.compile(r"\b(DATEDIFF|DATEADD)\s*\(\s*(YEAR|MONTH|DAY)\s*,", re.IGNORECASE)
+CONVERT_DATE = re.compile(r"\bCONVERT\s*\(\s*DATE\s*,", re.IGNORECASE)
+CAST_START = re.compile(r"\bCAST\s*\(", re.IGNORECASE)
+CAST_AS = re.compile(r"^(.*)\s+AS\s+(DATE|DATETIME)\s*$", re.IGNORECASE | re.DOTALL)
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    if value is None:
+        return None
+    value = str(value)
+    for fmt in (DATETIME_FORMAT, "%Y-%m-%d", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S.%f"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Неизвестный формат даты: {value!r}")
+
+
+def add_years(value: datetime, years: int) -> datetime:
+    try:
+        return value.replace(year=value.year + years)
+    except ValueError:  # 29 февраля
+        return value.replace(year=value.year + years, day=28)
+
+
+def datediff(part: str, start: Optional[str], end: Optional[str]) -> Optional[int]:
+    start, end = parse_datetime(start), parse_datetime(end)
+    if start is None or end is None:
+        return None
+    part = part.upper()
+    if part == "YEAR":
+        return end.year - start.year
+    if part == "MONTH":
+        return (end.year - start.year) * 12 + end.month - start.month
+    return (end.date() - start.date()).days
+
+
+def dateadd(part: str, number: int, value: Optional[str]) -> Optional[str]:
+    value = parse_datetime(value)
+    if value is None:
+        return None
+    part = part.upper()
+    if part == "YEAR":
+        value = add_years(value, number)
+    elif part == "MONTH":
+        month = value.month - 1 + number
+        value = value.replace(year=value.year + month // 12, month=month % 12 + 1)
+    else:
+        value = value + timedelta(days=number)
+    return value.strftime(DATETIME_FORMAT)
+
+
+def format_datetime(value: Optional[str], pattern: str) -> Optional[str]:
+    value = parse_datetime(value)
+    if value is None:
+        return None
+    for token, directive in FORMAT_TOKENS:
+        pattern = pattern.replace(token, directive)
+    return value.strftime(pattern)
+
+
+def convert_date(value: Optional[str]) -> Optional[str]:
+    value = parse_datetime(value)
+    return None if value is None else value.strftime("%Y-%m-%d")
+
+
+def rewrite_casts(sql: str) -> str:
+    """
+    Заменяет CAST(x AS DATE) на DATE(x) и CAST(x AS DATETIME) на DATETIME(x): в SQLite
+    такие CAST приводят строку к числу. Остальные CAST не меняются.
+    """
+    result = []
+    position = 0
+    for match in CAST_START.finditer(sql):
+        if match.start() < position:
+            continue
+        depth, end = 1, match.end()
+        while depth and end < len(sql):
+            depth += {"(": 1, ")": -1}.get(sql[end], 0)
+            end += 1
+        inner = rewrite_casts(sql[match.end():end - 1])
+        cast = CAST_AS.match(inner)
+        result.append(sql[position:match.start()])
+        if cast:
+            result.append(f"{cast.group(2).upper()}({cast.group(1).strip()})")
+        else:
+            result.append(f"{match.group(0)}{inner})")
+        position = end
+    result.append(sql[position:])
+    return "".join(result)
+
+
+def translate(sql: str) -> str:
+    """
+    Переписывает T-SQL из features.yaml в диалект SQLite.
+
+    :param sql: Текст запроса для SQL Server.
+    :return: Текст запроса для SQLite.
+    """
+    sql = DATE_PART.sub(lambda m: f"{m.group(1).upper()}('{m.group(2).upper()}',", sql)
+    sql = CONVERT_DATE.sub("CONVERT_DATE(", sql)
+    return rewrite_casts(sql)
+
+
+def register_functions(connection: sqlite3.Connection, now: str) -> None:
+    connection.create_function("GETDATE", 0, lambda: now, deterministic=True)
+    connection.create_function("DATEDIFF", 3, datediff, deterministic=True)
+    connection.create_function("DATEADD", 3, dateadd, deterministic=True)
+    connection.create_function("FORMAT", 2, format_datetime, deterministic=True)
+    connection.create_function("CONVERT_DATE", 1, convert_date, deterministic=True)
+
+
+def create_standin_engine(dbo_mb_path: str, now: str = REFERENCE_DATE) -> Engine:
+    """
+    Создает engine SQLite, в котором база dbo_mb_path подключена как схема dbo_mb.
+    Временные таблицы (ship_ids) создаются в отдельной рабочей базе рядом с ней.
+
+    :param dbo_mb_path: Путь к файлу, созданному synthetic_data.write_sqlite.
+    :param now: Значение GETDATE().
+    :return: Engine для DatabaseConnection(engine=...).
+    """
+    dbo_mb_path = Path(dbo_mb_path).resolve()
+    work_path = dbo_mb_path.with_name("work.sqlite")
+    engine = create_engine(f"sqlite:///{work_path}", connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record) -> None:
+        dbapi_connection.execute("ATTACH DATABASE ? AS dbo_mb", (str(dbo_mb_path),))
+        register_functions(dbapi_connection, now)
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        return translate(statement), parameters
+
+    return engine
\ No newline at end of file
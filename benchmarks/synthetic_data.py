@@ -0,0 +1,152 @@
+"""
+Генератор синтетических таблиц dbo_mb (orders, orders_cancelled, orders_return, balance_change)
+с заданным масштабом. Распределения грубо повторяют боевые: у клиента в среднем несколько
+заказов и бонусных операций, часть заказов отменена или возвращена.
+
+Запуск: python benchmarks/synthetic_data.py --customers 100000 --out benchmarks/.data/100k
+"""
+import argparse
+import sqlite3
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict
+
+REFERENCE_DATE = "2025-04-01 00:00:00"
+BRANDS = ["reStore", "samsung", "xiaomi", "rmix"]
+BRAND_SHOPS = {
+    "reStore": ["RSTR Москва Тверская", "Re:Store - интеграция с RetailCRM", "re-store.ru"],
+    "samsung": ["SMSG Москва Арбат", "Samsung - интеграция с RetailCRM", "galaxy-shop"],
+    "xiaomi": ["XIAM Санкт-Петербург", "Xiaomi - интеграция с RetailCRM", "ru-mi.com"],
+    "rmix": ["RMIX Казань", "restore-mix.ru", "Restore:mix - интеграция с RetailCRM"],
+}
+BALANCES = ["ElectronicsClubProgramBalance", "ReStoreBalance", "RestoreMixBalance", "SamsungBalance", "XiaomiBalance"]
+BALANCE_KINDS = ["RetailOrderBonus", "RetailOrderPayment"]
+INDEXES = {
+    "orders": ["customer_mindbox_id", "order_mindbox_id"],
+    "orders_cancelled": ["order_mindbox_id"],
+    "orders_return": ["order_mindbox_id"],
+    "balance_change": ["customer_mindbox_id"],
+}
+
+
+def customer_ids(n_customers: int) -> np.ndarray:
+    return 1_000_000 + np.arange(n_customers, dtype=np.int64) * 7
+
+
+def random_datetimes(rng: np.random.Generator, size: int, days_back: int = 3 * 365) -> pd.Series:
+    reference = pd.Timestamp(REFERENCE_DATE)
+    seconds = rng.integers(0, days_back * 86400, size=size)
+    return (reference - pd.to_timedelta(seconds, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate(n_customers: int, orders_per_customer: float = 4.0, bonus_events_per_customer: float = 6.0,
+             seed: int = 42) -> Dict[str, pd.DataFrame]:
+    """
+    Генерирует таблицы dbo_mb.
+
+    :param n_customers: Количество клиентов.
+    :param orders_per_customer: Среднее количество заказов на клиента.
+    :param bonus_events_per_customer: Среднее количество бонусных операций на клиента.
+    :param seed: Seed генератора.
+    :return: Словарь {имя таблицы: DataFrame}.
+    """
+    rng = np.random.default_rng(seed)
+    ids = customer_ids(n_customers)
+
+    order_counts = rng.poisson(orders_per_customer, size=n_customers)
+    n_orders = int(order_counts.sum())
+    brands = rng.choice(BRANDS, size=n_orders, p=[0.55, 0.2, 0.15, 0.1])
+    shops = np.array([BRAND_SHOPS[brand][i] for brand, i in zip(brands, rng.integers(0, 3, size=n_orders))])
+    base_price = rng.integers(500, 150_000, size=n_orders)
+    bonuses_used = np.where(rng.random(n_orders) < 0.3, rng.integers(0, 5_000, size=n_orders), 0)
+    action_datetime = random_datetimes(rng, n_orders)
+    orders = pd.DataFrame({
+        "customer_mindbox_id": np.repeat(ids, order_counts),
+        "action_mindbox_id": 50_000_000 + np.arange(n_orders),
+        "order_mindbox_id": 10_000_000 + np.arange(n_orders),
+        "first_action_datetime": action_datetime,
+        "action_datetime": action_datetime,
+        "total_price": base_price - bonuses_used,
+        "base_price": base_price,
+        "price": base_price - bonuses_used,
+        "shop": shops,
+        "brand": brands,
+    })
+
+    cancelled = orders.sample(frac=0.03, random_state=seed)
+    returned = orders.drop(cancelled.index).sample(frac=0.02, random_state=seed + 1)
+    orders_cancelled = pd.DataFrame({"order_mindbox_id": cancelled["order_mindbox_id"].to_numpy(),
+                                     "action_datetime": random_datetimes(rng, len(cancelled), days_back=365)})
+    orders_return = pd.DataFrame({"order_mindbox_id": returned["order_mindbox_id"].to_numpy(),
+                                  "action_datetime": random_datetimes(rng, len(returned), days_back=365)})
+
+    event_counts = rng.poisson(bonus_events_per_customer, size=n_customers)
+    n_events = int(event_counts.sum())
+    event_brands = rng.choice(BRANDS, size=n_events)
+    change_datatime = pd.to_datetime(random_datetimes(rng, n_events))
+    accrual = rng.random(n_events) < 0.6
+    balance_change = pd.DataFrame({
+        "customer_mindbox_id": np.repeat(ids, event_counts),
+        "customer_action_id": 90_000_000 + np.arange(n_events),
+        "bonus_amount": np.where(accrual, 1, -1) * rng.integers(10, 3_000, size=n_events),
+        "shop": [BRAND_SHOPS[brand][i] for brand, i in zip(event_brands, rng.integers(0, 3, size=n_events))],
+        "change_datatime": change_datatime.strftime("%Y-%m-%d %H:%M:%S"),
+        "before_datetime": (change_datatime + pd.Timedelta(days=365)).strftime("%Y-%m-%d %H:%M:%S"),
+        "name_balance": rng.choice(BALANCES, size=n_events, p=[0.4, 0.3, 0.1, 0.1, 0.1]),
+        "kind_bonus": rng.choice(BALANCE_KINDS, size=n_events),
+    })
+
+    return {
+        "orders": orders,
+        "orders_cancelled": orders_cancelled,
+        "orders_return": orders_return,
+        "balance_change": balance_change,
+    }
+
+
+def write_sqlite(tables: Dict[str, pd.DataFrame], path: str) -> None:
+    """
+    Записывает таблицы в файл SQLite (подключается как схема dbo_mb) и строит индексы.
+
+    :param tables: Словарь {имя таблицы: DataFrame}.
+    :param path: Путь к файлу базы.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.unlink(missing_ok=True)
+    with sqlite3.connect(tmp_path) as connection:
+        for name, df in tables.items():
+            df.to_sql(name, connection, index=False, chunksize=100_000)
+            for column in INDEXES.get(name, []):
+                connection.execute(f"CREATE INDEX ix_{name}_{column} ON {name} ({column})")
+    tmp_path.replace(path)
+
+
+def ensure_dataset(directory: str, n_customers: int, seed: int = 42) -> Path:
+    """
+    Возвращает путь к базе dbo_mb нужного масштаба, генерируя ее при первом обращении.
+
+    :param directory: Каталог наборов данных.
+    :param n_customers: Количество клиентов.
+    :param seed: Seed генератора.
+    :return: Путь к файлу dbo_mb.sqlite.
+    """
+    path = Path(directory) / f"customers_{n_customers}_seed_{seed}" / "dbo_mb.sqlite"
+    if not path.exists():
+        write_sqlite(generate(n_customers, seed=seed), str(path))
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customers", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=str(Path(__file__).resolve().parent / ".data"))
+    args = parser.parse_args()
+    print(ensure_dataset(args.out, args.customers, args.seed))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,26 +1,74 @@
+import os
 import uuid
+import threading
+import time
 import tempfile
+import numpy as np
 import pandas as pd 
-from flask import Flask, request, send_file 
+from flask import Flask, Response, g, jsonify, request, send_file, stream_with_context
 from model import Model 
 from data_loader import DataLoader 
 from preprocessing import DataPreprocessor 
-from feature_engineering import FeatureEngineering 
+from derived_features import DerivedFeatures
+from feature_snapshot import FeatureSnapshot, SnapshotProvider
+from jobs import JobQueue, JobQueueFull
+from model_registry import MissingArtifactError, ModelRegistry
+from score_cache import ScoreCache
+from ingestion import IngestionError, read_user_ids
+from instrumentation import metrics
 from pathlib import Path 
+from typing import Dict, Optional
 
 BASE_DIR = Path(__file__).resolve().parent.parent 
  
 data_path = BASE_DIR / "data" / "data.csv" 
-model_path = BASE_DIR / "models" / "model_01_04_2025.pkl" 
+models_path = BASE_DIR / "models"
+jobs_path = BASE_DIR / "data" / "jobs"
 unique_filename = f"result_{uuid.uuid4().hex}.xlsx"
 temp_result_path = tempfile.gettempdir() + '/' + unique_filename
+
+COLUMNS_TO_DROP = [
+    "bonus_accrual",
+    "purchase_sum_restore",
+    "days_since_last_redemption",
+    "purchase_frequency_last_year",
+    "purchase_iphone",
+    "purchase_count_iphone"
+]
+SCORE_CHUNK_SIZE = 10000
  
 app = Flask(__name__) 
 
-loaded_gb = Model.load_model(model_path) 
+snapshot_provider = SnapshotProvider(data_path)
+if data_path.exists():
+    snapshot_provider.get()
+
+derived_features = DerivedFeatures.from_yaml(BASE_DIR / "derived_features.yaml")
+model_registry = ModelRegistry(models_path)
+score_cache = ScoreCache(max_entries=int(os.getenv("SCORE_CACHE_SIZE", 200_000)),
+                         disk_path=os.getenv("SCORE_CACHE_PATH") or None)
+
+preprocessors: Dict[str, DataPreprocessor] = {}
+preprocessor_lock = threading.Lock()
+
 
-loaded_model = Model({}) 
-loaded_model.model = loaded_gb
+def get_preprocessor(model: Model) -> DataPreprocessor:
+    """
+    Возвращает препроцессор версии модели. Артефакт сохраняется при регистрации модели
+    (см. ModelRegistry.save_preprocessor) и здесь только читается: сервис не обучает его сам.
+
+    :param model: Модель из реестра.
+    :return: Обученный DataPreprocessor.
+    :raises MissingArtifactError: У версии нет препроцессора.
+    """
+    preprocessor = preprocessors.get(model.version)
+    if preprocessor is None:
+        with preprocessor_lock:
+            preprocessor = preprocessors.get(model.version)
+            if preprocessor is None:
+                preprocessor = model_registry.load_preprocessor(model.version)
+                preprocessors[model.version] = preprocessor
+    return preprocessor
  
 @app.route('/') 
 def index(): 
@@ -32,30 +80,54 @@ def index():
         </form> 
     ''' 
  
-@app.route('/', methods=['POST']) 
-def upload_file(): 
+class UploadError(Exception):
+    def __init__(self, message: str, status: int = 400) -> None:
+        """
+        Ошибка разбора загруженного файла.
+
+        :param message: Сообщение для клиента.
+        :param status: HTTP-статус ответа.
+        """
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@app.errorhandler(UploadError)
+def handle_upload_error(error: UploadError):
+    return error.message, error.status
+
+
+@app.errorhandler(MissingArtifactError)
+def handle_missing_artifact(error: MissingArtifactError):
+    return str(error), 503
+
+
+def read_upload_ids() -> np.ndarray:
+    """
+    Читает ID пользователей из загруженного файла (поле формы file, столбец user_id):
+    Excel, CSV или Parquet.
+
+    :return: Массив int64 уникальных ID.
+    :raises UploadError: Если файла нет или его не удалось разобрать.
+    """
     if 'file' not in request.files: 
-        return "Нет файла для загрузки", 400
+        raise UploadError("Нет файла для загрузки")
     file = request.files['file'] 
     if file.filename == '': 
-        return "Нет выбранного файла", 400
+        raise UploadError("Нет выбранного файла")
 
     try: 
-        df = pd.read_excel(file) 
+        return read_user_ids(file.stream, file.filename)
+    except IngestionError as e:
+        raise UploadError(str(e))
     except Exception as e: 
-        return f"Ошибка при загрузке файла: {e}" 
+        raise UploadError(f"Ошибка при загрузке файла: {e}")
 
-    if 'user_id' not in df.columns: 
-        return "Нет столбца с ID пользователей (user_id)" , 400
 
-    for column in df.columns:
-        if not pd.api.types.is_numeric_dtype(df[column]):
-            try:
-                df[column] = pd.to_numeric(df[column], errors='coerce')  # Преобразует в NaN, если не число
-            except ValueError:
-                return f"Невозможно преобразовать столбец {column} в числовой формат", 400
-
-    user_ids = df['user_id'] 
+@app.route('/', methods=['POST']) 
+def upload_file(): 
+    user_ids = read_upload_ids()
  
     # если фичи получаем из хранилища:
  
@@ -70,36 +142,231 @@ def upload_file():
     # WHERE customer_mindbox_id IN ({ids_str}) 
     # """ 
  
-    all_customers = pd.read_csv(data_path) 
-    all_customers = all_customers.iloc[:,1:] 
-    customers_features = all_customers[all_customers['customer_mindbox_id'].isin(user_ids)] 
+    predictions = score_customers(user_ids)
+ 
+    with metrics.span("excel_write") as span:
+        predictions.to_excel(temp_result_path, index=True)
+        span.add(rows=len(predictions), bytes=os.path.getsize(temp_result_path))
+ 
+    return send_file(temp_result_path, as_attachment=True), 200
 
-    feature_engineer = FeatureEngineering(customers_features)
 
-    df_with_features = feature_engineer.generate_features()
+def score_customers(user_ids) -> pd.DataFrame:
+    """
+    Считает предсказания для клиентов. Сначала ищет их в кэше скоров, через
+    конвейер (predict_customers) проходят только промахи.
+
+    :param user_ids: ID клиентов.
+    :return: DataFrame с предсказаниями, индекс — customer_mindbox_id, строки в порядке снимка фичей.
+    """
+    snapshot = snapshot_provider.get()
+    model = model_registry.get()
+    ids = pd.unique(pd.to_numeric(pd.Series(user_ids), errors="coerce").dropna().astype("int64"))
+
+    cached, missing = score_cache.get_many(ids, model.version, snapshot.version)
+    if len(missing):
+        computed = predict_customers(snapshot, model, missing)
+        score_cache.put_many(computed, model.version, snapshot.version)
+        cached = pd.concat([cached, computed]) if len(cached) else computed
+
+    predictions = cached.sort_values("row", kind="stable").drop(columns="row")
+    return predictions.astype({"Predicted Probability": "float64", "Predicted Class": "int64"})
 
-    columns_to_drop = [
-    "bonus_accrual", 
-    "purchase_sum_restore",
-    "days_since_last_redemption",
-    "purchase_frequency_last_year",
-    "purchase_iphone",
-     "purchase_count_iphone"
-]
 
-    df_with_features = feature_engineer.clean_data(columns_to_drop=columns_to_drop)
+def predict_customers(snapshot: FeatureSnapshot, model: Model, user_ids: np.ndarray) -> pd.DataFrame:
+    """
+    Конвейер скоринга: снимок фичей -> производные фичи -> DataPreprocessor -> Model.predict.
 
-    preprocessor = DataPreprocessor(fill_strategy="zero", scale_method="standard")
+    :param snapshot: Снимок фичей.
+    :param model: Модель из реестра.
+    :param user_ids: ID клиентов.
+    :return: DataFrame с предсказаниями и номером строки в снимке (row), индекс — customer_mindbox_id.
+    """
+    customers_features = snapshot.lookup(user_ids)
+    if customers_features.empty:
+        predictions = pd.DataFrame({"row": pd.Series(dtype="int64"),
+                                    "Predicted Probability": pd.Series(dtype="float64"),
+                                    "Predicted Class": pd.Series(dtype="int64")})
+        predictions.index.name = "customer_mindbox_id"
+        return predictions
+    rows = customers_features.index.to_numpy()
 
-    df_cleaned = preprocessor.preprocess(df_with_features)
+    with metrics.span("derived_features") as span:
+        df_with_features = derived_features.transform(customers_features, drop=COLUMNS_TO_DROP)
+        span.add(rows=len(df_with_features))
+
+    df_cleaned = get_preprocessor(model).preprocess(df_with_features)
 
     df_cleaned = df_cleaned.drop(columns=["customer_mindbox_id", "target"], errors="ignore") 
  
-    predictions = loaded_model.predict(df_cleaned) 
- 
-    predictions.to_excel(temp_result_path, index=True)
- 
-    return send_file(temp_result_path, as_attachment=True), 200
+    predictions = model.predict(df_cleaned)
+    predictions.insert(0, "row", rows)
+    return predictions
+
+
+def read_json_ids() -> Optional[list]:
+    """
+    Разбирает JSON-тело запроса: массив user_id или {"user_ids": [...]}.
+    Вызывается до начала потокового ответа, чтобы ошибку можно было вернуть кодом 400.
+
+    :return: Список ID или None, если тело не разобралось или имеет другую форму.
+    """
+    payload = request.get_json(silent=True)
+    ids = payload.get("user_ids") if isinstance(payload, dict) else payload
+    return ids if isinstance(ids, list) else None
+
+
+def read_id_chunks(chunk_size: int, ids: Optional[list] = None):
+    """
+    Отдает user_id частями: из уже разобранного JSON (read_json_ids) либо из CSV/построчного
+    потока тела запроса. Строки, которые не являются числом (заголовок), пропускаются.
+
+    :param chunk_size: Количество ID в одной части.
+    :param ids: ID из JSON-тела; если None, читается поток.
+    :return: Итератор по спискам ID.
+    """
+    if ids is not None:
+        for start in range(0, len(ids), chunk_size):
+            yield ids[start:start + chunk_size]
+        return
+
+    chunk = []
+    for line in request.stream:
+        value = line.split(b",", 1)[0].strip().strip(b'"')
+        if not value.isdigit():
+            continue
+        chunk.append(int(value))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@app.route('/score', methods=['POST'])
+def score():
+    """
+    Машинный API скоринга: принимает JSON-массив или CSV/построчный поток user_id и
+    отдает предсказания потоком JSON Lines (по умолчанию) или CSV (?format=csv).
+    Клиенты обрабатываются частями по SCORE_CHUNK_SIZE, поэтому память не растет с размером запроса.
+    """
+    output_format = request.args.get("format")
+    if output_format is None:
+        output_format = "csv" if request.accept_mimetypes.best == "text/csv" else "jsonl"
+    if output_format not in ("jsonl", "csv"):
+        return "Поддерживаются форматы jsonl и csv", 400
+    json_ids = None
+    if request.is_json:
+        json_ids = read_json_ids()
+        if json_ids is None:
+            return 'Ожидается JSON-массив user_id или {"user_ids": [...]}', 400
+    # Препроцессор проверяется до начала потокового ответа, чтобы его отсутствие вернулось ошибкой 503
+    get_preprocessor(model_registry.get())
+
+    def generate():
+        if output_format == "csv":
+            yield "customer_mindbox_id,Predicted Probability,Predicted Class\n"
+        for ids in read_id_chunks(SCORE_CHUNK_SIZE, json_ids):
+            predictions = score_customers(ids)
+            if output_format == "csv":
+                yield predictions.to_csv(header=False)
+            elif len(predictions):
+                yield predictions.reset_index().to_json(orient="records", lines=True)
+
+    mimetype = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(score_cache.stats())
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request_latency(response):
+    """
+    Записывает длительность запроса, когда сервер закрывает тело ответа. after_request вызывается
+    до того, как потоковый ответ (/score) начнет отдаваться, поэтому замер здесь покрывал бы только
+    подготовку ответа, а не выгрузку всех строк.
+    """
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint, method, status = request.endpoint or "unknown", request.method, response.status_code
+        response.call_on_close(lambda: metrics.observe_request(endpoint, method, status,
+                                                               time.perf_counter() - started))
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    Метрики конвейера и длительности запросов в текстовом формате Prometheus.
+    Данные собираются, только если задана переменная METRICS_ENABLED.
+    """
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+job_queue: Optional[JobQueue] = None
+job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Возвращает очередь заданий процесса, создавая ее при первом обращении (а не при импорте
+    модуля): тесты и бенчмарки не создают data/jobs, а каждый воркер gunicorn получает свою
+    очередь, которая захватывает задания атомарно (JobQueue.claim).
+
+    :return: JobQueue.
+    """
+    global job_queue
+    if job_queue is None:
+        with job_queue_lock:
+            if job_queue is None:
+                job_queue = JobQueue(jobs_path, score_customers,
+                                     max_workers=int(os.getenv("JOB_WORKERS", 1)),
+                                     max_pending=int(os.getenv("JOB_MAX_PENDING", 20)),
+                                     chunk_size=SCORE_CHUNK_SIZE,
+                                     lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 60)))
+    return job_queue
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Ставит большой файл в очередь на фоновый скоринг и сразу возвращает ID задания.
+    """
+    user_ids = read_upload_ids()
+    try:
+        job_id = get_job_queue().submit(user_ids)
+    except JobQueueFull as e:
+        return str(e), 429
+    return jsonify(get_job_queue().status(job_id)), 202
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id: str):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return "Задание не найдено", 404
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id: str):
+    status = get_job_queue().status(job_id)
+    if status is None:
+        return "Задание не найдено", 404
+    if status["status"] != "done":
+        return jsonify(status), 409
+    return send_file(get_job_queue().result_path(job_id), mimetype="text/csv",
+                     as_attachment=True, download_name=f"result_{job_id}.csv")
  
 if __name__ == '__main__': 
+    # Незавершенные задания продолжаются сразу после запуска, а не с первого запроса к /jobs
+    get_job_queue()
     app.run(debug=True)
\ No newline at end of file
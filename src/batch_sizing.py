@@ -0,0 +1,151 @@
+import os
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# Длинный список IN (...) на SQL Server упирается не в лимит размера пакета (65536 * размер
+# сетевого пакета), а в ресурсы оптимизатора (ошибка 8623), поэтому ограничения заметно ниже
+MAX_STATEMENT_BYTES = 256 * 1024
+MAX_BATCH_SIZE = 20_000
+
+
+class BatchSizer:
+    def __init__(self, path: Optional[str] = None, target_seconds: float = 2.0, min_size: int = 100,
+                 max_size: int = MAX_BATCH_SIZE, max_statement_bytes: int = MAX_STATEMENT_BYTES,
+                 max_result_rows: int = 500_000, smoothing: float = 0.3) -> None:
+        """
+        Подбирает размер батча каждой фичи по наблюдаемым задержке и объему результата.
+
+        Время запроса оценивается как overhead + per_id * размер: по каждому батчу обновляются
+        скользящие средние размера, времени и их произведений (линейная регрессия), а также
+        строк результата на один ID. Следующий размер — такой, чтобы запрос выполнялся около
+        target_seconds. Если постоянная часть (например, полный проход по таблице в CTE)
+        сама больше target_seconds, уменьшение батча не помогает, и батч, наоборот, растет.
+        За шаг размер меняется не более чем вдвое, не выходит за [min_size, max_size], не дает
+        результату больше max_result_rows строк и тексту запроса больше max_statement_bytes.
+        Выученные размеры сохраняются в JSON (path) и используются при следующем запуске.
+
+        :param path: JSON-файл с выученными размерами (None — не сохранять).
+        :param target_seconds: Целевое время одного запроса.
+        :param min_size: Минимальный размер батча.
+        :param max_size: Максимальный размер батча.
+        :param max_statement_bytes: Максимальный размер текста запроса с подставленными ID.
+        :param max_result_rows: Максимальное ожидаемое число строк результата батча.
+        :param smoothing: Вес нового наблюдения в скользящем среднем (0..1].
+        """
+        self.path = Path(path) if path is not None else None
+        self.target_seconds = target_seconds
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_statement_bytes = max_statement_bytes
+        self.max_result_rows = max_result_rows
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, Any]] = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Читает выученные размеры из path.
+
+        :return: Словарь {имя фичи: статистика}; пустой, если файла нет или он поврежден.
+        """
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет выученные размеры в path.
+        """
+        if self.path is None:
+            return
+        with self.lock:
+            data = json.loads(json.dumps(self.stats))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + f".tmp{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def statement_limit(self, query_bytes: int, id_width: int) -> int:
+        """
+        Сколько ID помещается в запрос, не превышая max_statement_bytes.
+
+        :param query_bytes: Размер шаблона запроса без ID.
+        :param id_width: Размер одного ID в тексте вместе с разделителем ", ".
+        :return: Максимальное число ID (не меньше 1).
+        """
+        return max((self.max_statement_bytes - query_bytes) // max(id_width, 1), 1)
+
+    def batch_size(self, name: str, default: int, query_bytes: int = 0, id_width: int = 12) -> int:
+        """
+        Размер следующего батча фичи.
+
+        :param name: Имя фичи.
+        :param default: Размер из конфигурации (пока нет наблюдений).
+        :param query_bytes: Размер шаблона запроса без ID.
+        :param id_width: Размер одного ID в тексте вместе с разделителем.
+        :return: Размер батча.
+        """
+        with self.lock:
+            size = self.stats.get(name, {}).get("batch_size", default)
+        return int(max(min(size, self.max_size, self.statement_limit(query_bytes, id_width)), 1))
+
+    def observe(self, name: str, ids: int, seconds: float, rows: int) -> None:
+        """
+        Учитывает выполненный батч и пересчитывает размер следующего.
+
+        :param name: Имя фичи.
+        :param ids: Число ID в батче.
+        :param seconds: Время запроса.
+        :param rows: Число строк результата.
+        """
+        if ids <= 0:
+            return
+        sample = {"ids": ids, "seconds": seconds, "ids_sq": ids * ids, "ids_seconds": ids * seconds,
+                  "rows_per_id": rows / ids}
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None or any(key not in stats for key in sample):
+                stats = self.stats[name] = {"batch_size": ids, "batches": 0, **sample}
+            else:
+                for key, value in sample.items():
+                    stats[key] += self.smoothing * (value - stats[key])
+
+            overhead, per_id = self.latency_model(stats)
+            current = stats["batch_size"]
+            if per_id <= 0 or overhead >= self.target_seconds:
+                size = current * 2
+            else:
+                size = (self.target_seconds - overhead) / per_id
+            if stats["rows_per_id"] > 0:
+                size = min(size, self.max_result_rows / stats["rows_per_id"])
+            size = min(max(size, current / 2, self.min_size), current * 2, self.max_size)
+            stats["batch_size"] = int(max(size, 1))
+            stats["seconds_per_id"] = per_id
+            stats["overhead_seconds"] = overhead
+            stats["batches"] += 1
+            stats["updated_at"] = datetime.now().isoformat(timespec="seconds")
+
+    @staticmethod
+    def latency_model(stats: Dict[str, Any]) -> Tuple[float, float]:
+        """
+        Оценивает постоянную часть времени запроса и время на один ID по скользящим средним.
+        Если размеры батчей в последнее время почти не различались, постоянная часть берется
+        из прошлой оценки (в самом начале она равна нулю — время пропорционально размеру).
+
+        :param stats: Статистика фичи.
+        :return: (overhead, per_id) в секундах.
+        """
+        variance = stats["ids_sq"] - stats["ids"] ** 2
+        if variance > (0.05 * stats["ids"]) ** 2:
+            per_id = max((stats["ids_seconds"] - stats["ids"] * stats["seconds"]) / variance, 0.0)
+            return max(stats["seconds"] - per_id * stats["ids"], 0.0), per_id
+        overhead = min(stats.get("overhead_seconds", 0.0), stats["seconds"])
+        return overhead, (stats["seconds"] - overhead) / stats["ids"]
\ No newline at end of file
@@ -0,0 +1,179 @@
+import os
+import re
+import time
+import uuid
+import random
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, List, Tuple
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+# SQLSTATE временных ошибок ODBC: жертва взаимоблокировки, таймауты, обрыв связи
+TRANSIENT_SQLSTATES = {"40001", "HYT00", "HYT01", "08S01", "08001", "08004"}
+# Номера ошибок SQL Server: 1205 — взаимоблокировка, -2 — таймаут, остальные — сеть и Azure SQL
+TRANSIENT_ERROR_CODES = {1205, -2, 53, 64, 233, 10053, 10054, 10060, 40197, 40501, 40613, 49918}
+RANGE_FILE = re.compile(r"^(\d+)-(\d+)\.parquet$")
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Проверяет, имеет ли смысл повторить запрос после ошибки: взаимоблокировка (1205),
+    таймаут, обрыв соединения или другая OperationalError драйвера.
+
+    :param error: Исключение из select.
+    :return: True для временных ошибок.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, DBAPIError):
+        if error.connection_invalidated or isinstance(error, OperationalError):
+            return True
+        error = error.orig if error.orig is not None else error
+    args = getattr(error, "args", ())
+    if args and str(args[0]) in TRANSIENT_SQLSTATES:
+        return True
+    message = str(error)
+    return any(f"({code})" in message for code in TRANSIENT_ERROR_CODES)
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 4, base_delay: float = 1.0, max_delay: float = 60.0,
+                 is_retryable: Callable[[BaseException], bool] = is_transient) -> None:
+        """
+        Повтор батча после временной ошибки с экспоненциальной задержкой и случайным разбросом.
+
+        :param attempts: Максимум попыток выполнения батча (включая первую).
+        :param base_delay: Задержка перед первым повтором, с.
+        :param max_delay: Предельная задержка, с.
+        :param is_retryable: Функция, определяющая, что ошибку стоит повторить.
+        """
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_retryable = is_retryable
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """
+        :param error: Ошибка попытки.
+        :param attempt: Номер неудачной попытки (с 1).
+        :return: True, если нужно повторить.
+        """
+        return attempt < self.attempts and self.is_retryable(error)
+
+    def delay(self, attempt: int) -> float:
+        """
+        :param attempt: Номер неудачной попытки (с 1).
+        :return: Задержка перед следующей попыткой, с.
+        """
+        return min(self.base_delay * 2 ** (attempt - 1), self.max_delay) * random.uniform(0.5, 1.0)
+
+    def wait(self, attempt: int) -> None:
+        """
+        Ждет перед следующей попыткой (см. delay).
+
+        :param attempt: Номер неудачной попытки (с 1).
+        """
+        time.sleep(self.delay(attempt))
+
+
+class FeatureCheckpoint:
+    def __init__(self, path: Path) -> None:
+        """
+        Сохраненные результаты батчей одной фичи в одном запуске. Каждый батч — файл
+        <start>-<end>.parquet, где [start, end) — позиции клиентов в таблице запуска.
+
+        :param path: Каталог фичи.
+        """
+        self.path = path
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        """
+        Готовые диапазоны позиций клиентов.
+
+        :return: Отсортированный список (start, end).
+        """
+        if not self.path.exists():
+            return []
+        ranges = []
+        for name in os.listdir(self.path):
+            match = RANGE_FILE.match(name)
+            if match:
+                ranges.append((int(match.group(1)), int(match.group(2))))
+        return sorted(ranges)
+
+    def save(self, start: int, end: int, df: pd.DataFrame) -> None:
+        """
+        Атомарно сохраняет результат батча.
+
+        :param start: Позиция первого клиента батча.
+        :param end: Позиция после последнего клиента батча.
+        :param df: Результат запроса.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self.path / f"{start}-{end}.parquet"
+        tmp_path = self.path / f".{start}-{end}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def load(self, start: int, end: int) -> pd.DataFrame:
+        """
+        Читает результат батча.
+
+        :param start: Позиция первого клиента батча.
+        :param end: Позиция после последнего клиента батча.
+        :return: DataFrame с результатом.
+        """
+        return pd.read_parquet(self.path / f"{start}-{end}.parquet")
+
+
+class Checkpoint:
+    def __init__(self, directory: str, keep: bool = False) -> None:
+        """
+        Хранилище промежуточных результатов расчета фичей для возобновления прерванного запуска.
+
+        Запуск определяется списком клиентов (хэш их ID), фича — именем и хэшем запроса.
+        Повторный запуск с тем же списком клиентов пропускает уже сохраненные диапазоны
+        и считает только недостающие.
+
+        :param directory: Каталог хранилища.
+        :param keep: Не удалять результаты после успешного завершения запуска.
+        """
+        self.directory = Path(directory)
+        self.keep = keep
+
+    @staticmethod
+    def run_key(customers: pd.DataFrame) -> str:
+        """
+        Ключ запуска: хэш списка клиентов в порядке таблицы запуска. Позиции батчей имеют смысл
+        только для того же списка, поэтому другой список клиентов начинает запуск заново.
+
+        :param customers: DataFrame с customer_mindbox_id.
+        :return: Шестнадцатеричная строка.
+        """
+        ids = np.ascontiguousarray(customers["customer_mindbox_id"].to_numpy(dtype=np.int64))
+        return hashlib.sha256(ids.tobytes()).hexdigest()[:16]
+
+    def for_feature(self, run_key: str, name: str, query: str, mode: str = "batches") -> FeatureCheckpoint:
+        """
+        Возвращает хранилище батчей фичи в запуске.
+
+        :param run_key: Ключ запуска (run_key).
+        :param name: Имя фичи.
+        :param query: Шаблон запроса фичи (при изменении запроса старые результаты не используются).
+        :param mode: Режим расчета ("batches" или "ship_ids" — один батч на всех клиентов).
+        :return: FeatureCheckpoint.
+        """
+        digest = hashlib.sha256(f"{mode}\n{query}".encode("utf-8")).hexdigest()[:12]
+        return FeatureCheckpoint(self.directory / run_key / f"{name}-{digest}")
+
+    def clear(self, run_key: str) -> None:
+        """
+        Удаляет результаты запуска (если не задан keep).
+
+        :param run_key: Ключ запуска.
+        """
+        if not self.keep:
+            shutil.rmtree(self.directory / run_key, ignore_errors=True)
\ No newline at end of file
@@ -1,18 +1,231 @@
 import os
+import time
+import uuid
+import threading
 import pandas as pd
-from sqlalchemy import create_engine
-from sqlalchemy.engine import URL
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.pool import QueuePool
 from dotenv import load_dotenv
-from typing import Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+from frame_utils import cast_frame, concat_frames
+from query_cache import QueryCache
 
 load_dotenv()
 
-class DatabaseConnection:
+DEFAULT_QUERY_CACHE_TTL = 86400
+
+
+class PoolStats:
     def __init__(self) -> None:
+        """
+        Счетчики пула соединений: выдачи, ожидания свободного соединения и открытие новых соединений.
+        """
+        self.lock = threading.Lock()
+        self.checkouts: int = 0
+        self.waits: int = 0
+        self.wait_seconds: float = 0.0
+        self.connects: int = 0
+        self.connect_seconds: float = 0.0
+
+    def record_checkout(self, waited: bool, seconds: float) -> None:
+        """
+        Учитывает выдачу соединения из пула.
+
+        :param waited: Свободных соединений не было, пришлось ждать
+        :param seconds: Время получения соединения
+        """
+        with self.lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.wait_seconds += seconds
+
+    def record_connect(self, seconds: float) -> None:
+        """
+        Учитывает открытие нового соединения с БД.
+
+        :param seconds: Время открытия соединения
+        """
+        with self.lock:
+            self.connects += 1
+            self.connect_seconds += seconds
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool, который учитывает в PoolStats выдачи соединений и ожидания свободного соединения."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self) -> Any:
+        """
+        Выдает соединение из пула и учитывает, пришлось ли ждать свободное.
+
+        :return: Запись пула.
+        """
+        waited = self.checkedin() == 0 and -1 < self._max_overflow <= self.overflow()
+        started = time.perf_counter()
+        record = super()._do_get()
+        if self.stats is not None:
+            self.stats.record_checkout(waited, time.perf_counter() - started)
+        return record
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        """
+        Пересоздает пул (dispose, after_fork) с теми же счетчиками.
+
+        :return: Новый пул.
+        """
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def instrument_connects(engine: Engine, stats: PoolStats, query_timeout: Optional[int] = None) -> None:
+    """
+    Подписывается на открытие физических соединений engine: учитывает время открытия в PoolStats
+    и выставляет таймаут запросов. События срабатывают на каждое открытие, в том числе при
+    переоткрытии соединения после pool_recycle или неудачного pre-ping.
+
+    :param engine: Engine, соединения которого нужно учитывать.
+    :param stats: Счетчики пула.
+    :param query_timeout: Таймаут выполнения запроса в секундах (None — без ограничения).
+    """
+    @event.listens_for(engine, "do_connect")
+    def timed_connect(dialect, connection_record, cargs, cparams):
+        started = time.perf_counter()
+        dbapi_connection = dialect.connect(*cargs, **cparams)
+        stats.record_connect(time.perf_counter() - started)
+        return dbapi_connection
+
+    @event.listens_for(engine, "connect")
+    def set_query_timeout(dbapi_connection, connection_record):
+        if query_timeout and hasattr(dbapi_connection, "timeout"):
+            # pyodbc: таймаут выполнения запроса в секундах
+            dbapi_connection.timeout = query_timeout
+
+
+class EngineRegistry:
+    def __init__(self) -> None:
+        """
+        Общий на процесс реестр engine: один engine и пул соединений на строку подключения.
+        Безопасен для использования из нескольких потоков; после fork пулы сбрасываются.
+        """
+        self.lock = threading.Lock()
+        self.engines: Dict[str, Engine] = {}
+        self.stats_by_url: Dict[str, PoolStats] = {}
+
+    def get(self, url: URL, pool_size: int = 5, max_overflow: int = 10, pool_timeout: float = 30,
+            pool_recycle: int = 1800, query_timeout: Optional[int] = None, **engine_kwargs: Any) -> Engine:
+        """
+        Возвращает engine для строки подключения, создавая его при первом обращении.
+        Параметры пула применяются только при создании engine.
+
+        :param url: Строка подключения SQLAlchemy.
+        :param pool_size: Число постоянных соединений в пуле.
+        :param max_overflow: Число дополнительных соединений сверх pool_size.
+        :param pool_timeout: Сколько секунд ждать свободное соединение.
+        :param pool_recycle: Через сколько секунд переоткрывать соединение.
+        :param query_timeout: Таймаут выполнения запроса в секундах (None — без ограничения).
+        :param engine_kwargs: Прочие параметры create_engine.
+        :return: Общий engine.
+        """
+        key = url.render_as_string(hide_password=False) if isinstance(url, URL) else str(url)
+        with self.lock:
+            engine = self.engines.get(key)
+            if engine is None:
+                engine = create_engine(url, poolclass=InstrumentedQueuePool, pool_size=pool_size,
+                                       max_overflow=max_overflow, pool_timeout=pool_timeout,
+                                       pool_recycle=pool_recycle, pool_pre_ping=True, **engine_kwargs)
+                stats = PoolStats()
+                engine.pool.stats = stats
+                instrument_connects(engine, stats, query_timeout)
+                self.engines[key] = engine
+                self.stats_by_url[key] = stats
+            return engine
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Возвращает статистику пулов: сколько соединений выдано сейчас, ожидания и время открытия.
+
+        :return: Словарь {строка подключения без пароля: статистика}.
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        with self.lock:
+            for key, engine in self.engines.items():
+                stats = self.stats_by_url[key]
+                pool = engine.pool
+                result[engine.url.render_as_string(hide_password=True)] = {
+                    "pool_size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "overflow": pool.overflow(),
+                    "checkouts": stats.checkouts,
+                    "waits": stats.waits,
+                    "wait_seconds": stats.wait_seconds,
+                    "connects": stats.connects,
+                    "connect_seconds": stats.connect_seconds,
+                }
+        return result
+
+    def reset(self) -> None:
+        """Закрывает все пулы и очищает реестр."""
+        with self.lock:
+            for engine in self.engines.values():
+                engine.dispose()
+            self.engines.clear()
+            self.stats_by_url.clear()
+
+    def after_fork(self) -> None:
+        """
+        Вызывается в дочернем процессе после fork: соединения родителя не используются,
+        пулы создаются заново при следующем обращении.
+        """
+        self.lock = threading.Lock()
+        for engine in self.engines.values():
+            engine.dispose(close=False)
+
+
+engine_registry = EngineRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engine_registry.after_fork)
+
+
+def cache_from_env() -> Optional[QueryCache]:
+    """
+    Создает кэш результатов запросов, если задана переменная QUERY_CACHE_DIR.
+    Время жизни записи (секунды) и предельный размер (МБ) — QUERY_CACHE_TTL и QUERY_CACHE_MAX_MB.
+    По умолчанию записи живут сутки (DEFAULT_QUERY_CACHE_TTL), QUERY_CACHE_TTL=0 отключает срок жизни.
+
+    :return: QueryCache или None, если кэш не включен.
+    """
+    directory = os.getenv("QUERY_CACHE_DIR")
+    if not directory:
+        return None
+    ttl = float(os.getenv("QUERY_CACHE_TTL") or DEFAULT_QUERY_CACHE_TTL) or None
+    max_mb = float(os.getenv("QUERY_CACHE_MAX_MB", "0"))
+    return QueryCache(directory, ttl=ttl, max_bytes=int(max_mb * 2 ** 20) if max_mb else None)
+
+
+class DatabaseConnection:
+    def __init__(self, engine: Optional[Engine] = None, cache: Optional[QueryCache] = None) -> None:
         """
         Инициализирует соединение с базой данных.
-        Загружает параметры из .env файла и устанавливает соединение.
+        Загружает параметры из .env файла и берет общий engine из engine_registry.
+        Размер пула и таймауты задаются переменными DB_POOL_SIZE, DB_MAX_OVERFLOW,
+        DB_POOL_TIMEOUT и DB_QUERY_TIMEOUT.
+
+        :param engine: Готовый engine (например, локальная SQLite для тестов); по умолчанию SQL Server из .env
+        :param cache: Кэш результатов select; по умолчанию создается из QUERY_CACHE_DIR (см. cache_from_env),
+            без этой переменной запросы не кэшируются
         """
+        self.cache: Optional[QueryCache] = cache or cache_from_env()
+        self.temporary_tables: Set[str] = set()
+        if engine is not None:
+            self.engine = engine
+            return
+
         server: str = os.getenv("DB_SERVER")
         database: str = os.getenv("DB_NAME")
         driver: str = "SQL Server"
@@ -20,7 +233,17 @@ class DatabaseConnection:
         connection_string: str = f"DRIVER={{{driver}}};SERVER={server};DATABASE={database};Trusted_Connection=yes"
         connection_url = URL.create("mssql+pyodbc", query={"odbc_connect": connection_string})
 
-        self.engine = create_engine(connection_url, use_setinputsizes=False)
+        query_timeout: int = int(os.getenv("DB_QUERY_TIMEOUT", "0"))
+
+        self.engine = engine_registry.get(
+            connection_url,
+            pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            query_timeout=query_timeout or None,
+            use_setinputsizes=False,
+            fast_executemany=True,
+        )
 
     def get_engine(self) -> Optional[object]:
         """
@@ -30,11 +253,101 @@ class DatabaseConnection:
         """
         return self.engine
 
-    def select(self, sql: str) -> pd.DataFrame:
+    def select(self, sql: str, dtypes: Optional[Dict[str, str]] = None,
+               chunksize: Optional[int] = None, use_cache: bool = True) -> pd.DataFrame:
         """
         Выполняет SQL-запрос и возвращает результат в виде DataFrame.
 
+        Если передана схема типов или размер части, результат читается потоково
+        (select_chunks): каждая часть сразу приводится к компактным типам, поэтому
+        в памяти не оказывается полный результат в int64/float64/object.
+
+        Если включен кэш (self.cache), результат сначала ищется в нем. Запросы к временным
+        таблицам ship_ids не кэшируются.
+
+        :param sql: SQL-запрос
+        :param dtypes: Схема типов {столбец: тип}, например {"shop": "category", "total_price": "float32"}
+        :param chunksize: Количество строк в одной части при потоковом чтении
+        :param use_cache: Использовать кэш (False — всегда выполнять запрос, например для водяных знаков)
+        :return: Результат запроса в виде DataFrame
+        """
+        cache = self.cache if use_cache and not self.reads_temporary_table(sql) else None
+        if cache is not None:
+            result = cache.get(sql, dtypes)
+            if result is None:
+                result = self.fetch(sql, dtypes, chunksize)
+                cache.put(sql, result, dtypes)
+            return result
+        return self.fetch(sql, dtypes, chunksize)
+
+    def reads_temporary_table(self, sql: str) -> bool:
+        """
+        Проверяет, читает ли запрос временную таблицу ship_ids: ее содержимое не входит в текст
+        запроса, поэтому такие результаты нельзя кэшировать.
+
+        :param sql: SQL-запрос
+        :return: True, если в запросе есть имя открытой временной таблицы
+        """
+        return any(table in sql for table in self.temporary_tables)
+
+    def fetch(self, sql: str, dtypes: Optional[Dict[str, str]] = None,
+              chunksize: Optional[int] = None) -> pd.DataFrame:
+        """
+        Выполняет SQL-запрос без кэша (см. select).
+
         :param sql: SQL-запрос
+        :param dtypes: Схема типов {столбец: тип}
+        :param chunksize: Количество строк в одной части при потоковом чтении
         :return: Результат запроса в виде DataFrame
         """
-        return pd.read_sql(sql, self.engine)
\ No newline at end of file
+        if dtypes is None and chunksize is None:
+            return pd.read_sql(sql, self.engine)
+        return concat_frames(list(self.select_chunks(sql, chunksize or 100_000, dtypes)))
+
+    def select_chunks(self, sql: str, chunksize: int = 100_000,
+                      dtypes: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Выполняет SQL-запрос с серверным курсором и возвращает результат частями.
+
+        :param sql: SQL-запрос
+        :param chunksize: Количество строк в одной части
+        :param dtypes: Схема типов {столбец: тип}, применяется к каждой части при чтении
+        :return: Итератор по частям результата
+        """
+        with self.engine.connect() as connection:
+            connection = connection.execution_options(stream_results=True, max_row_buffer=chunksize)
+            for chunk in pd.read_sql(sql, connection, chunksize=chunksize):
+                yield cast_frame(chunk, dtypes)
+
+    @contextmanager
+    def ship_ids(self, ids: Iterable[int], chunk_size: int = 10000) -> Iterator[str]:
+        """
+        Загружает ID клиентов во временную таблицу на время выполнения запросов.
+
+        На SQL Server используется глобальная временная таблица (##...), поэтому она видна
+        всем соединениям пула, в том числе параллельным запросам. Соединение, создавшее
+        таблицу, удерживается до выхода из контекста. На других СУБД (SQLite) создается
+        обычная таблица, которая удаляется при выходе.
+
+        :param ids: ID клиентов (customer_mindbox_id)
+        :param chunk_size: Количество строк в одной пачке вставки
+        :return: Подзапрос со списком ID для подстановки в плейсхолдер {values}
+        """
+        unique_ids = pd.unique(pd.Series(ids, dtype="int64"))
+        prefix = "##" if self.engine.dialect.name == "mssql" else ""
+        table = f"{prefix}customer_ids_{uuid.uuid4().hex}"
+
+        with self.engine.connect() as connection:
+            connection.execute(text(f"CREATE TABLE {table} (customer_mindbox_id BIGINT PRIMARY KEY)"))
+            insert = text(f"INSERT INTO {table} (customer_mindbox_id) VALUES (:customer_mindbox_id)")
+            for start in range(0, len(unique_ids), chunk_size):
+                rows = [{"customer_mindbox_id": int(id_)} for id_ in unique_ids[start:start + chunk_size]]
+                connection.execute(insert, rows)
+            connection.commit()
+            self.temporary_tables.add(table)
+            try:
+                yield f"SELECT customer_mindbox_id FROM {table}"
+            finally:
+                self.temporary_tables.discard(table)
+                connection.execute(text(f"DROP TABLE {table}"))
+                connection.commit()
\ No newline at end of file
@@ -1,19 +1,38 @@
 import pandas as pd
 from connection import DatabaseConnection
-from typing import Optional
+from typing import Dict, Iterator, Optional
 
 class DataLoader:
-    def __init__(self) -> None:
+    def __init__(self, db: Optional[DatabaseConnection] = None) -> None:
         """
         Инициализирует объект DataLoader и создает экземпляр подключения к базе данных.
+
+        :param db: Готовое подключение (по умолчанию — DatabaseConnection из переменных окружения)
         """
-        self.db: DatabaseConnection = DatabaseConnection()
+        self.db: DatabaseConnection = db or DatabaseConnection()
 
-    def load_data(self, query: str) -> pd.DataFrame:
+    def load_data(self, query: str, dtypes: Optional[Dict[str, str]] = None,
+                  chunksize: Optional[int] = None) -> pd.DataFrame:
         """
         Загружает данные из базы данных, выполняя SQL-запрос.
 
         :param query: SQL-запрос в виде строки
+        :param dtypes: Схема типов {столбец: тип}, применяется при чтении
+        :param chunksize: Размер части при потоковом чтении
         :return: Результат запроса в виде DataFrame
         """
-        return self.db.select(query)
\ No newline at end of file
+        if dtypes is None and chunksize is None:
+            return self.db.select(query)
+        return self.db.select(query, dtypes=dtypes, chunksize=chunksize)
+
+    def iter_data(self, query: str, chunksize: int = 100_000,
+                  dtypes: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Загружает данные частями фиксированного размера (например, для обучающей выборки по всей базе).
+
+        :param query: SQL-запрос в виде строки
+        :param chunksize: Количество строк в одной части
+        :param dtypes: Схема типов {столбец: тип}, применяется к каждой части
+        :return: Итератор по частям результата
+        """
+        return self.db.select_chunks(query, chunksize, dtypes)
\ No newline at end of file
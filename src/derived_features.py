@@ -0,0 +1,221 @@
+import ast
+import operator
+import yaml
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from frame_utils import float_dtype
+
+DERIVED_FEATURES_PATH = Path(__file__).resolve().parent.parent / "derived_features.yaml"
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+COMPARISONS = {
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+FUNCTIONS = {
+    "fmin": np.fmin,
+    "fmax": np.fmax,
+    "fill": lambda x, value: np.where(np.isnan(x), value, x),
+    "where": np.where,
+    "abs": np.abs,
+    "log1p": np.log1p,
+}
+
+
+class DerivedFeature:
+    def __init__(self, name: str, expression: str, dtype: Optional[str] = None) -> None:
+        """
+        Производная фича: векторное выражение над столбцами.
+
+        :param name: Имя фичи.
+        :param expression: Выражение (подмножество Python: арифметика, сравнения, функции FUNCTIONS).
+        :param dtype: Тип результата (по умолчанию float32, если все входные столбцы
+            не шире 4 байт, иначе float64 — см. frame_utils.float_dtype).
+        """
+        self.name = name
+        self.expression = expression
+        self.dtype = dtype
+        self.inputs: Set[str] = set()
+        self.evaluate: Callable[[Dict[str, np.ndarray]], np.ndarray] = self.compile(
+            ast.parse(expression, mode="eval").body
+        )
+
+    def compile(self, node: ast.AST) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+        """
+        Переводит узел выражения в функцию от словаря столбцов, собирая имена входных столбцов.
+
+        :param node: Узел AST.
+        :return: Функция {столбец: массив} -> массив.
+        """
+        if isinstance(node, ast.Name):
+            self.inputs.add(node.id)
+            return lambda columns: columns[node.id]
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return lambda columns: node.value
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self.compile(node.operand)
+            return lambda columns: -operand(columns)
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            func, left, right = BINARY_OPERATORS[type(node.op)], self.compile(node.left), self.compile(node.right)
+            return lambda columns: func(left(columns), right(columns))
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in COMPARISONS:
+            func, left, right = COMPARISONS[type(node.ops[0])], self.compile(node.left), self.compile(node.comparators[0])
+            return lambda columns: func(left(columns), right(columns))
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS:
+            func, args = FUNCTIONS[node.func.id], [self.compile(arg) for arg in node.args]
+            return lambda columns: func(*(arg(columns) for arg in args))
+        raise ValueError(f"Недопустимое выражение в фиче {self.name}: {ast.unparse(node)}")
+
+
+class DerivedFeatures:
+    def __init__(self, definitions: List[Dict[str, str]]) -> None:
+        """
+        Набор производных фич, упорядоченный по зависимостям.
+
+        :param definitions: Список словарей с ключами name, expression и необязательным dtype.
+        """
+        self.features: Dict[str, DerivedFeature] = {}
+        for definition in definitions:
+            feature = DerivedFeature(**definition)
+            self.features[feature.name] = feature
+        self.order: List[str] = self.resolve()
+
+    @classmethod
+    def from_yaml(cls, path: str = DERIVED_FEATURES_PATH) -> "DerivedFeatures":
+        """
+        Загружает производные фичи из YAML (ключ derived_features).
+
+        :param path: Путь к файлу.
+        :return: Объект DerivedFeatures.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f)
+        return cls(config.get("derived_features", []))
+
+    def resolve(self) -> List[str]:
+        """
+        Топологически сортирует фичи (фичи, от которых зависят другие, — раньше).
+
+        :return: Имена фич в порядке вычисления.
+        """
+        order, state = [], {}
+
+        def visit(name: str) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Циклическая зависимость производных фич: {name}")
+            state[name] = "visiting"
+            for dependency in sorted(self.features[name].inputs):
+                if dependency in self.features:
+                    visit(dependency)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.features:
+            visit(name)
+        return order
+
+    def plan(self, columns: Iterable[str], drop: Iterable[str] = ()) -> List[DerivedFeature]:
+        """
+        Выбирает фичи для вычисления: пропускает те, для которых нет входных столбцов,
+        и те, что будут удалены и не нужны другим фичам.
+
+        :param columns: Имеющиеся столбцы.
+        :param drop: Столбцы, которые будут удалены из результата.
+        :return: Фичи в порядке вычисления.
+        """
+        available, drop = set(columns), set(drop)
+        computable = []
+        for name in self.order:
+            feature = self.features[name]
+            if feature.inputs <= available:
+                computable.append(feature)
+                available.add(name)
+
+        needed = {feature.name for feature in computable if feature.name not in drop}
+        for feature in reversed(computable):
+            if feature.name in needed:
+                needed |= feature.inputs & set(self.features)
+        return [feature for feature in computable if feature.name in needed]
+
+    def generate(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Вычисляет все доступные фичи (поведение FeatureEngineering.generate_features).
+
+        :param df: Исходный DataFrame.
+        :return: Словарь {фича: массив} в порядке вычисления.
+        """
+        return self.evaluate(df, self.plan(df.columns))
+
+    @staticmethod
+    def evaluate(df: pd.DataFrame, plan: List[DerivedFeature]) -> Dict[str, np.ndarray]:
+        """
+        Вычисляет фичи плана по порядку на массивах float64 и приводит результат к типу фичи
+        (dtype из описания или общий тип входных столбцов).
+
+        :param df: Исходный DataFrame.
+        :param plan: Фичи в порядке вычисления (см. plan).
+        :return: Словарь {фича: массив}.
+        """
+        inputs = set().union(*(feature.inputs for feature in plan)) if plan else set()
+        columns = {name: df[name].to_numpy(dtype=np.float64, na_value=np.nan) for name in inputs if name in df.columns}
+        dtypes = {name: df[name].dtype for name in inputs if name in df.columns}
+        results = {}
+        for feature in plan:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.asarray(feature.evaluate(columns), dtype=np.float64)
+            columns[feature.name] = values
+            dtypes[feature.name] = np.dtype(feature.dtype) if feature.dtype else float_dtype(
+                *(dtypes[name] for name in sorted(feature.inputs)))
+            results[feature.name] = values.astype(dtypes[feature.name], copy=False)
+        return results
+
+    def transform(self, df: pd.DataFrame, drop: Iterable[str] = (),
+                  key: str = "customer_mindbox_id") -> pd.DataFrame:
+        """
+        Один проход вместо generate_features + clean_data: считает только нужные фичи,
+        не копирует удаляемые столбцы, заменяет NaN/inf нулями и делает key индексом
+        (столбец key остается в данных).
+
+        :param df: Исходный DataFrame.
+        :param drop: Столбцы, которые нужно удалить.
+        :param key: Столбец-индекс.
+        :return: DataFrame как после clean_data(generate_features()).
+        """
+        drop = set(drop)
+        derived = self.evaluate(df, self.plan(df.columns, drop))
+        data = {}
+        for name in [column for column in df.columns if column not in drop and column not in derived]:
+            data[name] = self.clean(df[name].to_numpy())
+        for name, values in derived.items():
+            if name not in drop:
+                data[name] = self.clean(values)
+        result = pd.DataFrame(data, copy=False)
+        result.index = pd.Index(df[key].to_numpy(), name=key)
+        return result
+
+    @staticmethod
+    def clean(values: np.ndarray) -> np.ndarray:
+        """
+        Заменяет NaN и inf нулями (без копии для целочисленных столбцов).
+
+        :param values: Массив столбца.
+        :return: Очищенный массив.
+        """
+        if values.dtype.kind == "f":
+            return np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+        if values.dtype == object:
+            return pd.Series(values).fillna(0).to_numpy()
+        return values
\ No newline at end of file
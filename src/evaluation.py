@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+
+class StreamingEvaluator:
+    def __init__(self, n_bins: int = 10000) -> None:
+        """
+        Инкрементальная оценка бинарного классификатора по частям данных.
+
+        Скоры раскладываются в гистограммы фиксированного разрешения отдельно для положительных и
+        отрицательных примеров. Бин 0 содержит нулевые скоры, бин k — скоры из ((k - 1) / n_bins, k / n_bins],
+        поэтому «скор > k / n_bins» — ровно бины k + 1 и выше, как у порога в Model.predict. Память не
+        зависит от объема данных; AUC точен с точностью до разрешения гистограммы.
+
+        :param n_bins: Количество бинов на отрезке [0, 1].
+        """
+        self.n_bins = n_bins
+        self.positives = np.zeros(n_bins + 1, dtype=np.int64)
+        self.negatives = np.zeros(n_bins + 1, dtype=np.int64)
+
+    def update(self, y_true: Iterable[int], y_score: Iterable[float]) -> None:
+        """
+        Добавляет часть данных.
+
+        :param y_true: Истинные метки (0/1).
+        :param y_score: Предсказанные вероятности положительного класса.
+        """
+        y_true = np.asarray(y_true).astype(bool)
+        bins = np.ceil(np.asarray(y_score, dtype=np.float64) * self.n_bins).astype(np.int64)
+        np.clip(bins, 0, self.n_bins, out=bins)
+        self.positives += np.bincount(bins[y_true], minlength=self.n_bins + 1)
+        self.negatives += np.bincount(bins[~y_true], minlength=self.n_bins + 1)
+
+    @property
+    def count(self) -> int:
+        """
+        :return: Сколько строк учтено.
+        """
+        return int(self.positives.sum() + self.negatives.sum())
+
+    def roc_auc(self) -> float:
+        """
+        ROC AUC по гистограммам: доля пар (положительный, отрицательный), где скор
+        положительного выше; пары из одного бина считаются за половину.
+
+        :return: ROC AUC.
+        """
+        n_pos, n_neg = self.positives.sum(), self.negatives.sum()
+        if n_pos == 0 or n_neg == 0:
+            return float("nan")
+        negatives_below = np.cumsum(self.negatives) - self.negatives
+        pairs = (self.positives * negatives_below).sum() + 0.5 * (self.positives * self.negatives).sum()
+        return float(pairs / (n_pos * n_neg))
+
+    def confusion(self, thresholds: Optional[Iterable[float]] = None) -> pd.DataFrame:
+        """
+        Матрицы ошибок сразу для многих порогов: положительный прогноз — скор > threshold.
+
+        :param thresholds: Пороги (по умолчанию 0.00, 0.01, ..., 0.99).
+        :return: DataFrame со столбцами threshold, tp, fp, fn, tn.
+        """
+        if thresholds is None:
+            thresholds = np.round(np.arange(0, 1, 0.01), 2)
+        thresholds = np.asarray(list(thresholds), dtype=np.float64)
+        first_bin = np.clip(np.round(thresholds * self.n_bins).astype(np.int64) + 1, 0, self.n_bins + 1)
+        # Количество примеров в бинах first_bin и выше
+        positives_above = np.concatenate([np.cumsum(self.positives[::-1])[::-1], [0]])
+        negatives_above = np.concatenate([np.cumsum(self.negatives[::-1])[::-1], [0]])
+        tp = positives_above[first_bin]
+        fp = negatives_above[first_bin]
+        return pd.DataFrame({
+            "threshold": thresholds,
+            "tp": tp,
+            "fp": fp,
+            "fn": self.positives.sum() - tp,
+            "tn": self.negatives.sum() - fp,
+        })
+
+    def threshold_table(self, thresholds: Optional[Iterable[float]] = None) -> pd.DataFrame:
+        """
+        Таблица выбора порога: матрица ошибок и метрики для каждого порога.
+
+        :param thresholds: Пороги (по умолчанию 0.00, 0.01, ..., 0.99).
+        :return: DataFrame: threshold, tp, fp, fn, tn, precision, recall, f1, fpr, positive_rate.
+        """
+        table = self.confusion(thresholds)
+        predicted = table["tp"] + table["fp"]
+        actual = table["tp"] + table["fn"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            table["precision"] = np.where(predicted > 0, table["tp"] / predicted, 0.0)
+            table["recall"] = np.where(actual > 0, table["tp"] / actual, 0.0)
+            total = table["precision"] + table["recall"]
+            table["f1"] = np.where(total > 0, 2 * table["precision"] * table["recall"] / total, 0.0)
+            negatives = table["fp"] + table["tn"]
+            table["fpr"] = np.where(negatives > 0, table["fp"] / negatives, 0.0)
+        table["positive_rate"] = predicted / max(self.count, 1)
+        return table
+
+    def metrics(self, threshold: float = 0.5) -> Dict[str, float]:
+        """
+        Метрики в формате Model.evaluate.
+
+        :param threshold: Порог класса.
+        :return: Словарь ROC AUC, F1-score, Precision, Recall.
+        """
+        row = self.threshold_table([threshold]).iloc[0]
+        return {
+            "ROC AUC": self.roc_auc(),
+            "F1-score": float(row["f1"]),
+            "Precision": float(row["precision"]),
+            "Recall": float(row["recall"]),
+        }
\ No newline at end of file
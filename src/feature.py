@@ -1,55 +1,205 @@
+import time
 import pandas as pd
-import gc
-from typing import Callable
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from batch_sizing import BatchSizer
+from checkpoint import FeatureCheckpoint, RetryPolicy
+from frame_utils import concat_frames
+from instrumentation import frame_bytes, metrics
+
+
+class FeatureBatchError(Exception):
+    def __init__(self, feature_name: str, batch_no: int, batch: pd.DataFrame, error: Exception) -> None:
+        """
+        Ошибка при вычислении одного батча фичи.
+
+        :param feature_name: Имя фичи
+        :param batch_no: Номер батча (с нуля)
+        :param batch: DataFrame с клиентами батча
+        :param error: Исходное исключение
+        """
+        self.feature_name: str = feature_name
+        self.batch_no: int = batch_no
+        self.first_id = batch["customer_mindbox_id"].iloc[0] if len(batch) else None
+        self.last_id = batch["customer_mindbox_id"].iloc[-1] if len(batch) else None
+        self.error: Exception = error
+        super().__init__(
+            f"Ошибка при вычислении фичи '{feature_name}' в батче {batch_no} "
+            f"(customer_mindbox_id {self.first_id}..{self.last_id}): {error}"
+        )
+
 
 class Feature:
-    def __init__(self, name: str, calculate_query: str, batch_size: int = 1000) -> None:
+    def __init__(self, name: str, calculate_query: str, batch_size: int = 1000, drift: int = 0,
+                 dtypes: Optional[Dict[str, str]] = None) -> None:
         """
         Инициализирует объект Feature с параметрами для вычисления фичи.
 
+        Если задан batch_sizer (FeatureManager(batch_sizer=...)), batch_size — только начальный
+        размер, дальше размер батча подбирается по времени выполнения предыдущих батчей.
+        Если задан checkpoint, результат каждого батча сохраняется на диск, а уже сохраненные
+        диапазоны клиентов не пересчитываются; retry повторяет батч после временных ошибок.
+
         :param name: Имя фичи
         :param calculate_query: SQL-запрос для вычисления фичи
         :param batch_size: Размер батча для обработки (по умолчанию 1000)
+        :param drift: Изменение значения за сутки без новой активности клиента
+            (1 для "дней с последней покупки", -1 для "дней до сгорания", 0 — не меняется)
+        :param dtypes: Схема типов результата {столбец: тип}, применяется при чтении
         """
         self.name: str = name
         self.calculate_query: str = calculate_query
         self.batch_size: int = batch_size
+        self.drift: int = drift
+        self.dtypes: Optional[Dict[str, str]] = dtypes
+        self.batch_sizer: Optional[BatchSizer] = None
+        self.checkpoint: Optional[FeatureCheckpoint] = None
+        self.retry: Optional[RetryPolicy] = None
         self.df: pd.DataFrame = pd.DataFrame()
 
-    def calculate_batch(self, batch: pd.DataFrame, select_func: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+    def split_batches(self, customers: pd.DataFrame, id_query: Optional[str] = None,
+                      done: Optional[List[Tuple[int, int]]] = None) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Разбивает клиентов на батчи. Батчи создаются лениво: размер следующего батча
+        определяется в момент, когда он нужен, с учетом уже выполненных батчей (batch_sizer).
+
+        :param customers: DataFrame с клиентами
+        :param id_query: Подзапрос со списком ID (режим временной таблицы) — тогда батч один
+        :param done: Уже посчитанные диапазоны позиций [start, end) — пропускаются
+        :return: Итератор по парам (позиция первого клиента, батч) в исходном порядке
+        """
+        done = done or []
+        if id_query is not None:
+            if len(customers) and not done:
+                yield 0, customers
+            return
+        id_width = len(str(customers["customer_mindbox_id"].max())) + 2 if len(customers) else 0
+        start = 0
+        for done_start, done_end in done + [(len(customers), len(customers))]:
+            while start < done_start:
+                size = min(self.next_batch_size(id_width), done_start - start)
+                yield start, customers[start:start + size]
+                start += size
+            start = max(start, done_end)
+
+    def next_batch_size(self, id_width: int) -> int:
+        """
+        Размер следующего батча: batch_size или размер, подобранный batch_sizer.
+
+        :param id_width: Размер одного ID в тексте запроса вместе с разделителем
+        :return: Количество клиентов в батче
+        """
+        if self.batch_sizer is None:
+            return self.batch_size
+        return self.batch_sizer.batch_size(self.name, self.batch_size, len(self.calculate_query), id_width)
+
+    def calculate_batch(self, batch: pd.DataFrame, select_func: Callable[[str], pd.DataFrame],
+                        id_query: Optional[str] = None) -> pd.DataFrame:
         """
         Выполняет SQL-запрос для одного батча клиентов.
 
         :param batch: DataFrame с клиентами для обработки
         :param select_func: Функция для выполнения SQL-запроса
+        :param id_query: Подзапрос со списком ID вместо перечисления ID батча в тексте запроса
         :return: DataFrame с результатами запроса
         """
-        values = ', '.join(map(str, batch['customer_mindbox_id']))
+        values = id_query if id_query is not None else ', '.join(map(str, batch['customer_mindbox_id']))
         query = self.calculate_query.format(values=values)
-        return select_func(query)
+        with metrics.span("feature_query", feature=self.name) as span:
+            result = select_func(query)
+            span.add(batches=1, ids=len(batch), rows=len(result), bytes=frame_bytes(result),
+                     query_bytes=len(query))
+        return result
+
+    def run_batch(self, batch_no: int, batch: pd.DataFrame, select_func: Callable[[str], pd.DataFrame],
+                  id_query: Optional[str] = None, start: int = 0) -> pd.DataFrame:
+        """
+        Вычисляет батч, оборачивая ошибки в FeatureBatchError с именем фичи и номером батча.
+        Временные ошибки повторяются по self.retry, результат сохраняется в self.checkpoint.
+
+        :param batch_no: Номер батча (с нуля)
+        :param batch: DataFrame с клиентами для обработки
+        :param select_func: Функция для выполнения SQL-запроса
+        :param id_query: Подзапрос со списком ID (режим временной таблицы)
+        :param start: Позиция первого клиента батча в таблице клиентов
+        :return: DataFrame с результатами запроса
+        """
+        attempt = 1
+        while True:
+            started = time.perf_counter()
+            try:
+                result = self.calculate_batch(batch, select_func, id_query)
+                break
+            except Exception as e:
+                if self.retry is None or not self.retry.should_retry(e, attempt):
+                    raise FeatureBatchError(self.name, batch_no, batch, e) from e
+                with metrics.span("feature_retry", feature=self.name):
+                    self.retry.wait(attempt)
+                attempt += 1
+        if self.batch_sizer is not None and id_query is None:
+            self.batch_sizer.observe(self.name, len(batch), time.perf_counter() - started, len(result))
+        if self.checkpoint is not None:
+            self.checkpoint.save(start, start + len(batch), result)
+        return result
+
+    def done_ranges(self) -> List[Tuple[int, int]]:
+        """
+        Диапазоны позиций клиентов, результаты которых уже сохранены в checkpoint.
+
+        :return: Отсортированный список (start, end).
+        """
+        return self.checkpoint.ranges() if self.checkpoint is not None else []
+
+    def collect(self, results: Dict[int, pd.DataFrame], done: List[Tuple[int, int]]) -> pd.DataFrame:
+        """
+        Объединяет посчитанные батчи и сохраненные в checkpoint диапазоны в порядке клиентов.
+
+        :param results: Результаты батчей по позиции первого клиента
+        :param done: Диапазоны, пропущенные при расчете (берутся из checkpoint)
+        :return: DataFrame с объединенными результатами
+        """
+        results = dict(results)
+        for done_start, done_end in done:
+            results[done_start] = self.checkpoint.load(done_start, done_end)
+        return self.combine([results[start] for start in sorted(results)])
+
+    def combine(self, results: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Объединяет результаты батчей (в порядке батчей) в один DataFrame.
+
+        :param results: Список результатов батчей
+        :return: DataFrame с объединенными результатами
+        """
+        return concat_frames(results)
 
-    def calculate(self, customers: pd.DataFrame, select_func: Callable[[str], pd.DataFrame]) -> pd.DataFrame:
+    def calculate(self, customers: pd.DataFrame, select_func: Callable[[str], pd.DataFrame],
+                  id_query: Optional[str] = None) -> pd.DataFrame:
         """
         Разбивает клиентов на батчи и выполняет запросы для каждой группы клиентов.
 
         :param customers: DataFrame с клиентами
         :param select_func: Функция для выполнения SQL-запроса
+        :param id_query: Подзапрос со списком ID (режим временной таблицы) — один запрос на фичу
         :return: DataFrame с объединенными результатами
         """
-        customer_batches = [customers[i:i + self.batch_size] for i in range(0, len(customers), self.batch_size)]
-        all_results = [self.calculate_batch(batch, select_func) for batch in customer_batches]
-        return pd.concat(all_results, ignore_index=True)
+        done = self.done_ranges()
+        customer_batches = self.split_batches(customers, id_query, done)
+        results = {
+            start: self.run_batch(batch_no, batch, select_func, id_query, start)
+            for batch_no, (start, batch) in enumerate(customer_batches)
+        }
+        return self.collect(results, done)
 
-    def read(self, customers: pd.DataFrame, select_func: Callable[[str], pd.DataFrame]) -> None:
+    def read(self, customers: pd.DataFrame, select_func: Callable[[str], pd.DataFrame],
+             id_query: Optional[str] = None) -> None:
         """
         Читает данные и сохраняет их в self.df.
 
         :param customers: DataFrame с клиентами
         :param select_func: Функция для выполнения SQL-запроса
+        :param id_query: Подзапрос со списком ID (режим временной таблицы)
         """
-        self.df = self.calculate(customers, select_func)
+        self.df = self.calculate(customers, select_func, id_query)
 
     def purge(self) -> None:
         """Очищает данные из памяти"""
-        del self.df
-        gc.collect()
\ No newline at end of file
+        del self.df
\ No newline at end of file
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pandas.api.types import is_integer_dtype
+from typing import Dict, List, Optional
+from frame_utils import float_dtype
+
+
+class FeatureAssembler:
+    def __init__(self, customers: pd.DataFrame, key: str = "customer_mindbox_id",
+                 spill_dir: Optional[str] = None) -> None:
+        """
+        Собирает результаты фичей в одну таблицу без цепочки merge.
+
+        Индекс ID клиентов строится один раз; результат каждой фичи выравнивается по нему
+        векторным поиском позиций и записывается отдельными столбцами. Итоговый DataFrame
+        создается один раз в build() и совпадает с результатом
+        customers.merge(feature.df, on=key, how="left") для всех фичей по очереди.
+
+        :param customers: Данные клиентов в виде DataFrame.
+        :param key: Столбец с ID клиента.
+        :param spill_dir: Каталог, в который числовые столбцы записываются файлами .npy
+            и открываются через np.memmap, а не держатся в памяти (None — в памяти).
+        """
+        self.customers = customers
+        self.key = key
+        self.index = pd.Index(customers[key])
+        self.columns: Dict[str, object] = {}
+        self.spill_dir: Optional[Path] = Path(spill_dir) if spill_dir is not None else None
+
+    def gather_indexer(self, ids: pd.Series) -> np.ndarray:
+        """
+        Для каждой строки customers находит позицию строки с тем же ID в результате фичи.
+
+        :param ids: ID клиентов из результата фичи (уникальные).
+        :return: Массив позиций длины len(customers), -1 — клиента нет в результате.
+        """
+        if not self.index.is_unique:
+            return pd.Index(ids).get_indexer(self.customers[self.key])
+        positions = self.index.get_indexer(ids)
+        found = positions >= 0
+        indexer = np.full(len(self.index), -1, dtype=np.intp)
+        indexer[positions[found]] = np.flatnonzero(found)
+        return indexer
+
+    def add(self, df: pd.DataFrame, name: str = "") -> None:
+        """
+        Выравнивает результат фичи по клиентам и добавляет его столбцы.
+
+        Клиенты без строки в результате получают пропуск; типы приводятся так же, как при
+        левом merge (int64 с пропусками — float64, bool с пропусками — object), но компактные
+        целые (int8..int32, в том числе nullable Int16/Int32) с пропусками становятся float32,
+        а не float64. Nullable-целые без пропусков возвращаются к типу numpy.
+
+        :param df: Результат фичи со столбцом key.
+        :param name: Имя фичи для сообщений об ошибках.
+        """
+        ids = df[self.key]
+        if not ids.is_unique:
+            raise ValueError(f"Результат фичи '{name}' содержит повторяющиеся {self.key}")
+        indexer = self.gather_indexer(ids)
+        unmatched = bool((indexer < 0).any())
+        for column in df.columns:
+            if column == self.key:
+                continue
+            if column in self.columns or column in self.customers.columns:
+                raise ValueError(f"Столбец '{column}' фичи '{name}' уже есть в таблице")
+            values = self.column_values(df[column], unmatched)
+            values = pd.api.extensions.take(values, indexer, allow_fill=True)
+            if self.spill_dir is not None and isinstance(values, np.ndarray) and values.dtype != object:
+                values = self.spill(values)
+            self.columns[column] = values
+
+    @staticmethod
+    def column_values(series: pd.Series, unmatched: bool) -> object:
+        """
+        Массив значений столбца для выравнивания по клиентам.
+
+        :param series: Столбец результата фичи.
+        :param unmatched: Есть клиенты без строки в результате (появятся пропуски).
+        :return: np.ndarray или массив расширения pandas.
+        """
+        dtype = series.dtype
+        if not is_integer_dtype(dtype):
+            return series.to_numpy() if isinstance(dtype, np.dtype) else series.array
+        if isinstance(dtype, np.dtype):
+            if unmatched and dtype.itemsize <= 4:
+                return series.to_numpy(dtype=np.float32)
+            return series.to_numpy()
+        if unmatched or series.hasnans:
+            return series.to_numpy(dtype=float_dtype(dtype), na_value=np.nan)
+        return series.to_numpy(dtype=dtype.numpy_dtype)
+
+    def spill(self, values: np.ndarray) -> np.ndarray:
+        """
+        Записывает столбец в файл .npy в spill_dir и возвращает его отображение в память.
+
+        :param values: Значения столбца.
+        :return: Массив с теми же значениями, отображенный на файл (np.ndarray поверх np.memmap).
+        """
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        path = self.spill_dir / f"{len(self.columns)}.npy"
+        mapped = np.lib.format.open_memmap(path, mode="w+", dtype=values.dtype, shape=values.shape)
+        mapped[:] = values
+        mapped.flush()
+        return mapped.view(np.ndarray)
+
+    def build(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Создает итоговую таблицу: столбцы клиентов и затем столбцы фичей.
+
+        :param columns: Порядок столбцов фичей (по умолчанию — порядок добавления).
+        :return: DataFrame с RangeIndex, как после merge. Столбцы из spill_dir не копируются
+            в память и остаются отображениями файлов.
+        """
+        data = {column: self.customers[column].array for column in self.customers.columns}
+        for column in columns if columns is not None else self.columns:
+            data[column] = self.columns[column]
+        return pd.DataFrame(data, index=pd.RangeIndex(len(self.customers)), copy=False)
\ No newline at end of file
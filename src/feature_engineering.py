@@ -5,36 +5,35 @@ import matplotlib.pyplot as plt
 import lightgbm as lgb
 from sklearn.model_selection import train_test_split
 from typing import Optional
+from derived_features import DerivedFeatures
+from instrumentation import metrics
 
 
 class FeatureEngineering:
-    def __init__(self, df: pd.DataFrame) -> None:
+    def __init__(self, df: pd.DataFrame, derived_features: Optional[DerivedFeatures] = None) -> None:
         """
         Класс для генерации новых признаков и построения корреляционной матрицы.
 
         :param df: Исходный DataFrame.
+        :param derived_features: Описание производных фич (по умолчанию derived_features.yaml).
         """
-        self.df = df.copy()
+        self.df = df
+        self.derived_features = derived_features or DerivedFeatures.from_yaml()
 
     def generate_features(self) -> pd.DataFrame:
         """
-        Создает новые признаки на основе имеющихся данных.
+        Создает новые признаки на основе имеющихся данных по описанию в derived_features.yaml.
+        Все новые столбцы добавляются одним concat, исходный DataFrame не изменяется.
+        Фичи, которые уже были в данных, пересчитываются и переносятся в конец.
 
         :return: DataFrame с добавленными признаками.
         """
-        if "days_since_last_purchase" in self.df.columns and "days_since_last_redemption" in self.df.columns:
-            self.df["days_since_last_activity"] = self.df[
-                ["days_since_last_purchase", "days_since_last_redemption"]
-            ].min(axis=1)
-
-        if "purchase_sum_restore" in self.df.columns and "bonus_write_offs" in self.df.columns:
-            self.df["purchase_value_per_bonus"] = self.df["purchase_sum_restore"] / (self.df["bonus_write_offs"] + 1)
-
-        if "bonus_write_offs" in self.df.columns:
-            self.df["target"] = (self.df["bonus_write_offs"].fillna(0) > 0).astype(int)
-
-        if "purchase_count" in self.df.columns and "redemption_count" in self.df.columns:
-            self.df["purchase_redemption_ratio"] = self.df["purchase_count"] / (self.df["redemption_count"] + 1)
+        with metrics.span("derived_features") as span:
+            derived = self.derived_features.generate(self.df)
+            recomputed = [name for name in derived if name in self.df.columns]
+            existing = self.df.drop(columns=recomputed) if recomputed else self.df
+            self.df = pd.concat([existing, pd.DataFrame(derived, index=self.df.index, copy=False)], axis=1, copy=False)
+            span.add(rows=len(self.df))
 
         return self.df
 
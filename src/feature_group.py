@@ -0,0 +1,55 @@
+from typing import Dict, Optional
+from feature import Feature
+
+
+class FeatureGroup:
+    def __init__(self, name: str, base_query: str, batch_size: int = 1000) -> None:
+        """
+        Группа фичей с общим базовым запросом (общие CTE и группировка по customer_mindbox_id).
+
+        Базовый запрос содержит два плейсхолдера: {columns} — список агрегатов
+        фичей группы и {values} — список ID клиентов батча.
+
+        :param name: Имя группы
+        :param base_query: Базовый SQL-запрос с плейсхолдерами {columns} и {values}
+        :param batch_size: Размер батча для обработки (по умолчанию 1000)
+        """
+        self.name: str = name
+        self.base_query: str = base_query
+        self.batch_size: int = batch_size
+
+    def render(self, columns: Dict[str, str]) -> str:
+        """
+        Подставляет агрегаты фичей в базовый запрос, оставляя плейсхолдер {values}.
+
+        :param columns: Словарь {имя фичи: SQL-выражение}
+        :return: SQL-запрос с плейсхолдером {values}
+        """
+        select_list = ",\n    ".join(f"{expression} AS {name}" for name, expression in columns.items())
+        return self.base_query.replace("{columns}", select_list)
+
+    def member(self, name: str, expression: str, batch_size: Optional[int] = None, drift: int = 0,
+               dtypes: Optional[Dict[str, str]] = None) -> Feature:
+        """
+        Создает отдельную фичу группы, которая вычисляется своим запросом.
+
+        :param name: Имя фичи
+        :param expression: SQL-выражение (агрегат) фичи
+        :param batch_size: Размер батча (по умолчанию размер батча группы)
+        :param drift: Изменение значения за сутки без новой активности клиента
+        :param dtypes: Схема типов результата {столбец: тип}
+        :return: Объект Feature
+        """
+        return Feature(name=name, calculate_query=self.render({name: expression}),
+                       batch_size=batch_size or self.batch_size, drift=drift, dtypes=dtypes)
+
+    def fuse(self, expressions: Dict[str, str], dtypes: Optional[Dict[str, str]] = None) -> Feature:
+        """
+        Создает фичу, которая за один запрос на батч вычисляет все переданные фичи группы.
+
+        :param expressions: Словарь {имя фичи: SQL-выражение}
+        :param dtypes: Объединенная схема типов фичей группы
+        :return: Объект Feature с именем группы и несколькими столбцами в результате
+        """
+        return Feature(name=self.name, calculate_query=self.render(expressions), batch_size=self.batch_size,
+                       dtypes=dtypes or None)
\ No newline at end of file
@@ -1,21 +1,130 @@
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 import yaml
-from typing import List
+from pandas.api.types import pandas_dtype
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from data_loader import DataLoader
 from feature import Feature
+from feature_group import FeatureGroup
+from feature_assembler import FeatureAssembler
+from instrumentation import frame_bytes, metrics
+from batch_sizing import BatchSizer
+from checkpoint import Checkpoint, RetryPolicy
+from frame_utils import float_dtype
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, estimated_bytes: int, budget_bytes: int) -> None:
+        """
+        Оценка размера матрицы фичей больше заданного бюджета памяти.
+
+        :param estimated_bytes: Оценка размера итоговой таблицы, байт.
+        :param budget_bytes: Бюджет памяти, байт.
+        """
+        self.estimated_bytes: int = estimated_bytes
+        self.budget_bytes: int = budget_bytes
+        super().__init__(
+            f"Оценка размера матрицы фичей {estimated_bytes / 2 ** 20:.1f} МБ "
+            f"превышает бюджет памяти {budget_bytes / 2 ** 20:.1f} МБ"
+        )
+
 
 class FeatureManager:
-    def __init__(self, feature_file: str, data_loader: DataLoader) -> None:
+    def __init__(self, feature_file: str, data_loader: DataLoader, max_workers: int = 1,
+                 max_workers_per_feature: Optional[int] = None, fuse: bool = True, ship_ids: bool = False,
+                 batch_sizer: Optional[BatchSizer] = None, checkpoint: Optional[Checkpoint] = None,
+                 retry: Optional[RetryPolicy] = None, memory_budget: Optional[int] = None,
+                 spill_dir: Optional[str] = None) -> None:
         """
         Инициализирует FeatureManager с файлом конфигурации фичей и экземпляром DataLoader.
 
         :param feature_file: Путь к YAML-файлу с конфигурациями фичей.
         :param data_loader: Экземпляр класса DataLoader для загрузки данных.
+        :param max_workers: Общее число одновременных запросов к БД (1 — последовательный режим).
+        :param max_workers_per_feature: Максимум одновременных батчей одной фичи (по умолчанию max_workers).
+        :param fuse: Вычислять фичи одной группы (groups в YAML) одним запросом на батч.
+        :param ship_ids: Загружать ID клиентов один раз во временную таблицу и выполнять
+            один запрос на фичу вместо перечисления ID в тексте каждого батча.
+        :param batch_sizer: Адаптивный подбор размера батча по задержке запросов (None — batch_size из YAML).
+            Выученные размеры сохраняются после каждого generate_features.
+        :param checkpoint: Хранилище результатов батчей: прерванный запуск с тем же списком клиентов
+            продолжается с недостающих батчей (None — результаты только в памяти).
+        :param retry: Повтор батча после временных ошибок БД (None — без повторов).
+        :param memory_budget: Бюджет памяти на итоговую таблицу фичей, байт (None — без ограничения).
+            Размер оценивается до запросов по числу клиентов и типам из dtypes в YAML.
+            При превышении generate_features сразу завершается MemoryBudgetExceeded,
+            а если задан spill_dir — столбцы фичей записываются на диск и открываются через np.memmap.
+        :param spill_dir: Каталог, в котором для каждого запуска с превышением memory_budget
+            создается свой подкаталог feature_spill_*. Удаляются только подкаталоги, созданные
+            этим FeatureManager: при ошибке запуска — сразу, после успешного — при следующем
+            generate_features или release_spill (в Linux уже открытые отображения остаются
+            доступными и после удаления файлов).
         """
         self.data_loader = data_loader
         with open(feature_file, "r", encoding="utf-8") as f:
-            self.feature_configs = yaml.safe_load(f)["features"]
-        self.features: List[Feature] = [Feature(**config) for config in self.feature_configs]
+            config = yaml.safe_load(f)
+        self.feature_configs = config["features"]
+        self.sources: List[dict] = config.get("sources") or []
+        self.groups: Dict[str, FeatureGroup] = {
+            group_config["name"]: FeatureGroup(**group_config) for group_config in config.get("groups") or []
+        }
+        self.features: List[Feature] = [self.create_feature(feature_config) for feature_config in self.feature_configs]
+        self.max_workers: int = max_workers
+        self.max_workers_per_feature: int = max_workers_per_feature or max_workers
+        self.fuse: bool = fuse
+        self.ship_ids: bool = ship_ids
+        self.units: List[Feature] = self.plan_units()
+        self.batch_sizer: Optional[BatchSizer] = batch_sizer
+        self.checkpoint: Optional[Checkpoint] = checkpoint
+        self.memory_budget: Optional[int] = memory_budget
+        self.spill_dir: Optional[str] = spill_dir
+        self.spill_runs: List[str] = []
+        for feature in self.units:
+            feature.batch_sizer = batch_sizer
+            feature.retry = retry
+
+    def create_feature(self, config: dict) -> Feature:
+        """
+        Создает фичу из конфигурации. Фича группы получает запрос группы со своим выражением.
+
+        :param config: Конфигурация фичи из YAML.
+        :return: Объект Feature.
+        """
+        if "group" not in config:
+            return Feature(**config)
+        return self.groups[config["group"]].member(config["name"], config["expression"], config.get("batch_size"),
+                                                   config.get("drift", 0), config.get("dtypes"))
+
+    def plan_units(self) -> List[Feature]:
+        """
+        Составляет список запросов: фичи одной группы заменяются одной объединенной фичей,
+        которая стоит на месте первой фичи группы.
+
+        :return: Список объектов Feature, которые будут вычисляться.
+        """
+        if not self.fuse or not self.groups:
+            return list(self.features)
+
+        expressions: Dict[str, Dict[str, str]] = {}
+        dtypes: Dict[str, Dict[str, str]] = {}
+        for config in self.feature_configs:
+            if "group" in config:
+                expressions.setdefault(config["group"], {})[config["name"]] = config["expression"]
+                dtypes.setdefault(config["group"], {}).update(config.get("dtypes") or {})
+
+        units: List[Feature] = []
+        for feature, config in zip(self.features, self.feature_configs):
+            group_name = config.get("group")
+            if group_name is None:
+                units.append(feature)
+            elif group_name in expressions:
+                units.append(self.groups[group_name].fuse(expressions.pop(group_name), dtypes[group_name]))
+        return units
 
     def generate_features(self, customers: pd.DataFrame) -> pd.DataFrame:
         """
@@ -24,8 +133,213 @@ class FeatureManager:
         :param customers: Данные клиентов в виде DataFrame.
         :return: Обновленные данные клиентов с добавленными фичами.
         """
+        spill_dir = self.check_memory_budget(customers)
+        run_key = self.attach_checkpoint(customers)
+        try:
+            with metrics.span("generate_features") as span:
+                if self.ship_ids:
+                    with self.data_loader.db.ship_ids(customers["customer_mindbox_id"]) as id_query:
+                        result = self.assemble_features(customers, id_query, spill_dir)
+                else:
+                    result = self.assemble_features(customers, spill_dir=spill_dir)
+                span.add(rows=len(result), bytes=frame_bytes(result))
+        except BaseException:
+            self.release_spill()
+            raise
+        if self.batch_sizer is not None:
+            self.batch_sizer.save()
+        if run_key is not None:
+            self.checkpoint.clear(run_key)
+            for feature in self.units:
+                feature.checkpoint = None
+        return result
+
+    def feature_columns(self) -> Dict[str, str]:
+        """
+        Столбцы итоговой таблицы фичей и их типы по dtypes из YAML. Фича без схемы типов
+        дает один столбец со своим именем и неизвестным типом ("").
+
+        :return: Словарь {столбец: тип}.
+        """
+        columns: Dict[str, str] = {}
         for feature in self.features:
-            feature.read(customers, self.data_loader.db.select)
-            customers = customers.merge(feature.df, on="customer_mindbox_id", how="left")
+            dtypes = dict(feature.dtypes or {})
+            dtypes.pop("customer_mindbox_id", None)
+            columns.update(dtypes or {feature.name: ""})
+        return columns
+
+    def estimate_bytes(self, customers: pd.DataFrame) -> int:
+        """
+        Оценивает размер итоговой таблицы фичей до выполнения запросов. Целые столбцы
+        считаются по размеру вещественного типа, который они получат при пропусках,
+        столбцы без объявленного числового типа — по 8 байт на значение.
+
+        :param customers: Данные клиентов.
+        :return: Оценка в байтах.
+        """
+        row_bytes = 0
+        for dtype in self.feature_columns().values():
+            numpy_dtype = getattr(pandas_dtype(dtype), "numpy_dtype", pandas_dtype(dtype)) if dtype else None
+            if not isinstance(numpy_dtype, np.dtype) or numpy_dtype.kind not in "biuf":
+                row_bytes += 8
+            else:
+                row_bytes += max(numpy_dtype.itemsize, float_dtype(numpy_dtype).itemsize)
+        return frame_bytes(customers) + row_bytes * len(customers)
+
+    def check_memory_budget(self, customers: pd.DataFrame) -> Optional[str]:
+        """
+        Сравнивает оценку размера таблицы фичей с memory_budget.
+
+        :param customers: Данные клиентов.
+        :return: Каталог для столбцов на диске, если бюджет превышен и задан spill_dir, иначе None.
+        :raises MemoryBudgetExceeded: Если бюджет превышен и spill_dir не задан.
+        """
+        if self.memory_budget is None:
+            return None
+        estimated = self.estimate_bytes(customers)
+        if estimated <= self.memory_budget:
+            return None
+        if self.spill_dir is None:
+            raise MemoryBudgetExceeded(estimated, self.memory_budget)
+        self.release_spill()
+        Path(self.spill_dir).mkdir(parents=True, exist_ok=True)
+        run_dir = tempfile.mkdtemp(prefix="feature_spill_", dir=self.spill_dir)
+        self.spill_runs.append(run_dir)
+        return run_dir
+
+    def release_spill(self) -> None:
+        """
+        Удаляет подкаталоги spill_dir, созданные прошлыми запусками этого FeatureManager.
+        Чужие файлы и подкаталоги других запусков не трогаются.
+        """
+        while self.spill_runs:
+            # Файлы могут быть еще открыты (в Windows их нельзя удалить) — тогда остаются
+            shutil.rmtree(self.spill_runs.pop(), ignore_errors=True)
+
+    def attach_checkpoint(self, customers: pd.DataFrame) -> Optional[str]:
+        """
+        Подключает к каждой фиче хранилище ее батчей в текущем запуске.
+
+        :param customers: Данные клиентов запуска.
+        :return: Ключ запуска или None, если checkpoint не задан.
+        """
+        if self.checkpoint is None:
+            return None
+        run_key = self.checkpoint.run_key(customers)
+        mode = "ship_ids" if self.ship_ids else "batches"
+        for feature in self.units:
+            feature.checkpoint = self.checkpoint.for_feature(run_key, feature.name,
+                                                             f"{feature.calculate_query}\n{feature.dtypes}", mode)
+        return run_key
+
+    def assemble_features(self, customers: pd.DataFrame, id_query: Optional[str] = None,
+                          spill_dir: Optional[str] = None) -> pd.DataFrame:
+        """
+        Вычисляет фичи и присоединяет их к данным клиентов.
+
+        Результат каждой фичи выравнивается по индексу клиентов (FeatureAssembler),
+        итоговый DataFrame создается один раз — без копирования растущей таблицы на каждой фиче.
+
+        :param customers: Данные клиентов в виде DataFrame.
+        :param id_query: Подзапрос со списком ID из временной таблицы (режим ship_ids).
+        :param spill_dir: Каталог для столбцов фичей на диске (None — в памяти).
+        :return: Обновленные данные клиентов с добавленными фичами.
+        """
+        assembler = FeatureAssembler(customers, spill_dir=spill_dir)
+        added_columns: Dict[str, List[str]] = {}
+        if self.max_workers > 1:
+            self.read_concurrently(customers, id_query)
+        for feature in self.units:
+            if self.max_workers <= 1:
+                feature.read(customers, self.select_for(feature), id_query=id_query)
+            added_columns[feature.name] = [column for column in feature.df.columns if column != "customer_mindbox_id"]
+            assembler.add(feature.df, feature.name)
             feature.purge()
-        return customers
\ No newline at end of file
+        with metrics.span("assemble_features"):
+            if len(self.units) != len(self.features):
+                return assembler.build(self.ordered_columns(added_columns))
+            return assembler.build()
+
+    def select_for(self, feature: Feature) -> Callable[[str], pd.DataFrame]:
+        """
+        Возвращает функцию выполнения запроса для фичи: со схемой типов фичи, если она задана.
+
+        :param feature: Объект Feature.
+        :return: Функция, принимающая SQL-запрос.
+        """
+        if feature.dtypes is None:
+            return self.data_loader.db.select
+        return partial(self.data_loader.db.select, dtypes=feature.dtypes)
+
+    def ordered_columns(self, added_columns: Dict[str, List[str]]) -> List[str]:
+        """
+        Возвращает столбцы фичей в порядке YAML-файла, как без объединения запросов.
+
+        :param added_columns: Столбцы, добавленные каждым запросом, по имени запроса.
+        :return: Список столбцов фичей.
+        """
+        columns: List[str] = []
+        for feature, config in zip(self.features, self.feature_configs):
+            columns.extend([feature.name] if "group" in config else added_columns[feature.name])
+        return columns
+
+    def read_concurrently(self, customers: pd.DataFrame, id_query: Optional[str] = None) -> None:
+        """
+        Вычисляет батчи всех фичей в общем пуле потоков и сохраняет результат в feature.df.
+
+        Одновременно выполняется не более max_workers батчей и не более
+        max_workers_per_feature батчей одной фичи. Батчи фичей чередуются,
+        поэтому пул не простаивает на одной медленной фиче. Результаты
+        собираются в порядке батчей, как и в последовательном режиме.
+        Батчи берутся из split_batches по мере освобождения мест в пуле, поэтому
+        адаптивный размер следующего батча учитывает уже завершенные.
+
+        :param customers: Данные клиентов в виде DataFrame.
+        :param id_query: Подзапрос со списком ID из временной таблицы (режим ship_ids).
+        :raises FeatureBatchError: Если запрос батча завершился ошибкой.
+        """
+        done_ranges = [feature.done_ranges() for feature in self.units]
+        queues: List[Optional[Iterator[Tuple[int, Tuple[int, pd.DataFrame]]]]] = [
+            enumerate(feature.split_batches(customers, id_query, feature_done))
+            for feature, feature_done in zip(self.units, done_ranges)
+        ]
+        results: List[Dict[int, pd.DataFrame]] = [{} for _ in self.units]
+        in_flight: List[int] = [0] * len(self.units)
+        futures: Dict[Future, Tuple[int, int]] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit_ready() -> None:
+                submitted = True
+                while submitted and len(futures) < self.max_workers:
+                    submitted = False
+                    for i, feature in enumerate(self.units):
+                        if len(futures) >= self.max_workers:
+                            break
+                        if queues[i] is None or in_flight[i] >= self.max_workers_per_feature:
+                            continue
+                        item = next(queues[i], None)
+                        if item is None:
+                            queues[i] = None
+                            continue
+                        batch_no, (start, batch) = item
+                        future = pool.submit(feature.run_batch, batch_no, batch, self.select_for(feature), id_query,
+                                             start)
+                        futures[future] = (i, start)
+                        in_flight[i] += 1
+                        submitted = True
+
+            try:
+                submit_ready()
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i, start = futures.pop(future)
+                        in_flight[i] -= 1
+                        results[i][start] = future.result()
+                    submit_ready()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        for feature, feature_results, feature_done in zip(self.units, results, done_ranges):
+            feature.df = feature.collect(feature_results, feature_done)
\ No newline at end of file
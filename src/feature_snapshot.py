@@ -0,0 +1,181 @@
+import os
+import json
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+class FeatureSnapshot:
+    def __init__(self, ids: np.ndarray, rows: np.ndarray, columns: Dict[str, np.ndarray],
+                 column_order: List[str], version: str) -> None:
+        """
+        Снимок фичей, отсортированный по customer_mindbox_id, для быстрого поиска клиентов.
+
+        :param ids: Отсортированные customer_mindbox_id (int64).
+        :param rows: Номер строки исходного файла для каждого элемента ids.
+        :param columns: Столбцы в том же порядке, что и ids (числовые — memory-mapped).
+        :param column_order: Порядок столбцов как в исходном файле.
+        :param version: Версия снимка (время изменения и размер исходного файла).
+        """
+        self.ids = ids
+        self.rows = rows
+        self.columns = columns
+        self.column_order = column_order
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, user_ids: Iterable[int]) -> pd.DataFrame:
+        """
+        Находит строки клиентов бинарным поиском — O(k log n) для k запрошенных ID.
+
+        Результат совпадает с all_customers[all_customers["customer_mindbox_id"].isin(user_ids)]:
+        строки в порядке исходного файла, индекс — номер строки файла.
+
+        :param user_ids: ID клиентов.
+        :return: DataFrame с найденными клиентами.
+        """
+        query = pd.unique(pd.to_numeric(pd.Series(user_ids), errors="coerce").dropna().astype("int64"))
+        left = np.searchsorted(self.ids, query, side="left")
+        right = np.searchsorted(self.ids, query, side="right")
+        counts = right - left
+        starts = np.repeat(left, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = starts + offsets
+        positions = positions[np.argsort(self.rows[positions], kind="stable")]
+
+        data = {column: self.columns[column][positions] for column in self.column_order}
+        return pd.DataFrame(data, index=pd.Index(self.rows[positions]), columns=self.column_order)
+
+    @staticmethod
+    def source_version(path: Path) -> str:
+        """
+        Версия исходного файла: время изменения и размер.
+
+        :param path: Путь к CSV/Parquet со снимком фичей.
+        :return: Строка версии.
+        """
+        stat = path.stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    @staticmethod
+    def read_source(path: Path) -> pd.DataFrame:
+        """
+        Читает исходный файл снимка. В CSV первый столбец — индекс, сохраненный to_csv.
+
+        :param path: Путь к CSV/Parquet.
+        :return: DataFrame с customer_mindbox_id и фичами.
+        """
+        if path.suffix == ".parquet":
+            return pd.read_parquet(path)
+        return pd.read_csv(path).iloc[:, 1:]
+
+    @classmethod
+    def build(cls, path: Path, cache_dir: Path, version: str) -> None:
+        """
+        Строит столбцовый кэш снимка: отсортированные ID и по файлу .npy на столбец.
+
+        :param path: Путь к исходному файлу.
+        :param cache_dir: Каталог кэша для этой версии.
+        :param version: Версия исходного файла.
+        """
+        df = cls.read_source(path)
+        ids = pd.to_numeric(df["customer_mindbox_id"], errors="coerce")
+        df = df[ids.notna()]
+        ids = ids[ids.notna()].astype("int64").to_numpy()
+        order = np.argsort(ids, kind="stable")
+
+        tmp_dir = cache_dir.with_name(cache_dir.name + f".tmp{os.getpid()}")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        np.save(tmp_dir / "ids.npy", ids[order])
+        np.save(tmp_dir / "rows.npy", order.astype(np.int64))
+        columns = []
+        for i, column in enumerate(df.columns):
+            values = df[column].to_numpy()[order]
+            np.save(tmp_dir / f"{i}.npy", values, allow_pickle=values.dtype == object)
+            columns.append({"name": column, "file": f"{i}.npy", "mmap": values.dtype != object})
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"version": version, "columns": columns}, f, ensure_ascii=False)
+        try:
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            # Кэш этой версии уже построил другой процесс
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureSnapshot":
+        """
+        Загружает снимок, при необходимости построив столбцовый кэш рядом с исходным файлом.
+        Числовые столбцы открываются через memory-map, поэтому несколько процессов
+        используют одну копию данных в page cache.
+
+        :param path: Путь к CSV/Parquet со снимком фичей.
+        :return: Объект FeatureSnapshot.
+        """
+        path = Path(path)
+        version = cls.source_version(path)
+        cache_root = path.with_name(f".{path.name}.snapshot")
+        cache_dir = cache_root / version
+        if not (cache_dir / "meta.json").exists():
+            cls.build(path, cache_dir, version)
+            for old in cache_root.iterdir():
+                if old.name != version and ".tmp" not in old.name:
+                    shutil.rmtree(old, ignore_errors=True)
+
+        with open(cache_dir / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        columns = {
+            column["name"]: np.load(cache_dir / column["file"], mmap_mode="r" if column["mmap"] else None,
+                                    allow_pickle=not column["mmap"])
+            for column in meta["columns"]
+        }
+        return cls(
+            ids=np.load(cache_dir / "ids.npy", mmap_mode="r"),
+            rows=np.load(cache_dir / "rows.npy", mmap_mode="r"),
+            columns=columns,
+            column_order=[column["name"] for column in meta["columns"]],
+            version=version,
+        )
+
+
+class SnapshotProvider:
+    def __init__(self, path: str, check_interval: float = 5.0) -> None:
+        """
+        Держит актуальный снимок фичей: загружает его при первом обращении и
+        подменяет целиком, когда исходный файл изменился.
+
+        :param path: Путь к CSV/Parquet со снимком фичей.
+        :param check_interval: Как часто (в секундах) проверять изменение файла.
+        """
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self.snapshot: Optional[FeatureSnapshot] = None
+        self.checked_at: float = 0.0
+        self.lock = threading.Lock()
+
+    def get(self) -> FeatureSnapshot:
+        """
+        Возвращает текущий снимок. Новый снимок загружается одним потоком, остальные
+        запросы в это время обслуживаются старым; замена ссылки атомарна.
+
+        :return: Объект FeatureSnapshot.
+        """
+        snapshot = self.snapshot
+        if snapshot is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return snapshot
+        if snapshot is not None and not self.lock.acquire(blocking=False):
+            return snapshot
+        if snapshot is None:
+            self.lock.acquire()
+        try:
+            if self.snapshot is None or FeatureSnapshot.source_version(self.path) != self.snapshot.version:
+                self.snapshot = FeatureSnapshot.load(str(self.path))
+            self.checked_at = time.monotonic()
+            return self.snapshot
+        finally:
+            self.lock.release()
\ No newline at end of file
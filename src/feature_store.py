@@ -0,0 +1,204 @@
+import os
+import json
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+from feature_manager import FeatureManager
+from instrumentation import metrics
+from query_cache import referenced_tables
+
+
+def sql_datetime(value) -> str:
+    """
+    Литерал даты и времени для подстановки в запрос: ISO 8601 с разделителем T
+    и миллисекундами (yyyy-mm-ddThh:mm:ss.mmm). Такой литерал SQL Server разбирает одинаково
+    при любых DATEFORMAT и языке, а DATETIME не принимает больше 3 знаков дробной части.
+    Дробная часть отбрасывается, поэтому сравнение "> watermark" не пропускает строк.
+
+    :param value: Дата и время (datetime, pd.Timestamp или строка).
+    :return: Строка вида 2025-01-05T10:00:00.000.
+    """
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_localize(None)
+    return timestamp.isoformat(timespec="milliseconds")
+
+
+class FeatureStore:
+    def __init__(self, path: str, feature_manager: FeatureManager) -> None:
+        """
+        Локальное хранилище рассчитанных фичей с инкрементальным обновлением.
+
+        Таблица фичей хранится в Parquet (ключ customer_mindbox_id), рядом — состояние
+        с водяными знаками (watermark) источников из секции sources в YAML. При обновлении
+        пересчитываются только клиенты с новой активностью после прошлого запуска,
+        остальные строки берутся из хранилища. При METRICS_ENABLED отчет о запуске
+        (instrumentation.Metrics.report) сохраняется в metrics.json.
+
+        :param path: Каталог хранилища.
+        :param feature_manager: FeatureManager для расчета фичей.
+        """
+        self.path = Path(path)
+        self.table_path = self.path / "features.parquet"
+        self.state_path = self.path / "state.json"
+        self.report_path = self.path / "metrics.json"
+        self.feature_manager = feature_manager
+
+    def load(self) -> pd.DataFrame:
+        """
+        Загружает сохраненную таблицу фичей.
+
+        :return: DataFrame с фичами или пустой DataFrame, если хранилище еще не создано.
+        """
+        if not self.table_path.exists():
+            return pd.DataFrame()
+        return pd.read_parquet(self.table_path)
+
+    def read_state(self) -> Optional[dict]:
+        """
+        Читает состояние прошлого запуска.
+
+        :return: Словарь с watermarks и refreshed_at или None.
+        """
+        if not self.state_path.exists() or not self.table_path.exists():
+            return None
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def current_watermarks(self) -> Dict[str, str]:
+        """
+        Запрашивает текущие водяные знаки всех источников.
+
+        :return: Словарь {источник: watermark в формате sql_datetime}.
+        """
+        select = self.feature_manager.data_loader.db.select
+        watermarks: Dict[str, str] = {}
+        for source in self.feature_manager.sources:
+            value = select(source["watermark_query"], use_cache=False)["watermark"].iloc[0]
+            watermarks[source["name"]] = None if pd.isna(value) else sql_datetime(value)
+        return watermarks
+
+    def changed_customers(self, state: dict) -> Optional[pd.Series]:
+        """
+        Находит клиентов с активностью после прошлого запуска по каждому источнику.
+
+        В changes_query доступны плейсхолдеры {watermark} (watermark источника в прошлый
+        запуск) и {refreshed_at} (время прошлого запуска), оба в формате sql_datetime.
+
+        :param state: Состояние прошлого запуска.
+        :return: Уникальные customer_mindbox_id или None, если нужен полный пересчет.
+        """
+        select = self.feature_manager.data_loader.db.select
+        changed = []
+        for source in self.feature_manager.sources:
+            watermark = state["watermarks"].get(source["name"])
+            if watermark is None:
+                # Источник появился после прошлого запуска — пересчитываем всех
+                return None
+            query = source["changes_query"].format(watermark=sql_datetime(watermark),
+                                                   refreshed_at=sql_datetime(state["refreshed_at"]))
+            changed.append(select(query, use_cache=False)["customer_mindbox_id"])
+        if not changed:
+            return pd.Series([], dtype="int64")
+        return pd.concat(changed, ignore_index=True).drop_duplicates()
+
+    def invalidate_cache(self, state: Optional[dict], watermarks: Dict[str, str]) -> None:
+        """
+        Сбрасывает кэш запросов (QueryCache) по таблицам источников, водяной знак которых
+        сдвинулся с прошлого запуска. Без прошлого состояния сбрасываются все источники.
+
+        :param state: Состояние прошлого запуска или None.
+        :param watermarks: Текущие водяные знаки.
+        """
+        cache = self.feature_manager.data_loader.db.cache
+        if cache is None:
+            return
+        previous = state["watermarks"] if state is not None else {}
+        for source in self.feature_manager.sources:
+            if source["name"] not in previous or previous[source["name"]] != watermarks.get(source["name"]):
+                for table in referenced_tables(source["watermark_query"]):
+                    cache.invalidate(table)
+
+    def apply_drift(self, df: pd.DataFrame, days: int) -> pd.DataFrame:
+        """
+        Сдвигает фичи вида "дней с/до события" на число прошедших дней.
+
+        :param df: Строки, взятые из хранилища без пересчета.
+        :param days: Число дней с прошлого запуска.
+        :return: DataFrame со сдвинутыми значениями.
+        """
+        if days == 0:
+            return df
+        for feature in self.feature_manager.features:
+            if feature.drift and feature.name in df.columns:
+                df[feature.name] = df[feature.name] + feature.drift * days
+        return df
+
+    def refresh(self, customers: pd.DataFrame) -> pd.DataFrame:
+        """
+        Обновляет хранилище и возвращает фичи для переданных клиентов.
+
+        Новые клиенты и клиенты с активностью после прошлого запуска пересчитываются
+        через FeatureManager, для остальных берутся сохраненные значения.
+
+        Обновление части клиентов не удаляет остальные строки хранилища: результат
+        записывается поверх таблицы по customer_mindbox_id. Непереданные клиенты без
+        изменений остаются (со сдвигом drift), а клиенты с изменениями удаляются —
+        следующий запуск посчитает их как новых. Если прошлого состояния нет или нужен
+        полный пересчет, в хранилище остаются только переданные клиенты.
+
+        :param customers: Данные клиентов в виде DataFrame (уникальные customer_mindbox_id).
+        :return: Данные клиентов с фичами в порядке customers.
+        """
+        with metrics.run(self.report_path):
+            started_at = datetime.now()
+            state = self.read_state()
+            # Водяные знаки берутся до расчета, чтобы не пропустить изменения во время запуска
+            watermarks = self.current_watermarks()
+            self.invalidate_cache(state, watermarks)
+            changed = self.changed_customers(state) if state is not None else None
+
+            if changed is None:
+                result = self.feature_manager.generate_features(customers)
+                table = result
+            else:
+                stored = self.load()
+                ids = customers["customer_mindbox_id"]
+                recompute = ~ids.isin(stored["customer_mindbox_id"]) | ids.isin(changed)
+                kept = stored[stored["customer_mindbox_id"].isin(ids[~recompute])]
+                days = (started_at.date() - datetime.fromisoformat(state["refreshed_at"]).date()).days
+                kept = self.apply_drift(kept.copy(), days)
+                other = stored[~stored["customer_mindbox_id"].isin(ids) & ~stored["customer_mindbox_id"].isin(changed)]
+                other = self.apply_drift(other.copy(), days)
+
+                parts = [kept]
+                if recompute.any():
+                    parts.append(self.feature_manager.generate_features(customers[recompute]))
+                result = (
+                    pd.concat(parts, ignore_index=True)
+                    .set_index("customer_mindbox_id")
+                    .reindex(ids)
+                    .reset_index()
+                )
+                table = pd.concat([result, other], ignore_index=True) if len(other) else result
+
+            self.write(table, {"watermarks": watermarks, "refreshed_at": sql_datetime(started_at)})
+            return result
+
+    def write(self, df: pd.DataFrame, state: dict) -> None:
+        """
+        Атомарно сохраняет таблицу фичей и состояние запуска.
+
+        :param df: Таблица фичей.
+        :param state: Состояние запуска (watermarks, refreshed_at).
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        table_tmp = self.table_path.with_suffix(".parquet.tmp")
+        df.to_parquet(table_tmp, index=False)
+        os.replace(table_tmp, self.table_path)
+
+        state_tmp = self.state_path.with_suffix(".json.tmp")
+        with open(state_tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(state_tmp, self.state_path)
\ No newline at end of file
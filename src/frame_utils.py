@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals, is_integer_dtype
+from typing import Dict, List, Optional
+
+
+def cast_series(series: pd.Series, dtype: str) -> pd.Series:
+    """
+    Приводит столбец к заданному типу. Целочисленный столбец с пропусками
+    приводится к nullable-типу pandas (int32 -> Int32), а не к float64.
+
+    :param series: Исходный столбец.
+    :param dtype: Целевой тип ("int32", "float32", "category" и т.п.).
+    :return: Столбец нужного типа.
+    """
+    if dtype.islower() and is_integer_dtype(pd.api.types.pandas_dtype(dtype)) and series.isna().any():
+        nullable = "UInt" + dtype[4:] if dtype.startswith("uint") else dtype.capitalize()
+        return series.astype(nullable)
+    return series.astype(dtype)
+
+
+def float_dtype(*dtypes) -> np.dtype:
+    """
+    Вещественный тип для значений столбцов заданных типов: float32, если все типы числовые
+    и не шире 4 байт (int8..int32, float32, bool), иначе (и без типов) float64. Так столбцы, объявленные
+    компактными, не превращаются в float64 при пропусках и вычислениях.
+
+    :param dtypes: Типы исходных столбцов (numpy или nullable-типы pandas).
+    :return: np.dtype("float32") или np.dtype("float64").
+    """
+    if not dtypes:
+        return np.dtype("float64")
+    for dtype in dtypes:
+        numpy_dtype = getattr(dtype, "numpy_dtype", dtype)
+        if not isinstance(numpy_dtype, np.dtype) or numpy_dtype.kind not in "biuf" or numpy_dtype.itemsize > 4:
+            return np.dtype("float64")
+    return np.dtype("float32")
+
+
+def cast_frame(df: pd.DataFrame, dtypes: Optional[Dict[str, str]]) -> pd.DataFrame:
+    """
+    Приводит столбцы DataFrame к схеме типов. Столбцы, которых нет в схеме, не меняются.
+
+    :param df: Исходный DataFrame.
+    :param dtypes: Схема {столбец: тип}.
+    :return: DataFrame с приведенными типами.
+    """
+    if not dtypes:
+        return df
+    for column, dtype in dtypes.items():
+        if column in df.columns and str(df[column].dtype) != dtype:
+            df[column] = cast_series(df[column], dtype)
+    return df
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Объединяет части результата. Категориальные столбцы объединяются через
+    union_categoricals, чтобы не превращаться в object при разных категориях в частях.
+
+    :param frames: Части результата в порядке чтения.
+    :return: Объединенный DataFrame.
+    """
+    if len(frames) == 1:
+        return frames[0]
+    categories = {
+        column: union_categoricals([frame[column] for frame in frames]).categories
+        for column in frames[0].columns
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames)
+    }
+    if categories:
+        frames = [
+            frame.assign(**{column: frame[column].cat.set_categories(values) for column, values in categories.items()})
+            for frame in frames
+        ]
+    return pd.concat(frames, ignore_index=True)
\ No newline at end of file
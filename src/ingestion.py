@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+from pathlib import PurePath
+from typing import IO, Iterable
+
+
+class IngestionError(ValueError):
+    """Загруженный файл не удалось разобрать (ответ 400)."""
+
+
+def read_user_ids(file: IO[bytes], filename: str, column: str = "user_id") -> np.ndarray:
+    """
+    Читает из загруженного файла только столбец с ID пользователей.
+
+    Excel читается в режиме read-only построчно, CSV — только нужным столбцом (usecols),
+    Parquet — только нужной колонкой, поэтому время и память зависят от одного столбца.
+
+    :param file: Файловый объект загрузки.
+    :param filename: Имя файла — по расширению выбирается формат (xlsx по умолчанию).
+    :param column: Имя столбца с ID.
+    :return: Массив int64 уникальных ID в порядке первого появления.
+    :raises IngestionError: Если столбца нет.
+    """
+    extension = PurePath(filename).suffix.lower()
+    if extension == ".csv":
+        header = pd.read_csv(file, nrows=0).columns
+        if column not in header:
+            raise IngestionError(f"Нет столбца с ID пользователей ({column})")
+        file.seek(0)
+        values = pd.read_csv(file, usecols=[column], dtype=str)[column]
+    elif extension == ".parquet":
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(file)
+        if column not in parquet_file.schema_arrow.names:
+            raise IngestionError(f"Нет столбца с ID пользователей ({column})")
+        values = parquet_file.read(columns=[column]).column(column).to_pandas()
+    elif extension == ".xls":
+        values = read_excel_column(file, column)
+    else:
+        values = read_xlsx_column(file, column)
+    return to_id_array(values)
+
+
+def read_xlsx_column(file: IO[bytes], column: str) -> list:
+    """
+    Читает один столбец первого листа xlsx в режиме read-only (без загрузки всей книги в память).
+
+    :param file: Файловый объект xlsx.
+    :param column: Имя столбца.
+    :return: Список значений столбца.
+    """
+    from openpyxl import load_workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        if column not in header:
+            raise IngestionError(f"Нет столбца с ID пользователей ({column})")
+        position = header.index(column) + 1
+        return [row[0] for row in sheet.iter_rows(min_row=2, min_col=position, max_col=position, values_only=True)]
+    finally:
+        workbook.close()
+
+
+def read_excel_column(file: IO[bytes], column: str) -> pd.Series:
+    """
+    Читает один столбец старого формата xls через pandas.
+
+    :param file: Файловый объект xls.
+    :param column: Имя столбца.
+    :return: Series со значениями столбца.
+    """
+    header = pd.read_excel(file, nrows=0).columns
+    if column not in header:
+        raise IngestionError(f"Нет столбца с ID пользователей ({column})")
+    file.seek(0)
+    return pd.read_excel(file, usecols=[column])[column]
+
+
+def to_id_array(values: Iterable) -> np.ndarray:
+    """
+    Проверяет и дедуплицирует ID: значения, которые не являются целым числом, отбрасываются
+    (как раньше при pd.to_numeric(errors="coerce")).
+
+    :param values: Значения столбца ID.
+    :return: Массив int64 уникальных ID в порядке первого появления.
+    """
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").dropna()
+    numbers = numbers[numbers == np.floor(numbers)]
+    return pd.unique(numbers.to_numpy(dtype=np.int64))
\ No newline at end of file
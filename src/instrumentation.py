@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import threading
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from dotenv import load_dotenv
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+load_dotenv()
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                                      60.0, 300.0, 1800.0)
+RSS_SAMPLE_INTERVAL = float(os.getenv("METRICS_RSS_SAMPLE_INTERVAL", "0.01"))
+Labels = Tuple[Tuple[str, str], ...]
+_process = None
+
+
+def current_rss_bytes() -> int:
+    """
+    Текущий RSS процесса в байтах (0, если узнать нельзя).
+    """
+    global _process
+    if psutil is not None:
+        if _process is None or _process.pid != os.getpid():
+            _process = psutil.Process()
+        return _process.memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def peak_rss_bytes() -> int:
+    """
+    Пиковый RSS процесса за все время работы в байтах (0, если узнать нельзя).
+    """
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """
+    Объем DataFrame в памяти без обхода строковых объектов (быстрая оценка).
+    """
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        """
+        Гистограмма с кумулятивными корзинами в формате Prometheus.
+
+        :param buckets: Верхние границы корзин по возрастанию (+Inf добавляется при выводе).
+        """
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts: List[int] = [0] * len(self.buckets)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Добавляет наблюдение в первый подходящий бакет (значения больше последней границы — только в +Inf).
+
+        :param value: Наблюдаемое значение.
+        """
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """
+        :return: Пары (граница le, количество наблюдений <= границы), последняя — +Inf.
+        """
+        result, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((f"{bound:g}", total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+class StageStats:
+    def __init__(self) -> None:
+        """
+        Накопленные данные по этапу: время (гистограмма), счетчики строк/байт и пиковый RSS
+        за время выполнения (наибольший по всем выполнениям). RSS общий для процесса, поэтому
+        при параллельных этапах в пик попадает и память соседних этапов.
+        """
+        self.seconds = Histogram()
+        self.counters: Dict[str, int] = {}
+        self.peak_rss_bytes: int = 0
+        self.peak_rss_growth_bytes: int = 0
+
+
+class Span:
+    def __init__(self, metrics: "Metrics", stage: str, labels: Labels) -> None:
+        """
+        Замер одного выполнения этапа. Создается через Metrics.span.
+
+        :param metrics: Реестр, в который записывается результат.
+        :param stage: Имя этапа.
+        :param labels: Дополнительные метки (например, имя фичи).
+        """
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+        self.counters: Dict[str, int] = {}
+        self.started: float = 0.0
+        self.rss_before: int = 0
+        self.rss_peak: int = 0
+
+    def add(self, **counters: int) -> None:
+        """
+        Добавляет к счетчикам этапа, например rows=len(df), bytes=frame_bytes(df).
+        """
+        for name, value in counters.items():
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def __enter__(self) -> "Span":
+        self.rss_before = self.rss_peak = current_rss_bytes()
+        self.metrics.watch(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self.started
+        self.metrics.unwatch(self)
+        rss_peak = max(self.rss_peak, current_rss_bytes())
+        self.metrics.record(self.stage, self.labels, seconds, self.counters, self.rss_before, rss_peak,
+                            failed=exc_type is not None)
+
+
+class NullSpan:
+    """Замер, который ничего не делает: возвращается, когда инструментирование выключено."""
+
+    def add(self, **counters: int) -> None:
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False) -> None:
+        """
+        Реестр метрик конвейера: замеры этапов (span), счетчики строк и байт, пиковый RSS этапа
+        и гистограммы длительности HTTP-запросов. Пик снимает фоновый поток: пока открыт хотя бы
+        один span, он раз в RSS_SAMPLE_INTERVAL секунд читает RSS и обновляет пик открытых этапов. Выводится в формате Prometheus (render_prometheus)
+        или отчетом по запуску (report / write_report).
+
+        :param enabled: Включено ли инструментирование. Выключенный реестр возвращает NULL_SPAN
+            и не пишет ничего, поэтому вызовы в коде почти ничего не стоят.
+        """
+        self.enabled: bool = enabled
+        self.lock = threading.Lock()
+        self.started_at: datetime = datetime.now()
+        self.stages: Dict[Tuple[str, Labels], StageStats] = {}
+        self.errors: Dict[Tuple[str, Labels], int] = {}
+        self.requests: Dict[Tuple[str, str, str], Histogram] = {}
+        self.active: Set[Span] = set()
+        self.wakeup = threading.Event()
+        self.sampler: Optional[threading.Thread] = None
+
+    def watch(self, span: Span) -> None:
+        """
+        Добавляет открытый span в выборку пикового RSS, запуская поток выборки при необходимости
+        (в том числе в дочернем процессе после fork, где потока родителя нет).
+
+        :param span: Открытый замер.
+        """
+        with self.lock:
+            self.active.add(span)
+            if self.sampler is None or not self.sampler.is_alive():
+                self.sampler = threading.Thread(target=self.sample_rss, name="metrics-rss", daemon=True)
+                self.sampler.start()
+            self.wakeup.set()
+
+    def unwatch(self, span: Span) -> None:
+        """
+        Убирает закрытый span из выборки пикового RSS.
+
+        :param span: Закрываемый замер.
+        """
+        with self.lock:
+            self.active.discard(span)
+
+    def sample_rss(self) -> None:
+        """
+        Цикл потока выборки: пока есть открытые span, обновляет их пиковый RSS; без них ждет.
+        """
+        while True:
+            self.wakeup.wait()
+            with self.lock:
+                spans = list(self.active)
+                if not spans:
+                    self.wakeup.clear()
+                    continue
+            rss = current_rss_bytes()
+            for span in spans:
+                span.rss_peak = max(span.rss_peak, rss)
+            time.sleep(RSS_SAMPLE_INTERVAL)
+
+    def span(self, stage: str, **labels: Any) -> Any:
+        """
+        Контекстный менеджер замера этапа.
+
+        :param stage: Имя этапа (feature_query, preprocess, model_predict, ...).
+        :param labels: Метки этапа (feature="bonuses_balance").
+        :return: Span или NULL_SPAN, если инструментирование выключено.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+    def record(self, stage: str, labels: Labels, seconds: float, counters: Dict[str, int],
+               rss_before: int, rss_peak: int, failed: bool = False) -> None:
+        """
+        Записывает результат замера этапа.
+
+        :param stage: Имя этапа.
+        :param labels: Метки этапа.
+        :param seconds: Длительность, с.
+        :param counters: Счетчики замера (rows, bytes, ...).
+        :param rss_before: RSS процесса на входе в этап, байт.
+        :param rss_peak: Пиковый RSS процесса за время этапа, байт.
+        :param failed: Этап завершился исключением.
+        """
+        key = (stage, labels)
+        with self.lock:
+            stats = self.stages.get(key)
+            if stats is None:
+                stats = self.stages[key] = StageStats()
+            stats.seconds.observe(seconds)
+            for name, value in counters.items():
+                stats.counters[name] = stats.counters.get(name, 0) + value
+            stats.peak_rss_bytes = max(stats.peak_rss_bytes, rss_peak)
+            stats.peak_rss_growth_bytes = max(stats.peak_rss_growth_bytes, rss_peak - rss_before)
+            if failed:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_request(self, endpoint: str, method: str, status: int, seconds: float) -> None:
+        """
+        Учитывает длительность HTTP-запроса.
+
+        :param endpoint: Имя обработчика Flask (или путь).
+        :param method: HTTP-метод.
+        :param status: Код ответа.
+        :param seconds: Длительность, с.
+        """
+        if not self.enabled:
+            return
+        key = (endpoint, method, str(status))
+        with self.lock:
+            histogram = self.requests.get(key)
+            if histogram is None:
+                histogram = self.requests[key] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self) -> None:
+        """
+        Очищает данные этапов перед новым запуском пакетной задачи. Длительности HTTP-запросов
+        общие для процесса (их читает /metrics) и не очищаются.
+        """
+        with self.lock:
+            self.started_at = datetime.now()
+            self.stages.clear()
+            self.errors.clear()
+
+    @staticmethod
+    def format_labels(labels: Labels) -> str:
+        """
+        Форматирует метки для Prometheus с экранированием значений.
+
+        :param labels: Метки.
+        :return: Строка вида {key="value",...} (пустая, если меток нет).
+        """
+        if not labels:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+    def render_histogram(self, lines: List[str], name: str, labels: Labels, histogram: Histogram) -> None:
+        """
+        Дописывает строки гистограммы в формате Prometheus: _bucket, _sum и _count.
+
+        :param lines: Список строк вывода.
+        :param name: Имя метрики.
+        :param labels: Метки ряда.
+        :param histogram: Гистограмма.
+        """
+        for le, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{self.format_labels(labels + (('le', le),))} {count}")
+        lines.append(f"{name}_sum{self.format_labels(labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{self.format_labels(labels)} {histogram.count}")
+
+    def render_prometheus(self) -> str:
+        """
+        Выводит метрики в текстовом формате Prometheus (version 0.0.4).
+
+        :return: Текст для ответа /metrics.
+        """
+        lines: List[str] = []
+        with self.lock:
+            stages = sorted(self.stages.items())
+            counter_names = sorted({name for _, stats in stages for name in stats.counters})
+
+            lines.append("# HELP pipeline_stage_seconds Длительность этапа конвейера.")
+            lines.append("# TYPE pipeline_stage_seconds histogram")
+            for (stage, labels), stats in stages:
+                self.render_histogram(lines, "pipeline_stage_seconds", (("stage", stage),) + labels, stats.seconds)
+
+            for name in counter_names:
+                lines.append(f"# HELP pipeline_stage_{name}_total Сумма счетчика {name} по этапу.")
+                lines.append(f"# TYPE pipeline_stage_{name}_total counter")
+                for (stage, labels), stats in stages:
+                    if name in stats.counters:
+                        lines.append(f"pipeline_stage_{name}_total{self.format_labels((('stage', stage),) + labels)} "
+                                     f"{stats.counters[name]}")
+
+            lines.append("# HELP pipeline_stage_errors_total Выполнения этапа, завершившиеся исключением.")
+            lines.append("# TYPE pipeline_stage_errors_total counter")
+            for (stage, labels), count in sorted(self.errors.items()):
+                lines.append(f"pipeline_stage_errors_total{self.format_labels((('stage', stage),) + labels)} {count}")
+
+            lines.append("# HELP pipeline_stage_peak_rss_bytes Пиковый RSS процесса за время выполнения этапа.")
+            lines.append("# TYPE pipeline_stage_peak_rss_bytes gauge")
+            for (stage, labels), stats in stages:
+                lines.append(f"pipeline_stage_peak_rss_bytes{self.format_labels((('stage', stage),) + labels)} "
+                             f"{stats.peak_rss_bytes}")
+
+            lines.append("# HELP http_request_duration_seconds Длительность HTTP-запроса.")
+            lines.append("# TYPE http_request_duration_seconds histogram")
+            for (endpoint, method, status), histogram in sorted(self.requests.items()):
+                labels = (("endpoint", endpoint), ("method", method), ("status", status))
+                self.render_histogram(lines, "http_request_duration_seconds", labels, histogram)
+
+        lines.append("# HELP process_resident_memory_bytes Текущий RSS процесса.")
+        lines.append("# TYPE process_resident_memory_bytes gauge")
+        lines.append(f"process_resident_memory_bytes {current_rss_bytes()}")
+        lines.append("# HELP process_peak_resident_memory_bytes Пиковый RSS процесса с момента запуска.")
+        lines.append("# TYPE process_peak_resident_memory_bytes gauge")
+        lines.append(f"process_peak_resident_memory_bytes {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Отчет по запуску: по каждому этапу количество выполнений, суммарное и максимальное время,
+        счетчики и память.
+
+        :return: Словарь, пригодный для json.dump.
+        """
+        with self.lock:
+            stages = []
+            for (stage, labels), stats in sorted(self.stages.items()):
+                stages.append({
+                    "stage": stage,
+                    "labels": dict(labels),
+                    "calls": stats.seconds.count,
+                    "errors": self.errors.get((stage, labels), 0),
+                    "seconds": round(stats.seconds.sum, 6),
+                    "counters": dict(stats.counters),
+                    "peak_rss_mb": round(stats.peak_rss_bytes / 2 ** 20, 1),
+                    "peak_rss_growth_mb": round(stats.peak_rss_growth_bytes / 2 ** 20, 1),
+                })
+            return {
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "process_peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+                "stages": stages,
+            }
+
+    def write_report(self, path: str) -> None:
+        """
+        Сохраняет report() в JSON-файл.
+
+        :param path: Путь к файлу отчета.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    @contextmanager
+    def run(self, report_path: Optional[str] = None) -> Iterator["Metrics"]:
+        """
+        Обрамляет пакетный запуск: очищает метрики на входе и сохраняет отчет на выходе
+        (если инструментирование включено и указан путь).
+
+        :param report_path: Путь к JSON-отчету.
+        """
+        self.reset()
+        try:
+            yield self
+        finally:
+            if self.enabled and report_path:
+                self.write_report(report_path)
+
+
+metrics = Metrics(enabled=os.getenv("METRICS_ENABLED", "").lower() in ("1", "true", "yes"))
\ No newline at end of file
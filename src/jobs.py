@@ -0,0 +1,343 @@
+import os
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+
+class JobQueueFull(Exception):
+    """Очередь заданий заполнена."""
+
+
+class JobQueue:
+    def __init__(self, directory: str, score_func: Callable[[np.ndarray], pd.DataFrame], max_workers: int = 1,
+                 max_pending: int = 20, chunk_size: int = 10000, lease_seconds: float = 60.0) -> None:
+        """
+        Локальная очередь заданий скоринга: состояние в SQLite, входные ID и результаты — файлы в каталоге.
+
+        Задания выполняются в отдельном пуле из max_workers потоков частями по chunk_size
+        клиентов, прогресс сохраняется после каждой части. Незавершенные задания
+        продолжаются с последней сохраненной части после перезапуска сервиса.
+
+        Одну очередь могут использовать несколько процессов (воркеры gunicorn): задание
+        захватывается атомарным UPDATE ... WHERE status = 'queued' и выполняется только
+        владельцем (owner). Владелец продлевает аренду (heartbeat_at) в фоновом потоке;
+        задание 'running', аренда которого не продлевалась lease_seconds (процесс упал),
+        забирает любой живой процесс. Каждая попытка пишет результат в свой файл <job_id>.<attempt>.part,
+        который становится <job_id>.csv только при завершении под подтвержденной арендой.
+
+        :param directory: Каталог очереди.
+        :param score_func: Функция скоринга: массив ID -> DataFrame с предсказаниями (индекс — ID клиента).
+        :param max_workers: Сколько заданий выполняется одновременно (остальная мощность — интерактивным запросам).
+        :param max_pending: Максимум заданий в очереди и в работе.
+        :param chunk_size: Количество клиентов в одной части.
+        :param lease_seconds: Через сколько секунд без продления аренды задание считается брошенным.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.directory / "jobs.sqlite3"
+        self.score_func = score_func
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lock = threading.Lock()
+        self.scheduled: Set[str] = set()
+        self.stopped = threading.Event()
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scoring-job")
+
+        with self.connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    result_bytes INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    part TEXT
+                )
+            """)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL"), ("part", "TEXT")):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+        self.resume()
+        self.heartbeat_thread = threading.Thread(target=self.heartbeat_loop, name="scoring-job-heartbeat", daemon=True)
+        self.heartbeat_thread.start()
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Открывает соединение с базой очереди (отдельное на каждую операцию — безопасно для потоков):
+        на выходе из контекста транзакция фиксируется, а соединение закрывается.
+
+        :return: Соединение SQLite.
+        """
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                yield connection
+
+    def input_path(self, job_id: str) -> Path:
+        """
+        :param job_id: ID задания.
+        :return: Путь к входным ID задания (.npy).
+        """
+        return self.directory / f"{job_id}.ids.npy"
+
+    def result_path(self, job_id: str) -> Path:
+        """
+        :param job_id: ID задания.
+        :return: Путь к готовому результату задания (CSV).
+        """
+        return self.directory / f"{job_id}.csv"
+
+    def part_path(self, job_id: str) -> Path:
+        """
+        :param job_id: ID задания.
+        :return: Новый файл результата для очередной попытки выполнения.
+        """
+        return self.directory / f"{job_id}.{uuid.uuid4().hex[:8]}.part"
+
+    def submit(self, user_ids: np.ndarray) -> str:
+        """
+        Ставит задание в очередь и сразу возвращает его ID.
+
+        :param user_ids: ID клиентов.
+        :return: ID задания.
+        :raises JobQueueFull: Если в очереди уже max_pending заданий.
+        """
+        job_id = uuid.uuid4().hex
+        ids = np.asarray(user_ids, dtype=np.int64)
+        with self.lock, self.connect() as connection:
+            pending = connection.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"В очереди уже {pending} заданий")
+            np.save(self.input_path(job_id), ids)
+            connection.execute(
+                "INSERT INTO jobs (job_id, status, total, created_at) VALUES (?, 'queued', ?, ?)",
+                (job_id, len(ids), datetime.now().isoformat(sep=" ")),
+            )
+        self.schedule(job_id)
+        return job_id
+
+    def schedule(self, job_id: str) -> None:
+        """
+        Отправляет задание в пул, если этот процесс еще не запланировал его.
+
+        :param job_id: ID задания.
+        """
+        with self.lock:
+            if job_id in self.scheduled:
+                return
+            self.scheduled.add(job_id)
+        try:
+            self.pool.submit(self.run, job_id)
+        except RuntimeError:
+            # Пул уже остановлен (close) — задание заберет другой процесс или следующий запуск
+            with self.lock:
+                self.scheduled.discard(job_id)
+
+    def resume(self) -> None:
+        """
+        Планирует задания в очереди и брошенные задания (аренда не продлевалась lease_seconds).
+        Какое из них выполнит этот процесс, решает атомарный захват в claim.
+        """
+        with self.connect() as connection:
+            unfinished = [row[0] for row in connection.execute(
+                "SELECT job_id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)) ORDER BY created_at",
+                (time.time() - self.lease_seconds,),
+            )]
+        for job_id in unfinished:
+            self.schedule(job_id)
+
+    def heartbeat_loop(self) -> None:
+        """
+        Фоновый поток: продлевает аренду своих заданий и подбирает брошенные задания.
+        """
+        while not self.stopped.wait(max(self.lease_seconds / 3, 0.05)):
+            with self.lock:
+                active = list(self.scheduled)
+            try:
+                with self.connect() as connection:
+                    connection.executemany(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND owner = ? AND status = 'running'",
+                        [(time.time(), job_id, self.owner) for job_id in active],
+                    )
+                self.resume()
+            except (sqlite3.Error, OSError):
+                continue
+
+    def close(self) -> None:
+        """Останавливает продление аренды и ждет завершения выполняемых заданий."""
+        self.stopped.set()
+        self.pool.shutdown(wait=True)
+
+    def claim(self, job_id: str) -> Optional[Tuple[int, int, Optional[str]]]:
+        """
+        Атомарно захватывает задание: из очереди или брошенное другим процессом.
+
+        :param job_id: ID задания.
+        :return: (processed, result_bytes, part) захваченного задания или None, если его выполняет
+            другой процесс; part — файл предыдущей попытки с сохраненной частью результата.
+        """
+        now = time.time()
+        with self.connect() as connection:
+            claimed = connection.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, heartbeat_at = ? WHERE job_id = ? "
+                "AND (status = 'queued' OR (status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)))",
+                (self.owner, now, job_id, now - self.lease_seconds),
+            ).rowcount
+            if not claimed:
+                return None
+            return connection.execute(
+                "SELECT processed, result_bytes, part FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+
+    def run(self, job_id: str) -> None:
+        """
+        Выполняет задание по частям, продолжая с последней сохраненной части.
+        Если аренду задания перехватил другой процесс, выполнение прекращается.
+
+        :param job_id: ID задания.
+        """
+        try:
+            claimed = self.claim(job_id)
+            if claimed is None:
+                return
+            self.execute(job_id, *claimed)
+        finally:
+            with self.lock:
+                self.scheduled.discard(job_id)
+
+    def save_progress(self, job_id: str, processed: int, part: Path, result_bytes: int) -> bool:
+        """
+        Сохраняет прогресс задания, если этот процесс все еще его владелец.
+
+        :param job_id: ID задания.
+        :param processed: Сколько клиентов обработано.
+        :param part: Файл результата этой попытки.
+        :param result_bytes: Сколько байт результата в нем сохранено.
+        :return: True, если аренда подтверждена.
+        """
+        with self.connect() as connection:
+            return bool(connection.execute(
+                "UPDATE jobs SET processed = ?, result_bytes = ?, part = ?, heartbeat_at = ? "
+                "WHERE job_id = ? AND owner = ?",
+                (processed, result_bytes, part.name, time.time(), job_id, self.owner),
+            ).rowcount)
+
+    def execute(self, job_id: str, processed: int, result_bytes: int, previous_part: Optional[str] = None) -> None:
+        """
+        Считает оставшиеся части захваченного задания в собственный файл попытки и записывает
+        итоговый статус. Если аренду перехватил другой процесс, файл попытки остается ему:
+        из него переносится уже сохраненная часть результата.
+
+        :param job_id: ID задания.
+        :param processed: Сколько клиентов уже обработано.
+        :param result_bytes: Размер сохраненной части результата.
+        :param previous_part: Файл предыдущей попытки с сохраненной частью.
+        """
+        part = self.part_path(job_id)
+        try:
+            ids = np.load(self.input_path(job_id), mmap_mode="r")
+            with open(part, "wb") as result:
+                if result_bytes:
+                    # Часть, записанная предыдущей попыткой после последнего сохранения прогресса, отбрасывается
+                    previous = self.directory / previous_part if previous_part else self.result_path(job_id)
+                    with open(previous, "rb") as source:
+                        while result.tell() < result_bytes:
+                            block = source.read(min(1 << 20, result_bytes - result.tell()))
+                            if not block:
+                                raise ValueError(f"Файл {previous} короче сохраненного прогресса")
+                            result.write(block)
+                    result.flush()
+                    if not self.save_progress(job_id, processed, part, result_bytes):
+                        self.release_part(job_id, part)
+                        return
+                    previous.unlink(missing_ok=True)
+                for start in range(processed, len(ids), self.chunk_size):
+                    predictions = self.score_func(np.asarray(ids[start:start + self.chunk_size]))
+                    result.write(predictions.to_csv(header=start == 0).encode("utf-8"))
+                    result.flush()
+                    processed = min(start + self.chunk_size, len(ids))
+                    if not self.save_progress(job_id, processed, part, result.tell()):
+                        self.release_part(job_id, part)
+                        return
+                if len(ids) == 0:
+                    result.write(b"customer_mindbox_id,Predicted Probability,Predicted Class\n")
+            status, error = "done", None
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        with self.connect() as connection:
+            # Блокировка записи: между проверкой аренды и публикацией результата задание не перехватят
+            connection.execute("BEGIN IMMEDIATE")
+            owned = connection.execute(
+                "SELECT 1 FROM jobs WHERE job_id = ? AND owner = ?", (job_id, self.owner)
+            ).fetchone() is not None
+            if owned:
+                if status == "done":
+                    os.replace(part, self.result_path(job_id))
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ?, part = NULL WHERE job_id = ?",
+                    (status, error, datetime.now().isoformat(sep=" "), job_id),
+                )
+        if not owned:
+            self.release_part(job_id, part)
+            return
+        part.unlink(missing_ok=True)
+        if status == "done":
+            os.remove(self.input_path(job_id))
+
+    def release_part(self, job_id: str, part: Path) -> None:
+        """
+        Удаляет файл попытки, потерявшей аренду, если новый владелец уже не читает из него
+        сохраненную часть (иначе файл удалит он сам после переноса).
+
+        :param job_id: ID задания.
+        :param part: Файл результата этой попытки.
+        """
+        with self.connect() as connection:
+            row = connection.execute("SELECT part FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] != part.name:
+            part.unlink(missing_ok=True)
+
+    def status(self, job_id: str) -> Optional[Dict[str, object]]:
+        """
+        Возвращает состояние задания.
+
+        :param job_id: ID задания.
+        :return: Словарь со статусом и прогрессом или None, если задания нет.
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                "SELECT status, total, processed, error, created_at, finished_at FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, total, processed, error, created_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "processed": processed,
+            "progress": processed / total if total else 1.0,
+            "error": error,
+            "created_at": created_at,
+            "finished_at": finished_at,
+        }
\ No newline at end of file
@@ -1,19 +1,104 @@
+import json
 import pickle
+import threading
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
-from sklearn.ensemble import GradientBoostingClassifier
+from typing import Dict, Any, Iterable, Literal, Optional, Tuple
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, f1_score, precision_score, recall_score
 from sklearn.base import ClassifierMixin
+from tree_engine import CompiledEnsemble
+from evaluation import StreamingEvaluator
+from instrumentation import metrics
+
+COMPILED_MAX_ROWS = 512
+
+Engine = Literal["gradient_boosting", "hist_gradient_boosting", "lightgbm"]
+
+# Параметры по умолчанию для гистограммных движков: все ядра и ранняя остановка на валидации
+ENGINE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "gradient_boosting": {},
+    "hist_gradient_boosting": {"early_stopping": True, "validation_fraction": 0.1, "n_iter_no_change": 20},
+    "lightgbm": {"n_jobs": -1, "verbosity": -1},
+}
+
+
+def create_estimator(engine: str, params: Dict[str, Any]) -> ClassifierMixin:
+    """
+    Создает классификатор выбранного движка.
+
+    :param engine: Движок: "gradient_boosting", "hist_gradient_boosting" или "lightgbm".
+    :param params: Гиперпараметры классификатора.
+    :return: Необученный классификатор.
+    """
+    params = {**ENGINE_DEFAULTS[engine], **params}
+    if engine == "gradient_boosting":
+        return GradientBoostingClassifier(**params)
+    if engine == "hist_gradient_boosting":
+        return HistGradientBoostingClassifier(**params)
+    import lightgbm as lgb
+    return lgb.LGBMClassifier(**params)
+
 
 class Model:
-    def __init__(self, best_params: Dict[str, Any]) -> None:
+    def __init__(self, best_params: Dict[str, Any], engine: Engine = "gradient_boosting") -> None:
         """
         Инициализация модели с переданными гиперпараметрами.
+
+        Движки "hist_gradient_boosting" (sklearn) и "lightgbm" строят гистограммы признаков,
+        обучаются на всех ядрах и сами обрабатывают пропуски (NaN). Для lightgbm ранняя остановка
+        включается параметрами early_stopping_rounds и validation_fraction (по умолчанию 0.1).
+
         :param best_params: Словарь с гиперпараметрами модели.
+        :param engine: Движок обучения.
         """
-        self.model: GradientBoostingClassifier = GradientBoostingClassifier(**best_params)
+        if engine not in ENGINE_DEFAULTS:
+            raise ValueError(f"Неизвестный движок: {engine}")
+        params = dict(best_params)
+        self.early_stopping_rounds: Optional[int] = None
+        self.validation_fraction: float = 0.1
+        if engine == "lightgbm":
+            self.early_stopping_rounds = params.pop("early_stopping_rounds", None)
+            self.validation_fraction = params.pop("validation_fraction", 0.1)
+        self.engine = engine
+        self.estimator: Optional[ClassifierMixin] = create_estimator(engine, params)
+        self.estimator_path: Optional[str] = None
+        self.estimator_lock = threading.Lock()
         self.best_params: Dict[str, Any] = best_params
+        self.compiled: Optional[CompiledEnsemble] = None
+        self.compiled_max_rows: Optional[int] = None
+        self.version: Optional[str] = None
+        self.metadata: Dict[str, Any] = {}
+
+    @property
+    def model(self) -> ClassifierMixin:
+        """
+        Обученная модель sklearn/LightGBM. Если задан estimator_path, а модель еще не загружена
+        (так реестр отдает модели со скомпилированным ансамблем), pickle читается при первом обращении —
+        на первом батче больше compiled_max_rows.
+        """
+        if self.estimator is None and self.estimator_path is not None:
+            with self.estimator_lock:
+                if self.estimator is None:
+                    self.estimator = Model.load_model(self.estimator_path)
+        return self.estimator
+
+    @model.setter
+    def model(self, estimator: Optional[ClassifierMixin]) -> None:
+        self.estimator = estimator
+
+    @classmethod
+    def from_params_file(cls, path: str) -> "Model":
+        """
+        Создает модель по файлу best_params.json, записанному HyperparameterSearch (tuning.py).
+
+        :param path: Путь к best_params.json.
+        :return: Необученная модель с найденными гиперпараметрами.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            best = json.load(f)
+        return cls(best["params"], engine=best.get("engine", "gradient_boosting"))
 
     def train(self, X_train: pd.DataFrame, y_train: pd.Series) -> None:
         """
@@ -21,7 +106,42 @@ class Model:
         :param X_train: Матрица признаков (обучающая выборка).
         :param y_train: Целевая переменная.
         """
-        self.model.fit(X_train, y_train)
+        if self.engine == "lightgbm" and self.early_stopping_rounds:
+            import lightgbm as lgb
+            X_fit, X_val, y_fit, y_val = train_test_split(
+                X_train, y_train, test_size=self.validation_fraction, stratify=y_train, random_state=42
+            )
+            self.model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)],
+                           callbacks=[lgb.early_stopping(self.early_stopping_rounds, verbose=False)])
+        else:
+            self.model.fit(X_train, y_train)
+        self.compiled = None
+
+    def compile(self, max_rows: Optional[int] = COMPILED_MAX_ROWS) -> CompiledEnsemble:
+        """
+        Компилирует обученную модель в плоские таблицы узлов для быстрого векторизованного инференса.
+
+        Скомпилированный ансамбль быстрее sklearn на небольших батчах (онлайн-запросы), а на больших
+        батчах цикл sklearn на Cython выигрывает, поэтому батчи больше max_rows идут в sklearn
+        (см. benchmarks/bench_tree_engine.py).
+
+        :param max_rows: Максимальный размер батча для скомпилированного ансамбля (None — без ограничения).
+        :return: Скомпилированный ансамбль.
+        """
+        self.compiled = CompiledEnsemble.from_sklearn(self.model)
+        self.compiled_max_rows = max_rows
+        return self.compiled
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        """
+        Вероятность положительного класса (через скомпилированный ансамбль, если он есть и батч небольшой).
+
+        :param X: Матрица признаков.
+        :return: Массив вероятностей.
+        """
+        if self.compiled is not None and (self.compiled_max_rows is None or len(X) <= self.compiled_max_rows):
+            return self.compiled.predict_proba(X)[:, 1]
+        return self.model.predict_proba(X)[:, 1]
 
     def predict(self, X_test: pd.DataFrame) -> pd.DataFrame:
         """
@@ -30,7 +150,9 @@ class Model:
         :param X_test: Матрица признаков (тестовая выборка).
         :return: DataFrame с предсказанными вероятностями, классами и ID клиента.
         """
-        y_pred_proba: np.ndarray = self.model.predict_proba(X_test)[:, 1]
+        with metrics.span("model_predict") as span:
+            y_pred_proba: np.ndarray = self.predict_proba(X_test)
+            span.add(rows=len(X_test))
         y_pred: np.ndarray = (y_pred_proba > 0.5).astype(int)
 
         predictions = pd.DataFrame({
@@ -49,7 +171,7 @@ class Model:
         :param y_test: Целевая переменная (тестовая выборка).
         :return: Словарь с метриками качества модели.
         """
-        y_pred_proba: np.ndarray = self.model.predict_proba(X_test)[:, 1]
+        y_pred_proba: np.ndarray = self.predict_proba(X_test)
         y_pred: np.ndarray = (y_pred_proba > 0.5).astype(int)
 
         metrics: Dict[str, float] = {
@@ -60,6 +182,21 @@ class Model:
         }
         return metrics
 
+    def evaluate_stream(self, chunks: Iterable[Tuple[pd.DataFrame, pd.Series]],
+                        n_bins: int = 10000) -> StreamingEvaluator:
+        """
+        Оценивает модель по частям, не держа тестовую выборку в памяти: каждая часть
+        скорится один раз, метрики обновляются инкрементально.
+
+        :param chunks: Итератор пар (матрица признаков, целевая переменная).
+        :param n_bins: Разрешение гистограмм скоров.
+        :return: StreamingEvaluator: metrics() — метрики как у evaluate, threshold_table() — таблица порогов.
+        """
+        evaluator = StreamingEvaluator(n_bins=n_bins)
+        for X_chunk, y_chunk in chunks:
+            evaluator.update(y_chunk, self.predict_proba(X_chunk))
+        return evaluator
+
     def save_model(self, path: str = "model.pkl") -> None:
         """
         Сохраняет обученную модель в файл.
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from model import COMPILED_MAX_ROWS, Model
+from derived_features import DerivedFeatures
+from feature_snapshot import FeatureSnapshot
+from preprocessing import DataPreprocessor
+from tree_engine import CompiledEnsemble
+
+CURRENT_FILE = "CURRENT"
+
+
+class MissingArtifactError(FileNotFoundError):
+    """У версии модели нет артефакта, который должен был появиться при регистрации."""
+
+
+class ModelRegistry:
+    def __init__(self, directory: str, check_interval: float = 5.0) -> None:
+        """
+        Реестр моделей в каталоге models/.
+
+        Версия модели — имя файла <version>.pkl. Рядом лежат метаданные <version>.json
+        (список признаков, дата обучения, sha256), препроцессор <version>.preprocessor.json,
+        обученный на тех же данных, что и модель, и скомпилированный ансамбль
+        <version>.compiled/ в формате .npy. Активная версия записана в файле CURRENT.
+
+        :param directory: Каталог моделей.
+        :param check_interval: Как часто (в секундах) проверять, не сменилась ли активная версия.
+        """
+        self.directory = Path(directory)
+        self.check_interval = check_interval
+        self.model: Optional[Model] = None
+        self.checked_at: float = 0.0
+        self.lock = threading.Lock()
+
+    def model_path(self, version: str) -> Path:
+        """
+        :param version: Версия.
+        :return: Путь к pickle модели.
+        """
+        return self.directory / f"{version}.pkl"
+
+    def metadata_path(self, version: str) -> Path:
+        """
+        :param version: Версия.
+        :return: Путь к метаданным версии.
+        """
+        return self.directory / f"{version}.json"
+
+    def compiled_path(self, version: str) -> Path:
+        """
+        :param version: Версия.
+        :return: Каталог скомпилированного ансамбля.
+        """
+        return self.directory / f"{version}.compiled"
+
+    def preprocessor_path(self, version: str) -> Path:
+        """
+        :param version: Версия.
+        :return: Путь к артефакту препроцессора.
+        """
+        return self.directory / f"{version}.preprocessor.json"
+
+    def versions(self) -> List[str]:
+        """
+        :return: Версии моделей в каталоге.
+        """
+        return sorted(path.stem for path in self.directory.glob("*.pkl"))
+
+    @staticmethod
+    def checksum(path: Path) -> str:
+        """
+        Считает sha256 файла.
+
+        :param path: Путь к файлу.
+        :return: Хэш в hex.
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def register(self, version: str, trained_at: Optional[str] = None,
+                 preprocessor: Optional[DataPreprocessor] = None) -> Dict[str, Any]:
+        """
+        Записывает метаданные версии, компилирует ансамбль и сохраняет препроцессор.
+
+        :param version: Версия (имя файла модели без .pkl).
+        :param trained_at: Дата обучения (по умолчанию — время изменения файла модели).
+        :param preprocessor: Препроцессор, обученный вместе с моделью (см. save_preprocessor).
+        :return: Метаданные версии.
+        """
+        path = self.model_path(version)
+        estimator = Model.load_model(str(path))
+        if trained_at is None:
+            trained_at = datetime.fromtimestamp(path.stat().st_mtime).isoformat(timespec="seconds")
+        metadata = {
+            "version": version,
+            "features": [str(name) for name in getattr(estimator, "feature_names_in_", [])],
+            "trained_at": trained_at,
+            "sha256": self.checksum(path),
+        }
+        self.write_json(self.metadata_path(version), metadata)
+        try:
+            CompiledEnsemble.from_sklearn(estimator).save(self.compiled_path(version))
+        except ValueError:
+            pass  # Модель не компилируется — predict пойдет через sklearn
+        if preprocessor is not None:
+            self.save_preprocessor(version, preprocessor)
+        return metadata
+
+    def save_preprocessor(self, version: str, preprocessor: DataPreprocessor) -> None:
+        """
+        Сохраняет препроцессор версии. Вызывается при обучении/регистрации модели, а не в сервисе:
+        статистики должны быть посчитаны на обучающих данных модели.
+
+        :param version: Версия.
+        :param preprocessor: Обученный препроцессор; его столбцы должны совпадать с признаками модели.
+        """
+        features = self.metadata(version)["features"]
+        if not preprocessor.is_fitted:
+            raise ValueError(f"Препроцессор для модели {version} не обучен")
+        if features and preprocessor.columns != features:
+            raise ValueError(f"Столбцы препроцессора {preprocessor.columns} не совпадают "
+                             f"с признаками модели {version}: {features}")
+        preprocessor.save(str(self.preprocessor_path(version)))
+
+    def load_preprocessor(self, version: str) -> DataPreprocessor:
+        """
+        Загружает препроцессор версии. Сервис его только читает: если артефакта нет,
+        модель нужно зарегистрировать заново (python model_registry.py <version> --training-data ...).
+
+        :param version: Версия.
+        :return: Обученный препроцессор.
+        """
+        path = self.preprocessor_path(version)
+        if not path.exists():
+            raise MissingArtifactError(f"Для модели {version} нет препроцессора {path}. Он сохраняется "
+                                       f"при регистрации модели: python model_registry.py {version} "
+                                       f"--training-data <обучающий CSV>")
+        return DataPreprocessor.load(str(path))
+
+    def metadata(self, version: str) -> Dict[str, Any]:
+        """
+        Возвращает метаданные версии, зарегистрировав ее при первом обращении.
+
+        :param version: Версия.
+        :return: Метаданные версии.
+        """
+        path = self.metadata_path(version)
+        if not path.exists():
+            return self.register(version)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def current_version(self) -> str:
+        """
+        Активная версия: из файла CURRENT, а если его нет — последняя по дате обучения.
+
+        :return: Версия.
+        """
+        current = self.directory / CURRENT_FILE
+        if current.exists():
+            return current.read_text(encoding="utf-8").strip()
+        versions = self.versions()
+        if not versions:
+            raise FileNotFoundError(f"В каталоге {self.directory} нет моделей")
+        return max(versions, key=lambda version: self.metadata(version)["trained_at"])
+
+    def load(self, version: str) -> Model:
+        """
+        Загружает версию: проверяет sha256 и открывает скомпилированный ансамбль через memory-map
+        (если его еще нет — компилирует и сохраняет для остальных процессов).
+
+        Модель со скомпилированным ансамблем не распаковывает pickle сразу: батчи до COMPILED_MAX_ROWS
+        идут через ансамбль, таблицы которого процессы делят в page cache, а sklearn-модель для больших
+        батчей (на них она быстрее) читается из файла при первом таком батче. Модель, которая
+        не компилируется, загружается целиком.
+
+        :param version: Версия.
+        :return: Модель с заполненными version и metadata.
+        """
+        metadata = self.metadata(version)
+        path = self.model_path(version)
+        if self.checksum(path) != metadata["sha256"]:
+            raise ValueError(f"Контрольная сумма модели {version} не совпадает с метаданными")
+
+        compiled_path = self.compiled_path(version)
+        estimator = None
+        if not (compiled_path / "meta.json").exists():
+            estimator = Model.load_model(str(path))
+            try:
+                CompiledEnsemble.from_sklearn(estimator).save(compiled_path)
+            except ValueError:
+                pass  # Модель не компилируется — predict пойдет через sklearn
+
+        model = Model({})
+        model.version = version
+        model.metadata = metadata
+        model.estimator_path = str(path)
+        if (compiled_path / "meta.json").exists():
+            model.model = None
+            model.compiled = CompiledEnsemble.load(compiled_path)
+            model.compiled_max_rows = COMPILED_MAX_ROWS
+        else:
+            model.model = estimator if estimator is not None else Model.load_model(str(path))
+        return model
+
+    def activate(self, version: str) -> Model:
+        """
+        Делает версию активной: загружает ее, затем атомарно подменяет файл CURRENT и ссылку на модель.
+        Запросы, уже получившие старую модель, дорабатывают на ней.
+
+        :param version: Версия.
+        :return: Загруженная модель.
+        """
+        model = self.load(version)
+        with self.lock:
+            tmp_path = self.directory / f"{CURRENT_FILE}.tmp{os.getpid()}"
+            tmp_path.write_text(version, encoding="utf-8")
+            os.replace(tmp_path, self.directory / CURRENT_FILE)
+            self.model = model
+            self.checked_at = time.monotonic()
+        return model
+
+    def get(self) -> Model:
+        """
+        Возвращает активную модель, загружая ее при первом обращении. Не чаще раза в
+        check_interval проверяет CURRENT и подменяет модель, если версия сменилась
+        (в том числе другим процессом).
+
+        :return: Активная модель.
+        """
+        model = self.model
+        if model is not None and time.monotonic() - self.checked_at < self.check_interval:
+            return model
+        if model is not None and not self.lock.acquire(blocking=False):
+            return model
+        if model is None:
+            self.lock.acquire()
+        try:
+            version = self.current_version()
+            if self.model is None or self.model.version != version:
+                self.model = self.load(version)
+            self.checked_at = time.monotonic()
+            return self.model
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def write_json(path: Path, data: Dict[str, Any]) -> None:
+        """
+        Атомарно записывает JSON (через временный файл и os.replace).
+
+        :param path: Путь к файлу.
+        :param data: Данные.
+        """
+        tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def main() -> None:
+    """
+    Регистрирует версию модели вместе с препроцессором, обученным на ее обучающих данных:
+    производные фичи считаются так же, как в сервисе, статистики — по признакам модели.
+    """
+    parser = argparse.ArgumentParser(description="Регистрация модели и ее препроцессора")
+    parser.add_argument("version", help="Версия (имя файла модели без .pkl)")
+    parser.add_argument("--training-data", required=True, help="CSV/Parquet, на котором обучалась модель")
+    parser.add_argument("--models-dir", default=str(Path(__file__).resolve().parent.parent / "models"))
+    parser.add_argument("--trained-at", default=None, help="Дата обучения (по умолчанию — из метаданных)")
+    args = parser.parse_args()
+    registry = ModelRegistry(args.models_dir)
+    if args.trained_at is None:
+        metadata = registry.metadata(args.version)
+    else:
+        metadata = registry.register(args.version, args.trained_at)
+    df = DerivedFeatures.from_yaml().transform(FeatureSnapshot.read_source(Path(args.training_data)))
+    preprocessor = DataPreprocessor(fill_strategy="zero", scale_method="standard")
+    preprocessor.fit(df, columns=metadata["features"] or None)
+    registry.save_preprocessor(args.version, preprocessor)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
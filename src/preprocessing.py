@@ -1,7 +1,14 @@
+import os
+import json
 import pandas as pd
 import numpy as np
+from datetime import datetime
 from sklearn.preprocessing import StandardScaler
-from typing import Literal
+from typing import List, Literal, Optional
+from frame_utils import float_dtype
+from instrumentation import metrics
+
+ARTIFACT_VERSION = 1
 
 class DataPreprocessor:
     def __init__(self, fill_strategy: Literal["mean", "median", "zero"] = "mean", scale_method: Literal["standard"] = "standard") -> None:
@@ -14,6 +21,115 @@ class DataPreprocessor:
         self.fill_strategy = fill_strategy
         self.scale_method = scale_method
         self.scaler = StandardScaler() if scale_method == "standard" else None
+        self.columns: Optional[List[str]] = None
+        self.fill_values: Optional[np.ndarray] = None
+        self.mean: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        self.fitted_at: Optional[str] = None
+
+    @property
+    def is_fitted(self) -> bool:
+        """
+        :return: True, если статистики посчитаны (fit или load) и preprocess только применяет их.
+        """
+        return self.columns is not None
+
+    def fit(self, df: pd.DataFrame, columns: Optional[List[str]] = None) -> "DataPreprocessor":
+        """
+        Запоминает значения для заполнения пропусков и статистики нормализации.
+
+        :param df: Обучающий DataFrame.
+        :param columns: Признаки в порядке модели (по умолчанию — числовые столбцы, кроме ID и target).
+        :return: Обученный препроцессор.
+        """
+        if columns is None:
+            columns = [col for col in df.select_dtypes(include="number").columns
+                       if col not in ("customer_mindbox_id", "target")]
+        values = df[columns].to_numpy(dtype=np.float64, copy=True)
+        values[~np.isfinite(values)] = np.nan
+
+        if self.fill_strategy == "mean":
+            fill_values = np.nanmean(values, axis=0)
+        elif self.fill_strategy == "median":
+            fill_values = np.nanmedian(values, axis=0)
+        else:
+            fill_values = np.zeros(len(columns))
+        fill_values = np.nan_to_num(fill_values)
+        values = np.where(np.isnan(values), fill_values, values)
+
+        if self.scaler is not None and len(values):
+            mean = values.mean(axis=0)
+            scale = values.std(axis=0)
+            scale[scale == 0] = 1.0
+        else:
+            mean = np.zeros(len(columns))
+            scale = np.ones(len(columns))
+
+        self.columns = list(columns)
+        self.fill_values = fill_values
+        self.mean = mean
+        self.scale = scale
+        self.fitted_at = datetime.now().isoformat(timespec="seconds")
+        return self
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Применяет сохраненные статистики за один проход по матрице float32:
+        выбор столбцов, замена inf/NaN, заполнение и нормализация.
+        Результат не зависит от того, сколько строк пришло в запросе.
+
+        :param df: DataFrame с признаками.
+        :return: DataFrame с обученными столбцами в порядке обучения.
+        """
+        matrix = np.array(df[self.columns], dtype=np.float32)
+        missing = ~np.isfinite(matrix)
+        if missing.any():
+            rows, cols = np.nonzero(missing)
+            matrix[rows, cols] = self.fill_values[cols]
+        matrix -= self.mean.astype(np.float32)
+        matrix /= self.scale.astype(np.float32)
+        return pd.DataFrame(matrix, index=df.index, columns=self.columns, copy=False)
+
+    def save(self, path: str) -> None:
+        """
+        Сохраняет обученный препроцессор в JSON (атомарно).
+
+        :param path: Путь к файлу артефакта.
+        """
+        artifact = {
+            "version": ARTIFACT_VERSION,
+            "fill_strategy": self.fill_strategy,
+            "scale_method": self.scale_method,
+            "fitted_at": self.fitted_at,
+            "columns": self.columns,
+            "fill_values": self.fill_values.tolist(),
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(artifact, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DataPreprocessor":
+        """
+        Загружает обученный препроцессор из JSON.
+
+        :param path: Путь к файлу артефакта.
+        :return: Обученный препроцессор.
+        """
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия препроцессора: {artifact.get('version')}")
+        preprocessor = cls(artifact["fill_strategy"], artifact["scale_method"])
+        preprocessor.columns = artifact["columns"]
+        preprocessor.fill_values = np.array(artifact["fill_values"], dtype=np.float64)
+        preprocessor.mean = np.array(artifact["mean"], dtype=np.float64)
+        preprocessor.scale = np.array(artifact["scale"], dtype=np.float64)
+        preprocessor.fitted_at = artifact["fitted_at"]
+        return preprocessor
 
     def handle_missing_values(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -32,26 +148,34 @@ class DataPreprocessor:
 
     def scale_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Нормализует числовые признаки, исключая 'customer_mindbox_id'.
+        Нормализует числовые признаки, исключая 'customer_mindbox_id'. Признаки компактных
+        типов (int8..int32, float32) остаются float32, а не становятся float64.
 
         :param df: DataFrame с числовыми признаками.
         :return: DataFrame с нормализованными признаками.
         """
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
+        numeric_cols = df.select_dtypes(include="number").columns
         numeric_cols = [col for col in numeric_cols if col != 'customer_mindbox_id']
 
         if df[numeric_cols].shape[0] > 0:
             if self.scaler:
-                df[numeric_cols] = self.scaler.fit_transform(df[numeric_cols])
+                scaled = self.scaler.fit_transform(df[numeric_cols])
+                for i, col in enumerate(numeric_cols):
+                    df[col] = scaled[:, i].astype(float_dtype(df[col].dtype))
         return df
 
     def preprocess(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Полный процесс предобработки данных.
+        Полный процесс предобработки данных. Обученный препроцессор только применяет
+        сохраненные статистики (transform), необученный — считает их по пришедшим строкам.
 
         :param df: Исходный DataFrame.
         :return: Очищенный и нормализованный DataFrame.
         """
-        df = self.handle_missing_values(df)
-        df = self.scale_features(df)
-        return df
\ No newline at end of file
+        with metrics.span("preprocess") as span:
+            span.add(rows=len(df))
+            if self.is_fitted:
+                return self.transform(df)
+            df = self.handle_missing_values(df)
+            df = self.scale_features(df)
+            return df
\ No newline at end of file
@@ -0,0 +1,254 @@
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Ключевые слова, после которых в запросе идет имя таблицы
+TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN)\s+([\w\[\]#.]+)", re.IGNORECASE)
+STRING_OR_WHITESPACE = re.compile(r"('(?:[^']|'')*')|((?:\s|--[^\n]*)+)")
+# Функции текущего времени SQL Server: результат таких запросов меняется со временем
+CURRENT_TIME = re.compile(
+    r"\b(?:GETDATE|GETUTCDATE|SYSDATETIME|SYSUTCDATETIME|SYSDATETIMEOFFSET|CURRENT_TIMESTAMP)\b", re.IGNORECASE
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Приводит текст запроса к каноническому виду: убирает комментарии "--", схлопывает
+    пробелы и переводы строк (кроме строковых литералов) и завершающую точку с запятой.
+
+    :param sql: Текст запроса.
+    :return: Нормализованный текст.
+    """
+    def replace(match: re.Match) -> str:
+        if match.group(1) is not None:
+            return match.group(1)
+        return " "
+
+    return STRING_OR_WHITESPACE.sub(replace, sql).strip().rstrip(";").strip()
+
+
+def referenced_tables(sql: str) -> List[str]:
+    """
+    Таблицы, которые читает запрос (после FROM и JOIN), в нижнем регистре и без скобок [].
+    Имена CTE тоже попадают в список — на инвалидацию это не влияет.
+
+    :param sql: Текст запроса.
+    :return: Отсортированный список имен вида "dbo_mb.orders".
+    """
+    return sorted({match.replace("[", "").replace("]", "").lower() for match in TABLE_REFERENCE.findall(sql)})
+
+
+class QueryCache:
+    def __init__(self, directory: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None) -> None:
+        """
+        Дисковый кэш результатов SQL-запросов с адресацией по содержимому.
+
+        Ключ — sha256 нормализованного текста запроса и схемы типов, результат хранится
+        в Parquet (zstd) в файле <ключ>.parquet. Индекс (размер, время записи и обращения,
+        таблицы запроса) лежит в SQLite, поэтому кэш можно использовать из нескольких
+        процессов одновременно: файлы записываются во временный файл и атомарно
+        переименовываются, изменения индекса идут в транзакциях SQLite.
+
+        :param directory: Каталог кэша.
+        :param ttl: Время жизни записи в секундах (None — без ограничения).
+        :param max_bytes: Максимальный суммарный размер файлов; при превышении удаляются
+            записи, к которым дольше всего не обращались (None — без ограничения).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.sqlite3"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        with self.connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    tables TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Открывает соединение с индексом кэша (отдельное на каждую операцию — безопасно для потоков).
+
+        :return: Соединение SQLite.
+        """
+        connection = sqlite3.connect(self.index_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @staticmethod
+    def key(sql: str, dtypes: Optional[Dict[str, str]] = None, today: Optional[date] = None) -> str:
+        """
+        Ключ записи: sha256 нормализованного запроса и схемы типов результата. Для запросов
+        с GETDATE() и другими функциями текущего времени (дни с последней покупки, окно
+        за год) в ключ входит текущая дата, поэтому такие результаты живут не дольше суток.
+
+        :param sql: Текст запроса.
+        :param dtypes: Схема типов, с которой читается результат.
+        :param today: Текущая дата (по умолчанию date.today()).
+        :return: Шестнадцатеричная строка.
+        """
+        payload = normalize_sql(sql) + "\n" + json.dumps(dtypes or {}, sort_keys=True)
+        if CURRENT_TIME.search(sql):
+            payload += "\n" + (today or date.today()).isoformat()
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        """
+        :param key: Ключ записи (см. key).
+        :return: Путь к parquet-файлу записи (каталоги по первым двум символам ключа).
+        """
+        return self.directory / key[:2] / f"{key}.parquet"
+
+    def get(self, sql: str, dtypes: Optional[Dict[str, str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Возвращает сохраненный результат запроса.
+
+        :param sql: Текст запроса.
+        :param dtypes: Схема типов результата.
+        :return: DataFrame или None, если записи нет или она устарела.
+        """
+        key = self.key(sql, dtypes)
+        now = time.time()
+        with self.connect() as connection:
+            row = connection.execute("SELECT created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[0] > self.ttl:
+                self.remove(connection, [key])
+                row = None
+        result = None
+        if row is not None:
+            try:
+                result = pd.read_parquet(self.path(key))
+            except (OSError, ValueError):
+                # Файл удален другим процессом или поврежден — считаем промахом
+                with self.connect() as connection:
+                    connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+        with self.lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if result is not None:
+            with self.connect() as connection:
+                connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return result
+
+    def put(self, sql: str, df: pd.DataFrame, dtypes: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Сохраняет результат запроса.
+
+        :param sql: Текст запроса.
+        :param df: Результат.
+        :param dtypes: Схема типов результата.
+        :return: True, если результат сохранен (False — DataFrame не удалось записать в Parquet).
+        """
+        key = self.key(sql, dtypes)
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f".{key}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        try:
+            df.to_parquet(tmp_path, compression="zstd")
+        except (ValueError, TypeError, ImportError, OSError):
+            tmp_path.unlink(missing_ok=True)
+            return False
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, tables, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(referenced_tables(sql)), size, now, now),
+            )
+        if self.max_bytes is not None:
+            self.evict()
+        return True
+
+    def remove(self, connection: sqlite3.Connection, keys: List[str]) -> None:
+        """
+        Удаляет записи из индекса и их файлы.
+
+        :param connection: Соединение с индексом (транзакция вызывающего).
+        :param keys: Ключи записей.
+        """
+        connection.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        for key in keys:
+            self.path(key).unlink(missing_ok=True)
+
+    def evict(self) -> int:
+        """
+        Удаляет устаревшие записи (ttl) и самые давние по обращению, пока суммарный размер
+        больше max_bytes.
+
+        :return: Количество удаленных записей.
+        """
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            keys: List[str] = []
+            if self.ttl is not None:
+                keys += [key for key, in connection.execute(
+                    "SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl,))]
+            if self.max_bytes is not None:
+                total = 0
+                rows = connection.execute(
+                    "SELECT key, size FROM entries WHERE created_at >= ? ORDER BY accessed_at DESC",
+                    (time.time() - self.ttl if self.ttl is not None else 0,),
+                )
+                for key, size in rows:
+                    total += size
+                    if total > self.max_bytes:
+                        keys.append(key)
+            self.remove(connection, keys)
+        return len(keys)
+
+    def invalidate(self, table: str) -> int:
+        """
+        Удаляет записи запросов, читающих таблицу. Имя без схемы ("orders") совпадает
+        с таблицей в любой схеме ("dbo_mb.orders").
+
+        :param table: Имя таблицы.
+        :return: Количество удаленных записей.
+        """
+        table = table.replace("[", "").replace("]", "").lower()
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            keys = [
+                key for key, tables in connection.execute("SELECT key, tables FROM entries")
+                if any(name == table or name.endswith("." + table) for name in json.loads(tables))
+            ]
+            self.remove(connection, keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Удаляет все записи."""
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            self.remove(connection, [key for key, in connection.execute("SELECT key FROM entries")])
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Статистика кэша: попадания и промахи этого процесса, число записей и их размер.
+
+        :return: Словарь со счетчиками.
+        """
+        with self.connect() as connection:
+            entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
\ No newline at end of file
@@ -0,0 +1,180 @@
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+COLUMNS = ["row", "Predicted Probability", "Predicted Class"]
+
+
+class ScoreCache:
+    def __init__(self, max_entries: int = 200_000, disk_path: Optional[str] = None) -> None:
+        """
+        Кэш предсказаний по ключу (ID клиента, версия модели, версия снимка фичей).
+
+        В памяти — LRU на max_entries клиентов, опционально — второй уровень в SQLite.
+        Смена версии модели или снимка сбрасывает кэш: старые ключи больше не могут совпасть.
+        Кроме скоров хранится номер строки в снимке, чтобы сохранять порядок ответа.
+
+        :param max_entries: Максимум клиентов в памяти.
+        :param disk_path: Путь к файлу SQLite для дискового уровня (None — только память).
+        """
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.memory: "OrderedDict[int, Tuple[int, float, int]]" = OrderedDict()
+        self.generation: Optional[Tuple[str, str]] = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_path is not None:
+            with self.connect() as connection:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS scores (
+                        customer_id INTEGER NOT NULL,
+                        model_version TEXT NOT NULL,
+                        snapshot_version TEXT NOT NULL,
+                        row INTEGER NOT NULL,
+                        probability REAL NOT NULL,
+                        class INTEGER NOT NULL,
+                        PRIMARY KEY (customer_id, model_version, snapshot_version)
+                    )
+                """)
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Открывает соединение с дисковым уровнем кэша (отдельное на каждую операцию — безопасно для потоков).
+
+        :return: Соединение SQLite.
+        """
+        connection = sqlite3.connect(self.disk_path, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def switch_generation(self, model_version: str, snapshot_version: str) -> None:
+        """
+        Сбрасывает кэш, если сменилась версия модели или снимка. Вызывается под self.lock.
+
+        :param model_version: Версия модели.
+        :param snapshot_version: Версия снимка фичей.
+        """
+        generation = (model_version, snapshot_version)
+        if self.generation == generation:
+            return
+        self.memory.clear()
+        if self.disk_path is not None:
+            with self.connect() as connection:
+                connection.execute(
+                    "DELETE FROM scores WHERE model_version != ? OR snapshot_version != ?", generation
+                )
+        self.generation = generation
+
+    def get_many(self, ids: Iterable[int], model_version: str,
+                 snapshot_version: str) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Ищет предсказания в кэше.
+
+        :param ids: ID клиентов.
+        :param model_version: Версия модели.
+        :param snapshot_version: Версия снимка фичей.
+        :return: DataFrame найденных предсказаний (индекс — customer_mindbox_id, столбцы COLUMNS)
+            и массив ID, которых нет в кэше.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        found: Dict[int, Tuple[int, float, int]] = {}
+        missing = []
+        with self.lock:
+            self.switch_generation(model_version, snapshot_version)
+            for customer_id in ids.tolist():
+                value = self.memory.get(customer_id)
+                if value is None:
+                    missing.append(customer_id)
+                else:
+                    self.memory.move_to_end(customer_id)
+                    found[customer_id] = value
+            memory_hits = len(found)
+
+            if missing and self.disk_path is not None:
+                from_disk = self.read_disk(missing, model_version, snapshot_version)
+                for customer_id, value in from_disk.items():
+                    found[customer_id] = value
+                    self.store(customer_id, value)
+                missing = [customer_id for customer_id in missing if customer_id not in from_disk]
+                self.disk_hits += len(from_disk)
+
+            self.hits += memory_hits
+            self.misses += len(missing)
+
+        hits = pd.DataFrame.from_dict(found, orient="index", columns=COLUMNS)
+        hits.index = hits.index.astype("int64")
+        hits.index.name = "customer_mindbox_id"
+        return hits, np.array(missing, dtype=np.int64)
+
+    def put_many(self, predictions: pd.DataFrame, model_version: str, snapshot_version: str) -> None:
+        """
+        Сохраняет предсказания.
+
+        :param predictions: DataFrame с индексом customer_mindbox_id и столбцами COLUMNS.
+        :param model_version: Версия модели.
+        :param snapshot_version: Версия снимка фичей.
+        """
+        records = list(zip(predictions.index.astype("int64").tolist(), predictions["row"].astype("int64").tolist(),
+                           predictions["Predicted Probability"].astype(float).tolist(),
+                           predictions["Predicted Class"].astype(int).tolist()))
+        with self.lock:
+            self.switch_generation(model_version, snapshot_version)
+            for customer_id, row, probability, predicted_class in records:
+                self.store(customer_id, (row, probability, predicted_class))
+            if self.disk_path is not None and records:
+                with self.connect() as connection:
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+                        [(customer_id, model_version, snapshot_version, row, probability, predicted_class)
+                         for customer_id, row, probability, predicted_class in records],
+                    )
+
+    def store(self, customer_id: int, value: Tuple[int, float, int]) -> None:
+        """
+        Кладет запись в LRU в памяти, вытесняя самые старые. Вызывается под self.lock.
+        """
+        self.memory[customer_id] = value
+        self.memory.move_to_end(customer_id)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+
+    def read_disk(self, ids: list, model_version: str, snapshot_version: str) -> Dict[int, Tuple[int, float, int]]:
+        """
+        Читает записи дискового уровня частями (ограничение SQLite на число параметров).
+        """
+        found = {}
+        with self.connect() as connection:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                rows = connection.execute(
+                    f"SELECT customer_id, row, probability, class FROM scores "
+                    f"WHERE model_version = ? AND snapshot_version = ? AND customer_id IN ({placeholders})",
+                    [model_version, snapshot_version, *chunk],
+                )
+                for customer_id, row, probability, predicted_class in rows:
+                    found[customer_id] = (row, probability, predicted_class)
+        return found
+
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: Статистика попаданий: hits (память), disk_hits, misses, hit_rate, size, evictions.
+        """
+        with self.lock:
+            requests = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / requests if requests else 0.0,
+                "size": len(self.memory),
+                "evictions": self.evictions,
+            }
\ No newline at end of file
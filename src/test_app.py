@@ -1,7 +1,20 @@
 import io
+import json
+import time
+import shutil
 import pandas as pd
 import pytest
+import app as app_module
+import feature as feature_module
+import model as model_module
+import preprocessing as preprocessing_module
 from app import app
+from feature_snapshot import SnapshotProvider
+from instrumentation import Metrics
+from jobs import JobQueue
+from model_registry import ModelRegistry
+from preprocessing import DataPreprocessor
+from score_cache import ScoreCache
 
 @pytest.fixture
 def client():
@@ -43,4 +56,149 @@ def test_valid_file_prediction(client):
     response = client.post('/', data=data, content_type='multipart/form-data')
     assert response.status_code == 200
     assert response.headers['Content-Disposition'].startswith('attachment;')
-    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
\ No newline at end of file
+    assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def registered_models(directory, training_data, with_preprocessor=True):
+    directory.mkdir()
+    for name in ("model_01_04_2025.pkl", "model_01_04_2025.json"):
+        shutil.copy(app_module.models_path / name, directory / name)
+    registry = ModelRegistry(directory)
+    if with_preprocessor:
+        features = registry.metadata("model_01_04_2025")["features"]
+        preprocessor = DataPreprocessor(fill_strategy="zero", scale_method="standard")
+        preprocessor.fit(app_module.derived_features.transform(training_data), columns=features)
+        registry.save_preprocessor("model_01_04_2025", preprocessor)
+    return registry
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    df = pd.DataFrame({
+        "customer_mindbox_id": [132, 364, 500],
+        "purchase_count_restore": [1, 4, 2],
+        "purchase_sum_restore": [1000, 52000, 7000],
+        "bonus_write_offs": [0, 300, 50],
+        "days_since_last_purchase": [400, 12, 90],
+        "days_until_expiry": [10, 200, 30],
+        "bonuses_balance": [100, 2500, 300],
+        "avg_receipt_restore": [1000, 13000, 3500],
+        "days_since_last_redemption": [None, 20, 100],
+        "bonus_usage_ratio": [0.0, 0.5, 0.25],
+    })
+    path = tmp_path / "data.csv"
+    df.to_csv(path)
+    monkeypatch.setattr(app_module, "snapshot_provider", SnapshotProvider(str(path)))
+    monkeypatch.setattr(app_module, "model_registry", registered_models(tmp_path / "models", df))
+    monkeypatch.setattr(app_module, "preprocessors", {})
+    monkeypatch.setattr(app_module, "score_cache", ScoreCache())
+    return df
+
+
+def test_score_json_streams_json_lines(client, snapshot):
+    response = client.post('/score', json=[364, 132, 999])
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [row["customer_mindbox_id"] for row in rows] == [132, 364]
+    assert all(0.0 <= row["Predicted Probability"] <= 1.0 for row in rows)
+
+
+def test_score_does_not_depend_on_batch(client, snapshot, tmp_path):
+    batch = client.post('/score', json=[132, 364, 500]).data.decode().splitlines()
+    single = client.post('/score', json=[364]).data.decode().splitlines()
+    assert single[0] == batch[1]
+
+
+def test_score_without_preprocessor_fails_before_streaming(client, snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "model_registry",
+                        registered_models(tmp_path / "bare", snapshot, with_preprocessor=False))
+    response = client.post('/score', json=[364, 132])
+    assert response.status_code == 503
+    assert "model_01_04_2025.preprocessor.json" in response.data.decode()
+    assert not (tmp_path / "bare" / "model_01_04_2025.preprocessor.json").exists()
+
+
+def test_repeated_ids_are_served_from_cache(client, snapshot, monkeypatch):
+    first = client.post('/score', json=[364, 132]).data
+    calls = []
+    predict_customers = app_module.predict_customers
+    monkeypatch.setattr(app_module, "predict_customers", lambda *args: calls.append(args[2]) or predict_customers(*args))
+
+    second = client.post('/score', json=[500, 132, 364]).data.decode().splitlines()
+    assert [list(ids) for ids in calls] == [[500]]
+    assert second[:2] == first.decode().splitlines()
+    stats = client.get('/cache/stats').get_json()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 3
+
+
+def test_score_csv_stream_returns_csv(client, snapshot, monkeypatch):
+    monkeypatch.setattr(app_module, "SCORE_CHUNK_SIZE", 2)
+    body = "user_id\n132\n364\n500\n"
+    response = client.post('/score?format=csv', data=body, content_type='text/csv')
+    assert response.status_code == 200
+    result = pd.read_csv(io.StringIO(response.data.decode()))
+    assert list(result.columns) == ["customer_mindbox_id", "Predicted Probability", "Predicted Class"]
+    assert sorted(result["customer_mindbox_id"]) == [132, 364, 500]
+
+
+def test_score_unknown_format(client):
+    response = client.post('/score?format=xml', json=[1])
+    assert response.status_code == 400
+
+
+def test_score_rejects_malformed_json(client):
+    headers = {"Content-Type": "application/json"}
+    assert client.post('/score', data='[364, 13', headers=headers).status_code == 400
+    assert client.post('/score', data='364', headers=headers).status_code == 400
+    assert client.post('/score', json={"user_ids": "364"}).status_code == 400
+    assert client.post('/score', json={"ids": [364]}).status_code == 400
+
+
+def test_job_lifecycle(client, snapshot, tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "jobs", app_module.score_customers, chunk_size=2)
+    monkeypatch.setattr(app_module, "job_queue", queue)
+    excel_file = create_excel_file(pd.DataFrame({'user_id': [364, 132, 500]}))
+    response = client.post('/jobs', data={'file': (excel_file, 'big.xlsx')}, content_type='multipart/form-data')
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+
+    queue.pool.shutdown(wait=True)
+    status = client.get(f'/jobs/{job_id}').get_json()
+    assert status["status"] == "done"
+    assert status["processed"] == 3
+
+    result = client.get(f'/jobs/{job_id}/result')
+    assert result.status_code == 200
+    df = pd.read_csv(io.BytesIO(result.data))
+    assert sorted(df["customer_mindbox_id"]) == [132, 364, 500]
+    assert client.get('/jobs/unknown').status_code == 404
+
+
+def test_metrics_endpoint(client, snapshot, monkeypatch):
+    registry = Metrics(enabled=True)
+    for module in (app_module, feature_module, model_module, preprocessing_module):
+        monkeypatch.setattr(module, "metrics", registry)
+
+    client.post('/score', json=[364, 132]).close()
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.data.decode()
+    assert 'pipeline_stage_rows_total{stage="model_predict"} 2' in text
+    assert 'pipeline_stage_seconds_count{stage="preprocess"} 1' in text
+    assert 'http_request_duration_seconds_count{endpoint="score",method="POST",status="200"} 1' in text
+
+
+def test_score_latency_covers_streamed_body(client, snapshot, monkeypatch):
+    registry = Metrics(enabled=True)
+    monkeypatch.setattr(app_module, "metrics", registry)
+    monkeypatch.setattr(app_module, "score_customers",
+                        lambda ids: time.sleep(0.2) or pd.DataFrame(index=pd.Index(ids)))
+
+    response = client.post('/score', json=[364, 132])
+    assert ("score", "POST", "200") not in registry.requests
+    assert len(response.get_data(as_text=True).splitlines()) == 2
+    response.close()
+    histogram = registry.requests[("score", "POST", "200")]
+    assert histogram.count == 1
+    assert histogram.sum >= 0.2
\ No newline at end of file
@@ -0,0 +1,88 @@
+import json
+import pandas as pd
+from unittest.mock import MagicMock
+from batch_sizing import BatchSizer
+from feature import Feature
+from feature_manager import FeatureManager
+from test_feature_manager import FEATURES_YAML, FakeDatabase
+
+
+def test_fast_queries_grow_batch_at_most_twice_per_step():
+    sizer = BatchSizer(target_seconds=2.0, min_size=10, max_size=5000)
+    sizer.observe("f", 1000, 0.1, 1000)
+    assert sizer.batch_size("f", 1000) == 2000
+    for _ in range(5):
+        sizer.observe("f", sizer.batch_size("f", 1000), 0.1, 1000)
+    assert sizer.batch_size("f", 1000) == 5000
+
+
+def test_slow_queries_shrink_batch_to_target():
+    sizer = BatchSizer(target_seconds=1.0, min_size=100)
+    sizer.observe("f", 1000, 8.0, 10)
+    assert sizer.batch_size("f", 1000) == 500
+    for _ in range(10):
+        size = sizer.batch_size("f", 1000)
+        sizer.observe("f", size, size * 0.008, 10)
+    assert 100 <= sizer.batch_size("f", 1000) <= 150
+
+
+def test_result_rows_and_statement_size_limit_batch():
+    sizer = BatchSizer(target_seconds=10.0, max_result_rows=3000)
+    sizer.observe("f", 1000, 0.01, 2000)
+    assert sizer.batch_size("f", 1000) == 1500
+
+    sizer = BatchSizer(max_statement_bytes=10_000)
+    assert sizer.batch_size("g", 5000, query_bytes=1000, id_width=9) == 1000
+
+
+def test_learned_sizes_survive_restart(tmp_path):
+    path = tmp_path / "batch_sizes.json"
+    sizer = BatchSizer(str(path))
+    sizer.observe("f", 1000, 0.1, 10)
+    sizer.save()
+
+    assert json.loads(path.read_text(encoding="utf-8"))["f"]["batch_size"] == 2000
+    assert BatchSizer(str(path)).batch_size("f", 1000) == 2000
+
+
+def test_feature_batches_follow_sizer():
+    sizes = []
+
+    def select(query):
+        ids = [int(id_) for id_ in query.split("IN (")[1].split(")")[0].split(", ")]
+        sizes.append(len(ids))
+        return pd.DataFrame({"customer_mindbox_id": ids, "value": ids})
+
+    feature = Feature("f", "SELECT * FROM t WHERE customer_mindbox_id IN ({values})", batch_size=1)
+    feature.batch_sizer = BatchSizer(target_seconds=60.0, min_size=1)
+    result = feature.calculate(pd.DataFrame({"customer_mindbox_id": range(1, 16)}), select)
+
+    assert sizes == [1, 2, 4, 8]
+    assert list(result["value"]) == list(range(1, 16))
+
+
+def test_manager_adaptive_matches_fixed_batches(tmp_path):
+    feature_file = tmp_path / "features.yaml"
+    feature_file.write_text(FEATURES_YAML, encoding="utf-8")
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 30))})
+
+    loader = MagicMock()
+    loader.db = FakeDatabase()
+    expected = FeatureManager(str(feature_file), loader).generate_features(customers)
+
+    path = tmp_path / "batch_sizes.json"
+    sizer = BatchSizer(str(path), target_seconds=1.0, min_size=1)
+    manager = FeatureManager(str(feature_file), loader, max_workers=3, batch_sizer=sizer)
+
+    pd.testing.assert_frame_equal(manager.generate_features(customers), expected)
+    learned = json.loads(path.read_text(encoding="utf-8"))
+    assert set(learned) == {"feature_a", "feature_b"}
+    assert learned["feature_a"]["batch_size"] > 2
+
+def test_fixed_query_cost_grows_batch_instead_of_shrinking():
+    sizer = BatchSizer(target_seconds=1.0, min_size=100)
+    size = 1000
+    for _ in range(6):
+        sizer.observe("f", size, 3.0 + size * 0.0001, 10)
+        size = sizer.batch_size("f", 1000)
+    assert size > 1000
\ No newline at end of file
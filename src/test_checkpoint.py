@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock
+from sqlalchemy.exc import DBAPIError, OperationalError, ProgrammingError
+from checkpoint import Checkpoint, RetryPolicy, is_transient
+from feature import Feature, FeatureBatchError
+from feature_manager import FeatureManager
+from test_feature_manager import FEATURES_YAML, FakeDatabase
+
+
+class RecordingDatabase(FakeDatabase):
+    def __init__(self, fail_on=None):
+        super().__init__(fail_on)
+        self.queries = []
+
+    def select(self, query):
+        self.queries.append(query)
+        return super().select(query)
+
+
+def test_is_transient():
+    deadlock = Exception("[40001] [SQL Server]Transaction (Process ID 52) was deadlocked (1205) (SQLExecDirectW)")
+    assert is_transient(OperationalError("SELECT 1", {}, Exception("HYT00")))
+    assert is_transient(DBAPIError("SELECT 1", {}, deadlock))
+    assert is_transient(TimeoutError())
+    assert not is_transient(ProgrammingError("SELECT 1", {}, Exception("[42000] Incorrect syntax (102)")))
+    assert not is_transient(ValueError("bad value"))
+
+
+def test_retry_delay_is_bounded():
+    policy = RetryPolicy(attempts=3, base_delay=1.0, max_delay=4.0)
+    assert 0.5 <= policy.delay(1) <= 1.0
+    assert 2.0 <= policy.delay(5) <= 4.0
+    assert policy.should_retry(TimeoutError(), 2)
+    assert not policy.should_retry(TimeoutError(), 3)
+
+
+def test_feature_retries_transient_errors():
+    select = MagicMock(side_effect=[TimeoutError(), TimeoutError(), pd.DataFrame({"customer_mindbox_id": [1]})])
+    feature = Feature("f", "SELECT * FROM t WHERE customer_mindbox_id IN ({values})")
+    feature.retry = RetryPolicy(attempts=3, base_delay=0)
+
+    result = feature.calculate(pd.DataFrame({"customer_mindbox_id": [1]}), select)
+
+    assert select.call_count == 3
+    assert list(result["customer_mindbox_id"]) == [1]
+
+
+def test_feature_does_not_retry_permanent_errors():
+    select = MagicMock(side_effect=ValueError("bad query"))
+    feature = Feature("f", "SELECT * FROM t WHERE customer_mindbox_id IN ({values})")
+    feature.retry = RetryPolicy(attempts=3, base_delay=0)
+
+    with pytest.raises(FeatureBatchError):
+        feature.calculate(pd.DataFrame({"customer_mindbox_id": [1]}), select)
+    assert select.call_count == 1
+
+
+def test_split_batches_skips_done_ranges():
+    feature = Feature("f", "SELECT {values}", batch_size=2)
+    customers = pd.DataFrame({"customer_mindbox_id": range(8)})
+
+    batches = list(feature.split_batches(customers, done=[(2, 5)]))
+
+    assert [(start, list(batch["customer_mindbox_id"])) for start, batch in batches] == [
+        (0, [0, 1]), (5, [5, 6]), (7, [7])
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_rerun_computes_only_missing_batches(tmp_path, max_workers):
+    feature_file = tmp_path / "features.yaml"
+    feature_file.write_text(FEATURES_YAML, encoding="utf-8")
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+    checkpoint = Checkpoint(str(tmp_path / "checkpoints"))
+
+    loader = MagicMock()
+    loader.db = RecordingDatabase()
+    expected = FeatureManager(str(feature_file), loader).generate_features(customers)
+
+    loader.db = RecordingDatabase(fail_on=8)
+    with pytest.raises(FeatureBatchError):
+        FeatureManager(str(feature_file), loader, max_workers=max_workers, checkpoint=checkpoint).generate_features(customers)
+    failed_queries = set(loader.db.queries)
+
+    loader.db = RecordingDatabase()
+    result = FeatureManager(str(feature_file), loader, max_workers=max_workers,
+                            checkpoint=checkpoint).generate_features(customers)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert any("b FROM" in query and "8" in query.split("IN (")[1] for query in loader.db.queries)
+    # Успешные батчи первого запуска не повторяются
+    assert len(loader.db.queries) < 8
+    assert not any(query in failed_queries and "a FROM" in query for query in loader.db.queries)
+    assert not list((tmp_path / "checkpoints").iterdir())
\ No newline at end of file
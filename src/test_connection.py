@@ -1,7 +1,18 @@
+import time
+import sqlite3
+import threading
 import pytest
 import pandas as pd
 from unittest.mock import patch, MagicMock
-from connection import DatabaseConnection
+from sqlalchemy import create_engine, inspect
+from connection import DatabaseConnection, EngineRegistry, engine_registry
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    engine_registry.reset()
+    yield
+    engine_registry.reset()
+
 
 @pytest.fixture
 def mock_env(monkeypatch):
@@ -9,8 +20,9 @@ def mock_env(monkeypatch):
     monkeypatch.setenv("DB_NAME", "test_database")
 
 
+@patch("connection.instrument_connects")
 @patch("connection.create_engine")
-def test_init_creates_engine(mock_create_engine, mock_env):
+def test_init_creates_engine(mock_create_engine, mock_instrument_connects, mock_env):
     db = DatabaseConnection()
 
     mock_create_engine.assert_called_once()
@@ -34,4 +46,104 @@ def test_select_executes_sql_query(mock_read_sql, mock_env):
     result = db.select(query)
 
     mock_read_sql.assert_called_once_with(query, db.engine)
-    pd.testing.assert_frame_equal(result, pd.DataFrame({"col": [1, 2, 3]}))
\ No newline at end of file
+    pd.testing.assert_frame_equal(result, pd.DataFrame({"col": [1, 2, 3]}))
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    pd.DataFrame({
+        "customer_mindbox_id": [1, 2, 3, 4],
+        "price": [10, 20, 30, 40]
+    }).to_sql("orders", engine, index=False)
+    return DatabaseConnection(engine=engine)
+
+
+def test_ship_ids_loads_ids_into_table(sqlite_db):
+    with sqlite_db.ship_ids([3, 1, 3]) as id_query:
+        result = sqlite_db.select(
+            f"SELECT customer_mindbox_id, price FROM orders WHERE customer_mindbox_id IN ({id_query}) ORDER BY 1"
+        )
+        table = id_query.split()[-1]
+
+    assert list(result["customer_mindbox_id"]) == [1, 3]
+    assert list(result["price"]) == [10, 30]
+    assert table not in inspect(sqlite_db.engine).get_table_names()
+
+
+def test_select_chunks_streams_with_dtypes(sqlite_db):
+    chunks = list(sqlite_db.select_chunks("SELECT * FROM orders", chunksize=3, dtypes={"price": "float32"}))
+
+    assert [len(chunk) for chunk in chunks] == [3, 1]
+    assert all(chunk["price"].dtype == "float32" for chunk in chunks)
+
+
+def test_select_collects_chunks_with_dtypes(sqlite_db):
+    result = sqlite_db.select("SELECT * FROM orders", dtypes={"customer_mindbox_id": "int64", "price": "int32"},
+                              chunksize=3)
+
+    assert result["price"].dtype == "int32"
+    assert list(result["price"]) == [10, 20, 30, 40]
+
+
+
+def test_registry_shares_engine_per_url(tmp_path):
+    registry = EngineRegistry()
+    url = f"sqlite:///{tmp_path / 'shared.db'}"
+
+    assert registry.get(url) is registry.get(url)
+
+    registry.reset()
+
+
+def test_registry_tracks_pool_waits_and_connects(tmp_path):
+    registry = EngineRegistry()
+    engine = registry.get(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0)
+
+    first = engine.connect()
+    waiter = threading.Thread(target=lambda: engine.connect().close())
+    waiter.start()
+    time.sleep(0.1)
+    first.close()
+    waiter.join()
+
+    stats = next(iter(registry.stats().values()))
+    assert stats["checkouts"] == 2
+    assert stats["waits"] == 1
+    assert stats["connects"] == 1
+    assert stats["checked_out"] == 0
+    registry.reset()
+
+
+def test_registry_after_fork_replaces_pool(tmp_path):
+    registry = EngineRegistry()
+    engine = registry.get(f"sqlite:///{tmp_path / 'fork.db'}")
+    engine.connect().close()
+    pool = engine.pool
+
+    registry.after_fork()
+
+    assert engine.pool is not pool
+    assert engine.pool.stats is pool.stats
+    registry.reset()
+
+
+class TimeoutConnection(sqlite3.Connection):
+    timeout = 0
+
+
+def test_query_timeout_survives_reconnect(tmp_path):
+    registry = EngineRegistry()
+    engine = registry.get(f"sqlite:///{tmp_path / 'timeout.db'}", query_timeout=30,
+                          connect_args={"factory": TimeoutConnection})
+
+    with engine.connect() as connection:
+        first = connection.connection.dbapi_connection
+        assert first.timeout == 30
+        connection.invalidate()
+    with engine.connect() as connection:
+        second = connection.connection.dbapi_connection
+        assert second is not first
+        assert second.timeout == 30
+
+    assert next(iter(registry.stats().values()))["connects"] == 2
+    registry.reset()
\ No newline at end of file
@@ -18,4 +18,29 @@ def test_load_data_returns_dataframe(mock_select):
     result = loader.load_data(query)
 
     mock_select.assert_called_once_with(query)
-    pd.testing.assert_frame_equal(result, mock_df)
\ No newline at end of file
+    pd.testing.assert_frame_equal(result, mock_df)
+
+@patch.object(DatabaseConnection, 'select')
+def test_load_data_passes_dtypes(mock_select):
+    loader = DataLoader()
+    loader.load_data("SELECT * FROM table", dtypes={"shop": "category"}, chunksize=10)
+
+    mock_select.assert_called_once_with("SELECT * FROM table", dtypes={"shop": "category"}, chunksize=10)
+
+
+@patch.object(DatabaseConnection, 'select_chunks')
+def test_iter_data_streams_chunks(mock_select_chunks):
+    mock_select_chunks.return_value = iter([pd.DataFrame({"col": [1]}), pd.DataFrame({"col": [2]})])
+
+    loader = DataLoader()
+    chunks = list(loader.iter_data("SELECT * FROM table", chunksize=1))
+
+    assert len(chunks) == 2
+    mock_select_chunks.assert_called_once_with("SELECT * FROM table", 1, None)
+
+
+def test_dataloader_uses_given_connection():
+    db = MagicMock(spec=DatabaseConnection)
+    loader = DataLoader(db)
+
+    assert loader.db is db
\ No newline at end of file
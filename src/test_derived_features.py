@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from derived_features import DerivedFeatures
+
+
+@pytest.fixture
+def snapshot_df():
+    return pd.DataFrame({
+        "customer_mindbox_id": [101, 102, 103, 104],
+        "days_since_last_purchase": [10, 5, np.nan, np.nan],
+        "days_since_last_redemption": [15, 3, 8, np.nan],
+        "purchase_sum_restore": [100, 200, 150, 10],
+        "bonus_write_offs": [0.0, 20.0, np.nan, -1.0],
+        "purchase_count": [5, 10, 2, 1],
+        "redemption_count": [1, 2, 0, 0],
+    })
+
+
+def legacy_generate_and_clean(df, columns_to_drop):
+    df = df.copy()
+    df["days_since_last_activity"] = df[["days_since_last_purchase", "days_since_last_redemption"]].min(axis=1)
+    df["purchase_value_per_bonus"] = df["purchase_sum_restore"] / (df["bonus_write_offs"] + 1)
+    df["target"] = (df["bonus_write_offs"].fillna(0) > 0).astype(int)
+    df["purchase_redemption_ratio"] = df["purchase_count"] / (df["redemption_count"] + 1)
+    df = df.drop(columns=columns_to_drop, errors="ignore")
+    df = df.set_index("customer_mindbox_id", drop=False)
+    return df.replace([np.inf, -np.inf], np.nan).fillna(0)
+
+
+@pytest.mark.parametrize("drop", [[], ["purchase_sum_restore", "days_since_last_redemption"]])
+def test_transform_matches_generate_and_clean(snapshot_df, drop):
+    derived = DerivedFeatures.from_yaml()
+    expected = legacy_generate_and_clean(snapshot_df, drop)
+    pd.testing.assert_frame_equal(derived.transform(snapshot_df, drop=drop), expected)
+
+
+def test_dropped_features_are_not_computed(snapshot_df):
+    derived = DerivedFeatures.from_yaml()
+    plan = derived.plan(snapshot_df.columns, drop=["purchase_redemption_ratio", "target"])
+    assert [feature.name for feature in plan] == ["days_since_last_activity", "purchase_value_per_bonus"]
+    plan = derived.plan(["customer_mindbox_id", "purchase_count"])
+    assert plan == []
+
+
+def test_dependencies_are_resolved_and_kept():
+    derived = DerivedFeatures([
+        {"name": "ratio_log", "expression": "log1p(ratio)"},
+        {"name": "ratio", "expression": "a / (b + 1)"},
+    ])
+    assert derived.order == ["ratio", "ratio_log"]
+    df = pd.DataFrame({"customer_mindbox_id": [1, 2], "a": [3, 8], "b": [0, 1]})
+    result = derived.transform(df, drop=["ratio"])
+    assert list(result.columns) == ["customer_mindbox_id", "a", "b", "ratio_log"]
+    np.testing.assert_allclose(result["ratio_log"], np.log1p([3.0, 4.0]))
+
+
+def test_invalid_definitions():
+    with pytest.raises(ValueError, match="Циклическая"):
+        DerivedFeatures([{"name": "x", "expression": "y + 1"}, {"name": "y", "expression": "x * 2"}])
+    with pytest.raises(ValueError, match="Недопустимое"):
+        DerivedFeatures([{"name": "x", "expression": "__import__('os')"}])
+
+
+def test_compact_inputs_give_float32_features(snapshot_df):
+    df = snapshot_df.astype({"days_since_last_purchase": "float32", "days_since_last_redemption": "float32",
+                             "purchase_count": "int16", "redemption_count": "int16"})
+
+    result = DerivedFeatures.from_yaml().transform(df)
+
+    assert result["days_since_last_activity"].dtype == np.float32
+    assert result["purchase_redemption_ratio"].dtype == np.float32
+    assert result["purchase_value_per_bonus"].dtype == np.float64
+    assert result["target"].dtype == np.int64
\ No newline at end of file
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+from evaluation import StreamingEvaluator
+from model import Model
+
+
+@pytest.fixture
+def scores():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, size=5000)
+    proba = np.clip(rng.normal(0.35 + 0.3 * y, 0.2), 0, 1)
+    return y, proba
+
+
+def test_chunked_metrics_match_sklearn(scores):
+    y, proba = scores
+    evaluator = StreamingEvaluator()
+    for start in range(0, len(y), 700):
+        evaluator.update(y[start:start + 700], proba[start:start + 700])
+
+    metrics = evaluator.metrics()
+    predicted = (proba > 0.5).astype(int)
+    assert metrics["ROC AUC"] == pytest.approx(roc_auc_score(y, proba), abs=1e-4)
+    assert metrics["F1-score"] == pytest.approx(f1_score(y, predicted))
+    assert metrics["Precision"] == pytest.approx(precision_score(y, predicted))
+    assert metrics["Recall"] == pytest.approx(recall_score(y, predicted))
+
+
+def test_threshold_table(scores):
+    y, proba = scores
+    evaluator = StreamingEvaluator()
+    evaluator.update(y, proba)
+    table = evaluator.threshold_table([0.0, 0.3, 0.7])
+
+    for _, row in table.iterrows():
+        predicted = proba > row["threshold"]
+        assert row["tp"] == (predicted & (y == 1)).sum()
+        assert row["fp"] == (predicted & (y == 0)).sum()
+        assert row["tp"] + row["fp"] + row["fn"] + row["tn"] == len(y)
+    assert table["recall"].is_monotonic_decreasing
+    assert len(evaluator.threshold_table()) == 100
+
+
+def test_model_evaluate_stream_matches_evaluate():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.normal(size=(600, 3)), columns=["a", "b", "c"])
+    y = pd.Series((X["a"] + rng.normal(scale=0.7, size=len(X)) > 0).astype(int))
+    model = Model({"n_estimators": 20})
+    model.train(X, y)
+
+    chunks = ((X.iloc[start:start + 100], y.iloc[start:start + 100]) for start in range(0, len(X), 100))
+    streamed = model.evaluate_stream(chunks).metrics()
+    expected = model.evaluate(X, y)
+    assert streamed["ROC AUC"] == pytest.approx(expected["ROC AUC"], abs=1e-3)
+    for key in ["F1-score", "Precision", "Recall"]:
+        assert streamed[key] == pytest.approx(expected[key])
\ No newline at end of file
@@ -1,7 +1,7 @@
 import pytest
 import pandas as pd
 from unittest.mock import MagicMock
-from feature import Feature
+from feature import Feature, FeatureBatchError
 
 
 @pytest.fixture
@@ -60,4 +60,20 @@ def test_purge_deletes_df(sample_customers, mock_select_func):
 
     feature.purge()
 
-    assert not hasattr(feature, "df")
\ No newline at end of file
+    assert not hasattr(feature, "df")
+
+def test_calculate_reports_feature_and_batch_on_error(sample_customers):
+    feature = Feature("test_feature", "SELECT * FROM features WHERE customer_mindbox_id IN ({values})", batch_size=2)
+
+    def failing_select(query):
+        if "3, 4" in query:
+            raise RuntimeError("deadlock victim")
+        return pd.DataFrame({"customer_mindbox_id": [1, 2]})
+
+    with pytest.raises(FeatureBatchError) as exc_info:
+        feature.calculate(sample_customers, failing_select)
+
+    assert exc_info.value.feature_name == "test_feature"
+    assert exc_info.value.batch_no == 1
+    assert (exc_info.value.first_id, exc_info.value.last_id) == (3, 4)
+    assert isinstance(exc_info.value.__cause__, RuntimeError)
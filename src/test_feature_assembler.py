@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature_assembler import FeatureAssembler
+
+
+@pytest.fixture
+def feature_results():
+    return [
+        pd.DataFrame({"customer_mindbox_id": [3, 5, 7], "purchase_count": [1, 2, 3]}),
+        pd.DataFrame({"customer_mindbox_id": [9, 1, 3, 5], "bonuses_balance": [1.5, 2.0, np.nan, 4.0]}),
+        pd.DataFrame({"customer_mindbox_id": [5], "is_active": [True]}),
+    ]
+
+
+def merge_chain(customers, results):
+    for df in results:
+        customers = customers.merge(df, on="customer_mindbox_id", how="left")
+    return customers
+
+
+def test_build_matches_merge_chain(feature_results):
+    customers = pd.DataFrame({"customer_mindbox_id": [5, 3, 9, 1], "segment": ["a", "b", "a", "c"]})
+
+    assembler = FeatureAssembler(customers)
+    for df in feature_results:
+        assembler.add(df)
+
+    pd.testing.assert_frame_equal(assembler.build(), merge_chain(customers, feature_results))
+
+
+def test_build_with_duplicate_customers(feature_results):
+    customers = pd.DataFrame({"customer_mindbox_id": [5, 3, 5, 2]})
+
+    assembler = FeatureAssembler(customers)
+    for df in feature_results:
+        assembler.add(df)
+
+    pd.testing.assert_frame_equal(assembler.build(), merge_chain(customers, feature_results))
+
+
+def test_add_rejects_duplicate_feature_rows():
+    assembler = FeatureAssembler(pd.DataFrame({"customer_mindbox_id": [1, 2]}))
+
+    with pytest.raises(ValueError):
+        assembler.add(pd.DataFrame({"customer_mindbox_id": [1, 1], "value": [1, 2]}), "value")
+
+
+def test_compact_integers_with_missing_become_float32():
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3]})
+    assembler = FeatureAssembler(customers)
+    assembler.add(pd.DataFrame({"customer_mindbox_id": [1, 2], "count": np.array([4, 5], dtype="int16")}))
+    assembler.add(pd.DataFrame({"customer_mindbox_id": [1, 2, 3], "days": pd.array([1, None, 3], dtype="Int32")}))
+    assembler.add(pd.DataFrame({"customer_mindbox_id": [3, 2, 1], "full": np.array([1, 2, 3], dtype="int32")}))
+
+    result = assembler.build()
+
+    assert result["count"].dtype == np.float32 and np.isnan(result["count"].iloc[2])
+    assert result["days"].dtype == np.float32 and np.isnan(result["days"].iloc[1])
+    assert result["full"].dtype == np.int32
+    assert result["customer_mindbox_id"].dtype == np.int64
+
+
+def test_spilled_columns_are_memory_mapped(feature_results, tmp_path):
+    customers = pd.DataFrame({"customer_mindbox_id": [5, 3, 9, 1]})
+
+    assembler = FeatureAssembler(customers, spill_dir=str(tmp_path))
+    for df in feature_results:
+        assembler.add(df)
+    result = assembler.build()
+
+    pd.testing.assert_frame_equal(result, merge_chain(customers, feature_results))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["0.npy", "1.npy"]
+    assert isinstance(assembler.columns["bonuses_balance"].base, np.memmap)
\ No newline at end of file
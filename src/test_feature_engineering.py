@@ -24,6 +24,14 @@ def test_clean_data(sample_df):
     assert not cleaned_df.isin([np.nan, np.inf, -np.inf]).any().any()
     assert "bonuses_spisanie" not in cleaned_df.columns
 
+def test_generate_features_leaves_input_untouched(sample_df):
+    original = sample_df.copy()
+    result = FeatureEngineering(sample_df).generate_features()
+
+    pd.testing.assert_frame_equal(sample_df, original)
+    assert list(result.columns[:len(original.columns)]) == list(original.columns)
+    assert len(result.columns) > len(original.columns)
+
 @patch("matplotlib.pyplot.savefig")
 @patch("matplotlib.pyplot.show")
 def test_plot_correlation_matrix(mock_show, mock_savefig, sample_df, tmp_path):
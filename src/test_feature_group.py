@@ -0,0 +1,97 @@
+import sqlite3
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock
+from feature_group import FeatureGroup
+from feature_manager import FeatureManager
+
+BASE_QUERY = """
+SELECT customer_mindbox_id,
+    {columns}
+FROM orders
+WHERE customer_mindbox_id IN ({values})
+GROUP BY customer_mindbox_id
+"""
+
+FEATURES_YAML = """
+groups:
+  - name: purchases
+    base_query: |
+      SELECT customer_mindbox_id,
+          {columns}
+      FROM orders
+      WHERE customer_mindbox_id IN ({values})
+      GROUP BY customer_mindbox_id
+    batch_size: 2
+features:
+  - name: purchase_count
+    group: purchases
+    expression: COUNT(*)
+  - name: max_price
+    calculate_query: SELECT customer_mindbox_id, MAX(price) AS max_price FROM orders WHERE customer_mindbox_id IN ({values}) GROUP BY customer_mindbox_id
+    batch_size: 2
+  - name: purchase_sum
+    group: purchases
+    expression: SUM(price)
+"""
+
+
+class CountingDatabase:
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        pd.DataFrame({
+            "customer_mindbox_id": [1, 1, 2, 3, 3, 3],
+            "price": [10, 20, 5, 1, 2, 3]
+        }).to_sql("orders", self.connection, index=False)
+        self.queries = []
+
+    def select(self, query):
+        self.queries.append(query)
+        return pd.read_sql(query, self.connection)
+
+
+@pytest.fixture
+def feature_file(tmp_path):
+    path = tmp_path / "features.yaml"
+    path.write_text(FEATURES_YAML, encoding="utf-8")
+    return str(path)
+
+
+def test_render_keeps_values_placeholder():
+    group = FeatureGroup("purchases", BASE_QUERY)
+
+    query = group.render({"purchase_count": "COUNT(*)", "purchase_sum": "SUM(price)"})
+
+    assert "COUNT(*) AS purchase_count,\n    SUM(price) AS purchase_sum" in query
+    assert "{values}" in query
+
+
+def test_member_and_fused_features_keep_names():
+    group = FeatureGroup("purchases", BASE_QUERY, batch_size=500)
+
+    member = group.member("purchase_count", "COUNT(*)")
+    fused = group.fuse({"purchase_count": "COUNT(*)", "purchase_sum": "SUM(price)"})
+
+    assert member.name == "purchase_count"
+    assert member.batch_size == 500
+    assert "SUM(price)" not in member.calculate_query
+    assert fused.name == "purchases"
+
+
+def test_fused_groups_match_separate_queries(feature_file):
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3, 4]})
+
+    separate_loader = MagicMock()
+    separate_loader.db = CountingDatabase()
+    expected = FeatureManager(feature_file, separate_loader, fuse=False).generate_features(customers)
+
+    fused_loader = MagicMock()
+    fused_loader.db = CountingDatabase()
+    fm = FeatureManager(feature_file, fused_loader)
+    result = fm.generate_features(customers)
+
+    assert [feature.name for feature in fm.features] == ["purchase_count", "max_price", "purchase_sum"]
+    assert list(result.columns) == ["customer_mindbox_id", "purchase_count", "max_price", "purchase_sum"]
+    pd.testing.assert_frame_equal(result, expected)
+    assert len(fused_loader.db.queries) == 4
+    assert len(separate_loader.db.queries) == 6
@@ -1,7 +1,16 @@
+import threading
+import time
 import pytest
+import numpy as np
 import pandas as pd
+from pathlib import Path
 from unittest.mock import MagicMock, patch, mock_open
-from feature_manager import FeatureManager
+from feature_manager import FeatureManager, MemoryBudgetExceeded
+from frame_utils import cast_frame
+from instrumentation import frame_bytes
+from feature import FeatureBatchError
+from connection import DatabaseConnection
+from sqlalchemy import create_engine
 
 @pytest.fixture
 def dummy_customers():
@@ -49,4 +58,164 @@ def test_generate_features_merges_data(mock_yaml, mock_file, mock_feature_class,
     pd.Series([10, 20], name="test_column")
     )
     mock_feature.read.assert_called_once()
-    mock_feature.purge.assert_called_once()
\ No newline at end of file
+    mock_feature.purge.assert_called_once()
+
+FEATURES_YAML = """
+features:
+  - name: feature_a
+    calculate_query: SELECT a FROM t WHERE customer_mindbox_id IN ({values})
+    batch_size: 2
+  - name: feature_b
+    calculate_query: SELECT b FROM t WHERE customer_mindbox_id IN ({values})
+    batch_size: 3
+"""
+
+
+class FakeDatabase:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+        self.max_total = 0
+
+    def select(self, query):
+        column = query.split()[1]
+        ids = [int(id_) for id_ in query.split("IN (")[1].split(")")[0].split(", ")]
+        with self.lock:
+            self.active[column] = self.active.get(column, 0) + 1
+            self.max_active[column] = max(self.max_active.get(column, 0), self.active[column])
+            self.max_total = max(self.max_total, sum(self.active.values()))
+        try:
+            time.sleep(0.01 * (len(ids) % 3 + 1))
+            if self.fail_on is not None and self.fail_on in ids and column == "b":
+                raise RuntimeError("timeout")
+            return pd.DataFrame({"customer_mindbox_id": ids, column: [id_ * 10 for id_ in ids]})
+        finally:
+            with self.lock:
+                self.active[column] -= 1
+
+
+@pytest.fixture
+def feature_file(tmp_path):
+    path = tmp_path / "features.yaml"
+    path.write_text(FEATURES_YAML, encoding="utf-8")
+    return str(path)
+
+
+def test_concurrent_generation_matches_sequential(feature_file):
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+
+    sequential_loader = MagicMock()
+    sequential_loader.db = FakeDatabase()
+    expected = FeatureManager(feature_file, sequential_loader).generate_features(customers)
+
+    concurrent_loader = MagicMock()
+    concurrent_loader.db = FakeDatabase()
+    fm = FeatureManager(feature_file, concurrent_loader, max_workers=4, max_workers_per_feature=2)
+    result = fm.generate_features(customers)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert concurrent_loader.db.max_total <= 4
+    assert all(count <= 2 for count in concurrent_loader.db.max_active.values())
+
+
+def test_concurrent_generation_reports_failed_batch(feature_file):
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+    data_loader = MagicMock()
+    data_loader.db = FakeDatabase(fail_on=8)
+
+    fm = FeatureManager(feature_file, data_loader, max_workers=3)
+
+    with pytest.raises(FeatureBatchError) as exc_info:
+        fm.generate_features(customers)
+
+    assert exc_info.value.feature_name == "feature_b"
+    assert exc_info.value.batch_no == 2
+
+
+def test_ship_ids_runs_one_query_per_feature(tmp_path):
+    feature_file = tmp_path / "features.yaml"
+    feature_file.write_text(FEATURES_YAML.replace("SELECT a FROM", "SELECT customer_mindbox_id, a FROM")
+                            .replace("SELECT b FROM", "SELECT customer_mindbox_id, b FROM"), encoding="utf-8")
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    pd.DataFrame({
+        "customer_mindbox_id": [1, 2, 3, 5],
+        "a": [10, 20, 30, 50],
+        "b": [1, 2, 3, 5]
+    }).to_sql("t", engine, index=False)
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3, 4, 5, 6]})
+
+    data_loader = MagicMock()
+    data_loader.db = DatabaseConnection(engine=engine)
+    batched = FeatureManager(str(feature_file), data_loader).generate_features(customers)
+
+    with patch.object(DatabaseConnection, "select", autospec=True, side_effect=DatabaseConnection.select) as select:
+        shipped = FeatureManager(str(feature_file), data_loader, ship_ids=True).generate_features(customers)
+
+    pd.testing.assert_frame_equal(shipped, batched)
+    assert select.call_count == 2
+
+
+class TypedDatabase(FakeDatabase):
+    def select(self, query, dtypes=None):
+        return cast_frame(super().select(query), dtypes)
+
+
+def typed_feature_file(tmp_path):
+    path = tmp_path / "features.yaml"
+    path.write_text(FEATURES_YAML.replace("batch_size: 2", "batch_size: 2\n    dtypes:\n      a: int16")
+                    .replace("batch_size: 3", "batch_size: 3\n    dtypes:\n      b: float32"), encoding="utf-8")
+    return str(path)
+
+
+def test_memory_budget_fails_before_queries(tmp_path):
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+    data_loader = MagicMock()
+    data_loader.db = TypedDatabase()
+    fm = FeatureManager(typed_feature_file(tmp_path), data_loader, memory_budget=100)
+
+    # Клиенты + по 4 байта на int16 (float32 при пропусках) и float32
+    assert fm.estimate_bytes(customers) == frame_bytes(customers) + 11 * 8
+    with pytest.raises(MemoryBudgetExceeded):
+        fm.generate_features(customers)
+    assert data_loader.db.max_total == 0
+
+
+def test_memory_budget_spills_to_disk(tmp_path):
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+    data_loader = MagicMock()
+    data_loader.db = TypedDatabase()
+    expected = FeatureManager(typed_feature_file(tmp_path), data_loader).generate_features(customers)
+
+    fm = FeatureManager(typed_feature_file(tmp_path), data_loader, memory_budget=100,
+                        spill_dir=str(tmp_path / "spill"))
+    result = fm.generate_features(customers)
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert result["a"].dtype == np.int16 and result["b"].dtype == np.float32
+    assert len(list((tmp_path / "spill").glob("*/*.npy"))) == 2
+
+
+def test_spill_removes_only_own_directories(tmp_path):
+    customers = pd.DataFrame({"customer_mindbox_id": list(range(1, 12))})
+    spill_dir = tmp_path / "shared"
+    (spill_dir / "project").mkdir(parents=True)
+    (spill_dir / "project" / "data.csv").write_text("keep", encoding="utf-8")
+    (spill_dir / "feature_spill_concurrent").mkdir()
+    data_loader = MagicMock()
+    data_loader.db = TypedDatabase()
+    fm = FeatureManager(typed_feature_file(tmp_path), data_loader, memory_budget=100, spill_dir=str(spill_dir))
+
+    fm.generate_features(customers)
+    first_run = fm.spill_runs[0]
+    fm.generate_features(customers)
+    assert not Path(first_run).exists() and len(fm.spill_runs) == 1
+
+    data_loader.db = TypedDatabase(fail_on=8)
+    with pytest.raises(FeatureBatchError):
+        fm.generate_features(customers)
+
+    assert fm.spill_runs == []
+    assert sorted(path.name for path in spill_dir.iterdir()) == ["feature_spill_concurrent", "project"]
+    assert (spill_dir / "project" / "data.csv").read_text(encoding="utf-8") == "keep"
\ No newline at end of file
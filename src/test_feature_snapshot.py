@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from feature_snapshot import FeatureSnapshot, SnapshotProvider
+
+
+@pytest.fixture
+def snapshot_csv(tmp_path):
+    df = pd.DataFrame({
+        "customer_mindbox_id": [30, 10, 20, 50, 40],
+        "purchase_count_restore": [3, 1, 2, 5, 4],
+        "bonuses_balance": [3.5, np.nan, 2.5, 5.5, 4.5],
+    })
+    path = tmp_path / "data.csv"
+    df.to_csv(path)
+    return path
+
+
+def test_lookup_matches_isin_filter(snapshot_csv):
+    all_customers = pd.read_csv(snapshot_csv).iloc[:, 1:]
+    user_ids = pd.Series([40, 10, 99, 10, 30])
+
+    result = FeatureSnapshot.load(str(snapshot_csv)).lookup(user_ids)
+
+    expected = all_customers[all_customers["customer_mindbox_id"].isin(user_ids)]
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False)
+
+
+def test_load_reuses_columnar_cache(snapshot_csv):
+    first = FeatureSnapshot.load(str(snapshot_csv))
+    second = FeatureSnapshot.load(str(snapshot_csv))
+
+    assert first.version == second.version
+    assert isinstance(second.columns["purchase_count_restore"], np.memmap)
+    assert len(second) == 5
+
+
+def test_provider_swaps_snapshot_when_file_changes(snapshot_csv):
+    provider = SnapshotProvider(str(snapshot_csv), check_interval=0)
+    old = provider.get()
+
+    pd.DataFrame({"customer_mindbox_id": [60], "purchase_count_restore": [6], "bonuses_balance": [6.5]}).to_csv(snapshot_csv)
+    os.utime(snapshot_csv, ns=(10 ** 18, 10 ** 18))
+    new = provider.get()
+
+    assert new is not old
+    assert list(new.lookup([60])["purchase_count_restore"]) == [6]
+    assert list(old.lookup([10])["purchase_count_restore"]) == [1]
@@ -0,0 +1,115 @@
+import json
+import pandas as pd
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine, text
+from connection import DatabaseConnection
+from feature_manager import FeatureManager
+from feature_store import FeatureStore, sql_datetime
+
+FEATURES_YAML = """
+sources:
+  - name: orders
+    watermark_query: SELECT MAX(action_datetime) AS watermark FROM orders
+    changes_query: SELECT DISTINCT customer_mindbox_id FROM orders WHERE action_datetime > '{watermark}'
+features:
+  - name: purchase_count
+    calculate_query: |
+      SELECT customer_mindbox_id, COUNT(*) AS purchase_count
+      FROM orders WHERE customer_mindbox_id IN ({values}) GROUP BY customer_mindbox_id
+  - name: days_since_last_purchase
+    calculate_query: |
+      SELECT customer_mindbox_id,
+             CAST(julianday('2025-01-10') - julianday(MAX(action_datetime)) AS INTEGER) AS days_since_last_purchase
+      FROM orders WHERE customer_mindbox_id IN ({values}) GROUP BY customer_mindbox_id
+    drift: 1
+"""
+
+
+@pytest.fixture
+def store(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    pd.DataFrame({
+        "customer_mindbox_id": [1, 1, 2, 3],
+        "action_datetime": ["2025-01-01 10:00:00", "2025-01-05 10:00:00", "2025-01-02 10:00:00", "2025-01-03 10:00:00"]
+    }).to_sql("orders", engine, index=False)
+    feature_file = tmp_path / "features.yaml"
+    feature_file.write_text(FEATURES_YAML, encoding="utf-8")
+
+    data_loader = MagicMock()
+    data_loader.db = DatabaseConnection(engine=engine)
+    return FeatureStore(str(tmp_path / "store"), FeatureManager(str(feature_file), data_loader))
+
+
+def test_first_refresh_computes_all_and_persists(store):
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3]})
+
+    result = store.refresh(customers)
+
+    assert list(result["purchase_count"]) == [2, 1, 1]
+    pd.testing.assert_frame_equal(store.load(), result)
+    assert store.read_state()["watermarks"] == {"orders": "2025-01-05T10:00:00.000"}
+
+
+def test_refresh_recomputes_only_changed_customers(store):
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3]})
+    store.refresh(customers)
+    with store.feature_manager.data_loader.db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO orders VALUES (2, '2025-01-09 10:00:00')"))
+
+    with patch.object(DatabaseConnection, "select", autospec=True, side_effect=DatabaseConnection.select) as select:
+        result = store.refresh(pd.DataFrame({"customer_mindbox_id": [1, 2, 3, 4]}))
+
+    feature_queries = [call.args[1] for call in select.call_args_list if "IN (" in call.args[1]]
+    assert all("IN (2, 4)" in query for query in feature_queries)
+    assert list(result["customer_mindbox_id"]) == [1, 2, 3, 4]
+    assert list(result["purchase_count"].fillna(0)) == [2, 2, 1, 0]
+    assert result.loc[1, "days_since_last_purchase"] == 0
+
+
+def test_refresh_applies_drift_to_unchanged_rows(store):
+    customers = pd.DataFrame({"customer_mindbox_id": [1, 2, 3]})
+    first = store.refresh(customers)
+    state = store.read_state()
+    state["refreshed_at"] = (datetime.now() - timedelta(days=2)).isoformat(sep=" ")
+    store.state_path.write_text(json.dumps(state), encoding="utf-8")
+
+    result = store.refresh(customers)
+
+    assert list(result["days_since_last_purchase"]) == list(first["days_since_last_purchase"] + 2)
+    assert list(result["purchase_count"]) == list(first["purchase_count"])
+
+
+def test_sql_datetime_is_unambiguous_iso_with_milliseconds():
+    assert sql_datetime("2025-01-05 10:00:00.123456") == "2025-01-05T10:00:00.123"
+    assert sql_datetime(datetime(2025, 3, 4, 5, 6, 7)) == "2025-03-04T05:06:07.000"
+    assert sql_datetime(pd.Timestamp("2025-03-04 05:06:07", tz="UTC")) == "2025-03-04T05:06:07.000"
+
+
+def test_changes_query_gets_iso_literals(store):
+    store.refresh(pd.DataFrame({"customer_mindbox_id": [1, 2, 3]}))
+    state = store.read_state()
+    assert "T" in state["refreshed_at"] and len(state["refreshed_at"].split(".")[1]) == 3
+
+    with patch.object(DatabaseConnection, "select", autospec=True, side_effect=DatabaseConnection.select) as select:
+        store.refresh(pd.DataFrame({"customer_mindbox_id": [1, 2, 3]}))
+
+    assert any("action_datetime > '2025-01-05T10:00:00.000'" in call.args[1] for call in select.call_args_list)
+
+
+def test_partial_refresh_keeps_other_customers(store):
+    first = store.refresh(pd.DataFrame({"customer_mindbox_id": [1, 2, 3]}))
+    with store.feature_manager.data_loader.db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO orders VALUES (3, '2025-01-09 10:00:00')"))
+
+    result = store.refresh(pd.DataFrame({"customer_mindbox_id": [1]}))
+
+    assert list(result["customer_mindbox_id"]) == [1]
+    stored = store.load().set_index("customer_mindbox_id")
+    # Клиент 2 не менялся и остается, клиент 3 изменился вне запуска — удаляется до следующего расчета
+    assert sorted(stored.index) == [1, 2]
+    assert stored.loc[2, "purchase_count"] == first.set_index("customer_mindbox_id").loc[2, "purchase_count"]
+
+    result = store.refresh(pd.DataFrame({"customer_mindbox_id": [1, 2, 3]}))
+    assert list(result["purchase_count"]) == [2, 1, 2]
\ No newline at end of file
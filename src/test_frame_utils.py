@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from frame_utils import cast_frame, concat_frames, float_dtype
+
+
+def test_cast_frame_downcasts_and_keeps_missing_integers():
+    df = pd.DataFrame({"count": [1.0, np.nan], "amount": [1.5, 2.5], "shop": ["a", "b"], "other": [1, 2]})
+
+    result = cast_frame(df, {"count": "int16", "amount": "float32", "shop": "category"})
+
+    assert str(result["count"].dtype) == "Int16"
+    assert result["amount"].dtype == "float32"
+    assert isinstance(result["shop"].dtype, pd.CategoricalDtype)
+    assert result["other"].dtype == "int64"
+
+
+def test_concat_frames_keeps_categoricals():
+    first = cast_frame(pd.DataFrame({"shop": ["a", "b"]}), {"shop": "category"})
+    second = cast_frame(pd.DataFrame({"shop": ["c", "a"]}), {"shop": "category"})
+
+    result = concat_frames([first, second])
+
+    assert isinstance(result["shop"].dtype, pd.CategoricalDtype)
+    assert list(result["shop"]) == ["a", "b", "c", "a"]
+    assert list(result.index) == [0, 1, 2, 3]
+
+
+def test_float_dtype_keeps_compact_types():
+    assert float_dtype(np.dtype("int16"), np.dtype("float32"), pd.Int32Dtype()) == np.float32
+    assert float_dtype(np.dtype("int32"), np.dtype("int64")) == np.float64
+    assert float_dtype(pd.CategoricalDtype()) == np.float64
\ No newline at end of file
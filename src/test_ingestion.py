@@ -0,0 +1,40 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from ingestion import IngestionError, read_user_ids, to_id_array
+
+
+@pytest.fixture
+def ids_frame():
+    return pd.DataFrame({"name": ["a", "b", "c", "d", "e"], "user_id": [364, "132", "oops", 364, 500.0]})
+
+
+def to_bytes(df, file_format):
+    output = io.BytesIO()
+    if file_format == "xlsx":
+        df.to_excel(output, index=False)
+    elif file_format == "csv":
+        df.to_csv(output, index=False)
+    else:
+        df.astype(str).to_parquet(output, index=False)
+    output.seek(0)
+    return output
+
+
+@pytest.mark.parametrize("file_format", ["xlsx", "csv", "parquet"])
+def test_reads_only_valid_unique_ids(ids_frame, file_format):
+    ids = read_user_ids(to_bytes(ids_frame, file_format), f"upload.{file_format}")
+    assert ids.dtype == np.int64
+    assert list(ids) == [364, 132, 500]
+
+
+@pytest.mark.parametrize("file_format", ["xlsx", "csv", "parquet"])
+def test_missing_column_raises(file_format):
+    file = to_bytes(pd.DataFrame({"wrong_column": [1, 2]}), file_format)
+    with pytest.raises(IngestionError, match="user_id"):
+        read_user_ids(file, f"upload.{file_format}")
+
+
+def test_to_id_array_drops_fractional_and_empty_values():
+    assert list(to_id_array([1, 2.5, None, "", "7", 1])) == [1, 7]
\ No newline at end of file
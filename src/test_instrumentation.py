@@ -0,0 +1,114 @@
+import json
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock
+from feature import Feature
+from instrumentation import Histogram, Metrics, NULL_SPAN, metrics
+
+
+def test_disabled_metrics_record_nothing():
+    registry = Metrics(enabled=False)
+    span = registry.span("feature_query", feature="f")
+    assert span is NULL_SPAN
+    with span as s:
+        s.add(rows=10)
+    registry.observe_request("score", "POST", 200, 0.1)
+    assert registry.report()["stages"] == []
+    assert "pipeline_stage_rows_total" not in registry.render_prometheus()
+
+
+def test_span_accumulates_counters_and_errors():
+    registry = Metrics(enabled=True)
+    with registry.span("feature_query", feature="f") as span:
+        span.add(rows=10, bytes=80)
+    with pytest.raises(ValueError):
+        with registry.span("feature_query", feature="f") as span:
+            span.add(rows=5)
+            raise ValueError("timeout")
+
+    stage, = registry.report()["stages"]
+    assert stage["stage"] == "feature_query"
+    assert stage["labels"] == {"feature": "f"}
+    assert stage["calls"] == 2
+    assert stage["errors"] == 1
+    assert stage["counters"] == {"rows": 15, "bytes": 80}
+    assert stage["peak_rss_mb"] > 0
+
+
+def test_span_records_peak_inside_stage():
+    registry = Metrics(enabled=True)
+    with registry.span("spill"):
+        block = np.ones(64 * 2 ** 20 // 8)
+        time.sleep(0.1)
+        del block
+
+    stage, = registry.report()["stages"]
+    assert stage["peak_rss_growth_mb"] >= 48
+
+
+def test_run_keeps_request_histograms():
+    registry = Metrics(enabled=True)
+    registry.observe_request("score", "POST", 200, 0.1)
+    with registry.span("feature_query"):
+        pass
+
+    with registry.run():
+        assert registry.report()["stages"] == []
+    assert registry.requests[("score", "POST", "200")].count == 1
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 1), ("1", 3), ("+Inf", 4)]
+    assert histogram.sum == pytest.approx(4.25)
+
+
+def test_prometheus_text_format():
+    registry = Metrics(enabled=True)
+    with registry.span("feature_query", feature='a"b') as span:
+        span.add(rows=3)
+    registry.observe_request("score", "POST", 200, 0.02)
+
+    text = registry.render_prometheus()
+    assert "# TYPE pipeline_stage_seconds histogram" in text
+    assert 'pipeline_stage_rows_total{stage="feature_query",feature="a\\"b"} 3' in text
+    assert 'pipeline_stage_seconds_count{stage="feature_query",feature="a\\"b"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="score",method="POST",status="200",le="0.025"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="score",method="POST",status="200",le="+Inf"} 1' in text
+    assert "# TYPE pipeline_stage_peak_rss_bytes gauge" in text
+    assert "process_peak_resident_memory_bytes " in text
+
+
+def test_run_writes_report(tmp_path):
+    registry = Metrics(enabled=True)
+    path = tmp_path / "run" / "metrics.json"
+    with registry.run(str(path)):
+        with registry.span("generate_features"):
+            pass
+    report = json.loads(path.read_text(encoding="utf-8"))
+    assert [stage["stage"] for stage in report["stages"]] == ["generate_features"]
+
+
+def test_feature_batch_counts_rows_and_bytes(monkeypatch):
+    registry = Metrics(enabled=True)
+    monkeypatch.setattr("feature.metrics", registry)
+    feature = Feature("f", "SELECT * FROM t WHERE id IN ({values})")
+    select = MagicMock(return_value=pd.DataFrame({"customer_mindbox_id": [1, 2], "f": [0.5, 1.5]}))
+
+    feature.calculate_batch(pd.DataFrame({"customer_mindbox_id": [1, 2, 3]}), select)
+
+    stage, = registry.report()["stages"]
+    assert stage["labels"] == {"feature": "f"}
+    assert stage["counters"]["batches"] == 1
+    assert stage["counters"]["ids"] == 3
+    assert stage["counters"]["rows"] == 2
+    assert stage["counters"]["bytes"] > 0
+    assert stage["counters"]["query_bytes"] == len("SELECT * FROM t WHERE id IN (1, 2, 3)")
+
+
+def test_module_metrics_disabled_by_default():
+    assert metrics.enabled is False
\ No newline at end of file
@@ -0,0 +1,149 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from jobs import JobQueue, JobQueueFull
+
+
+def fake_score(ids):
+    ids = np.asarray(ids)
+    predictions = pd.DataFrame({"Predicted Probability": ids / 1000, "Predicted Class": (ids > 500).astype(int)},
+                               index=pd.Index(ids, name="customer_mindbox_id"))
+    return predictions
+
+
+def test_job_is_processed_in_chunks(tmp_path):
+    calls = []
+
+    def score(ids):
+        calls.append(len(ids))
+        return fake_score(ids)
+
+    queue = JobQueue(tmp_path, score, chunk_size=2)
+    job_id = queue.submit(np.array([100, 600, 300, 900, 200]))
+    queue.pool.shutdown(wait=True)
+
+    assert calls == [2, 2, 1]
+    status = queue.status(job_id)
+    assert status["status"] == "done"
+    assert status["progress"] == 1.0
+    result = pd.read_csv(queue.result_path(job_id))
+    assert list(result["customer_mindbox_id"]) == [100, 600, 300, 900, 200]
+    assert list(result["Predicted Class"]) == [0, 1, 0, 1, 0]
+
+
+def test_failed_job_records_error(tmp_path):
+    def score(ids):
+        raise RuntimeError("snapshot missing")
+
+    queue = JobQueue(tmp_path, score)
+    job_id = queue.submit(np.array([1, 2]))
+    queue.pool.shutdown(wait=True)
+
+    status = queue.status(job_id)
+    assert status["status"] == "failed"
+    assert status["error"] == "snapshot missing"
+    assert queue.status("unknown") is None
+
+
+def test_unfinished_job_resumes_after_restart(tmp_path):
+    crashed = {"done": False}
+
+    def crashing_score(ids):
+        if 300 in ids:
+            crashed["done"] = True
+            raise SystemExit  # имитация остановки процесса посреди задания
+        return fake_score(ids)
+
+    queue = JobQueue(tmp_path, crashing_score, chunk_size=2)
+    job_id = queue.submit(np.array([100, 200, 300, 400]))
+    queue.pool.shutdown(wait=True)
+    assert crashed["done"]
+    assert queue.status(job_id)["status"] == "running"
+    assert queue.status(job_id)["processed"] == 2
+
+    assert not queue.result_path(job_id).exists()
+    part, = tmp_path.glob(f"{job_id}.*.part")
+    # Незафиксированный хвост результата отбрасывается при продолжении
+    with open(part, "ab") as result:
+        result.write(b"300,0.3,0\n")
+
+    calls = []
+
+    def score(ids):
+        calls.append(list(ids))
+        return fake_score(ids)
+
+    # Аренда упавшего процесса истекла (lease_seconds=0)
+    restarted = JobQueue(tmp_path, score, chunk_size=2, lease_seconds=0)
+    restarted.close()
+
+    assert calls == [[300, 400]]
+    assert restarted.status(job_id)["status"] == "done"
+    result = pd.read_csv(restarted.result_path(job_id))
+    assert list(result["customer_mindbox_id"]) == [100, 200, 300, 400]
+    assert list(tmp_path.glob("*.part")) == []
+
+
+def test_queue_rejects_jobs_over_limit(tmp_path):
+    queue = JobQueue(tmp_path, fake_score, max_pending=1)
+    queue.pool.shutdown(wait=True)  # задания не выполняются и остаются в очереди
+    queue.pool.submit = lambda *args: None
+    queue.submit(np.array([1]))
+    with pytest.raises(JobQueueFull):
+        queue.submit(np.array([2]))
+
+
+def test_job_is_claimed_by_one_process(tmp_path):
+    calls = []
+
+    def score(ids):
+        calls.append(list(ids))
+        return fake_score(ids)
+
+    # Два процесса с общей очередью; пулы остановлены, чтобы задание захватывалось только явно
+    first = JobQueue(tmp_path, score, chunk_size=2)
+    second = JobQueue(tmp_path, score, chunk_size=2)
+    first.close()
+    second.close()
+    job_id = first.submit(np.array([100, 200, 300]))
+
+    assert first.claim(job_id) == (0, 0, None)
+    assert second.claim(job_id) is None
+    second.run(job_id)
+    assert calls == []
+    assert first.status(job_id)["status"] == "running"
+
+
+def test_running_job_with_live_lease_is_not_resumed(tmp_path):
+    queue = JobQueue(tmp_path, fake_score, chunk_size=2)
+    queue.close()
+    with queue.connect() as connection:
+        connection.execute(
+            "INSERT INTO jobs (job_id, status, total, created_at, owner, heartbeat_at) "
+            "VALUES ('live', 'running', 2, '2025-01-01 00:00:00', 'other:1', ?)", (time.time(),))
+    np.save(queue.input_path("live"), np.array([1, 2]))
+
+    restarted = JobQueue(tmp_path, fake_score, chunk_size=2)
+    restarted.close()
+
+    assert restarted.status("live")["processed"] == 0
+    assert not restarted.result_path("live").exists()
+
+
+def test_worker_that_lost_its_lease_does_not_touch_the_result(tmp_path):
+    stale = JobQueue(tmp_path, fake_score, chunk_size=2, lease_seconds=0)
+    current = JobQueue(tmp_path, fake_score, chunk_size=2, lease_seconds=0)
+    stale.close()
+    current.close()
+    job_id = stale.submit(np.array([100, 200, 300]))
+
+    stale_claim = stale.claim(job_id)
+    time.sleep(0.01)  # аренда stale истекла (lease_seconds=0)
+    current.execute(job_id, *current.claim(job_id))
+    stale.execute(job_id, *stale_claim)
+
+    assert current.status(job_id)["status"] == "done"
+    result = pd.read_csv(current.result_path(job_id))
+    assert list(result["customer_mindbox_id"]) == [100, 200, 300]
+    assert list(tmp_path.glob("*.part")) == []
\ No newline at end of file
@@ -59,4 +59,41 @@ def test_model_save_and_load(tmp_path):
     assert os.path.exists(model_path)
 
     loaded_model = Model.load_model(str(model_path))
-    assert isinstance(loaded_model, GradientBoostingClassifier)
\ No newline at end of file
+    assert isinstance(loaded_model, GradientBoostingClassifier)
+
+@pytest.fixture
+def larger_data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(400, 3)), columns=["f1", "f2", "f3"])
+    y = pd.Series((X["f1"] + rng.normal(scale=0.3, size=len(X)) > 0).astype(int))
+    X.loc[::10, "f2"] = np.nan
+    return X, y
+
+
+@pytest.mark.parametrize("engine", ["hist_gradient_boosting", "lightgbm"])
+def test_histogram_engines_handle_missing_values(larger_data, engine, tmp_path):
+    X, y = larger_data
+    params = {"max_iter": 200} if engine == "hist_gradient_boosting" else {"n_estimators": 200, "early_stopping_rounds": 5}
+    model = Model(params, engine=engine)
+    model.train(X, y)
+
+    predictions = model.predict(X)
+    assert predictions["Predicted Probability"].between(0, 1).all()
+    assert model.evaluate(X, y)["ROC AUC"] > 0.8
+
+    path = tmp_path / "model.pkl"
+    model.save_model(str(path))
+    loaded = Model.load_model(str(path))
+    np.testing.assert_allclose(loaded.predict_proba(X)[:, 1], predictions["Predicted Probability"])
+
+
+def test_early_stopping_limits_iterations(larger_data):
+    X, y = larger_data
+    model = Model({"max_iter": 1000}, engine="hist_gradient_boosting")
+    model.train(X, y)
+    assert model.model.n_iter_ < 1000
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        Model({}, engine="xgboost")
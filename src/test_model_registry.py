@@ -0,0 +1,107 @@
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from model import COMPILED_MAX_ROWS, Model
+from model_registry import MissingArtifactError, ModelRegistry
+from preprocessing import DataPreprocessor
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    y = (X["a"] > 0).astype(int)
+    for version, n_estimators in (("model_v1", 5), ("model_v2", 10)):
+        model = Model({"n_estimators": n_estimators})
+        model.train(X, y)
+        model.save_model(str(tmp_path / f"{version}.pkl"))
+    return tmp_path
+
+
+def test_metadata_is_registered_lazily(models_dir):
+    registry = ModelRegistry(models_dir)
+    assert registry.versions() == ["model_v1", "model_v2"]
+    assert not (models_dir / "model_v1.json").exists()
+
+    metadata = registry.metadata("model_v1")
+    assert metadata["features"] == ["a", "b", "c"]
+    assert len(metadata["sha256"]) == 64
+    assert (models_dir / "model_v1.json").exists()
+    assert (models_dir / "model_v1.compiled" / "value.npy").exists()
+
+
+def test_get_loads_current_version_with_memory_mapped_tables(models_dir):
+    registry = ModelRegistry(models_dir)
+    registry.register("model_v1", trained_at="2025-01-01T00:00:00")
+    registry.register("model_v2", trained_at="2024-01-01T00:00:00")
+
+    model = registry.get()
+    assert model.version == "model_v1"
+    assert isinstance(model.compiled.value, np.memmap)
+    assert isinstance(model.compiled.children, np.memmap)
+    assert isinstance(model.compiled.node_threshold, np.memmap)
+    assert registry.get() is model
+
+
+def test_activate_swaps_model_for_other_processes(models_dir):
+    serving = ModelRegistry(models_dir, check_interval=0)
+    serving.activate("model_v1")
+    old = serving.get()
+
+    ModelRegistry(models_dir).activate("model_v2")
+    new = serving.get()
+    assert new.version == "model_v2"
+    assert old.version == "model_v1"  # запросы со старой моделью дорабатывают на ней
+
+
+def test_checksum_mismatch_is_rejected(models_dir):
+    registry = ModelRegistry(models_dir)
+    registry.register("model_v1")
+    with open(models_dir / "model_v1.pkl", "ab") as f:
+        f.write(b"tampered")
+    with pytest.raises(ValueError):
+        registry.load("model_v1")
+
+
+def test_compiled_model_unpickles_only_for_large_batches(models_dir, monkeypatch):
+    registry = ModelRegistry(models_dir)
+    registry.register("model_v1")
+    expected = Model.load_model(str(models_dir / "model_v1.pkl"))
+    loads = []
+    monkeypatch.setattr(Model, "load_model", staticmethod(lambda path: loads.append(path) or expected))
+
+    model = registry.load("model_v1")
+    X = pd.DataFrame(np.random.default_rng(1).normal(size=(COMPILED_MAX_ROWS * 4, 3)), columns=["a", "b", "c"])
+    small = X.head(COMPILED_MAX_ROWS)
+
+    np.testing.assert_allclose(model.predict_proba(small), expected.predict_proba(small)[:, 1], atol=1e-12)
+    assert loads == [] and model.estimator is None
+    np.testing.assert_allclose(model.predict_proba(X), expected.predict_proba(X)[:, 1])
+    model.predict_proba(X)
+    assert loads == [str(models_dir / "model_v1.pkl")]
+
+
+def test_missing_compiled_ensemble_is_built_on_load(models_dir):
+    registry = ModelRegistry(models_dir)
+    registry.register("model_v1")
+    shutil.rmtree(models_dir / "model_v1.compiled")
+
+    model = registry.load("model_v1")
+
+    assert (models_dir / "model_v1.compiled" / "children.npy").exists()
+    assert model.compiled is not None and model.estimator is None
+
+
+def test_preprocessor_is_registered_with_model_features(models_dir):
+    registry = ModelRegistry(models_dir)
+    X = pd.DataFrame(np.random.default_rng(2).normal(size=(50, 4)), columns=["a", "b", "c", "d"])
+    with pytest.raises(MissingArtifactError):
+        registry.load_preprocessor("model_v1")
+    with pytest.raises(ValueError):
+        registry.register("model_v1", preprocessor=DataPreprocessor().fit(X))
+
+    registry.register("model_v1", preprocessor=DataPreprocessor().fit(X, columns=["a", "b", "c"]))
+
+    assert registry.load_preprocessor("model_v1").columns == ["a", "b", "c"]
\ No newline at end of file
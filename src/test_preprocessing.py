@@ -50,4 +50,47 @@ def test_scale_features(sample_df):
 def test_full_preprocess(sample_df):
     dp = DataPreprocessor()
     df_processed = dp.preprocess(sample_df.copy())
-    assert not df_processed.isnull().values.any()
\ No newline at end of file
+    assert not df_processed.isnull().values.any()
+
+def test_fit_transform_matches_batch_preprocessing(sample_df):
+    dp = DataPreprocessor(fill_strategy="zero").fit(sample_df)
+    expected = DataPreprocessor(fill_strategy="zero").preprocess(sample_df.copy())
+    transformed = dp.preprocess(sample_df.copy())
+    assert dp.columns == ["days_since_last_purchase", "days_since_last_redemption",
+                          "purchase_sum_restore", "bonuses_spisanie"]
+    assert transformed.dtypes.eq(np.float32).all()
+    np.testing.assert_allclose(transformed.to_numpy(), expected[dp.columns].to_numpy(), rtol=1e-5, atol=1e-6)
+
+
+def test_transform_does_not_depend_on_batch(sample_df):
+    dp = DataPreprocessor(fill_strategy="mean").fit(sample_df)
+    full = dp.transform(sample_df)
+    single = dp.transform(sample_df.iloc[[1]].replace(np.nan, np.inf))
+    np.testing.assert_array_equal(single.to_numpy(), full.iloc[[1]].to_numpy())
+
+
+def test_save_and_load_roundtrip(sample_df, tmp_path):
+    path = tmp_path / "preprocessor.json"
+    dp = DataPreprocessor(fill_strategy="median").fit(sample_df)
+    dp.save(path)
+    loaded = DataPreprocessor.load(path)
+    assert loaded.is_fitted
+    assert loaded.fill_strategy == "median"
+    pd.testing.assert_frame_equal(loaded.transform(sample_df), dp.transform(sample_df))
+
+
+def test_scale_features_keeps_compact_dtypes():
+    df = pd.DataFrame({
+        "customer_mindbox_id": [1, 2, 3],
+        "purchase_count": np.array([1, 2, 4], dtype="int16"),
+        "purchase_sum": np.array([10.0, 20.0, 35.0], dtype="float32"),
+        "bonuses_balance": [1.0, 2.0, 3.0],
+    })
+
+    result = DataPreprocessor().scale_features(df)
+
+    assert result["purchase_count"].dtype == np.float32
+    assert result["purchase_sum"].dtype == np.float32
+    assert result["bonuses_balance"].dtype == np.float64
+    assert result["customer_mindbox_id"].dtype == np.int64
+    assert abs(float(result["purchase_count"].mean())) < 1e-6
\ No newline at end of file
@@ -0,0 +1,136 @@
+import time
+from datetime import date
+import pandas as pd
+import pytest
+from multiprocessing import get_context
+from sqlalchemy import create_engine
+from connection import DEFAULT_QUERY_CACHE_TTL, DatabaseConnection, cache_from_env
+from query_cache import QueryCache, normalize_sql, referenced_tables
+
+
+def make_result():
+    return pd.DataFrame({"customer_mindbox_id": [1, 2, 3], "shop": pd.Categorical(["a", "b", "a"])})
+
+
+def test_normalize_sql_keeps_literals():
+    sql = "SELECT  *\n  FROM dbo_mb.orders -- комментарий\n WHERE shop = 'a  b';"
+    assert normalize_sql(sql) == "SELECT * FROM dbo_mb.orders WHERE shop = 'a  b'"
+    assert QueryCache.key(sql) == QueryCache.key("SELECT * FROM dbo_mb.orders WHERE shop = 'a  b'")
+    assert QueryCache.key(sql) != QueryCache.key(sql, {"shop": "category"})
+
+
+def test_referenced_tables():
+    sql = "WITH p AS (SELECT * FROM [dbo_mb].[orders] o JOIN dbo_mb.orders_return r ON 1 = 1) SELECT * FROM p"
+    assert referenced_tables(sql) == ["dbo_mb.orders", "dbo_mb.orders_return", "p"]
+
+
+def test_put_and_get_roundtrip(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    df = make_result()
+    assert cache.get("SELECT * FROM t") is None
+    assert cache.put("SELECT * FROM t", df)
+
+    pd.testing.assert_frame_equal(cache.get("SELECT *\nFROM t"), df)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 1
+
+
+def test_ttl_expires_entries(tmp_path, monkeypatch):
+    cache = QueryCache(str(tmp_path), ttl=60)
+    cache.put("SELECT * FROM t", make_result())
+    now = time.time()
+    monkeypatch.setattr("query_cache.time.time", lambda: now + 120)
+
+    assert cache.get("SELECT * FROM t") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path, monkeypatch):
+    cache = QueryCache(str(tmp_path))
+    clock = iter(range(1_000, 2_000))
+    monkeypatch.setattr("query_cache.time.time", lambda: next(clock))
+    for table in ("a", "b", "c"):
+        cache.put(f"SELECT * FROM {table}", make_result())
+    cache.get("SELECT * FROM a")
+
+    cache.max_bytes = cache.stats()["bytes"] * 2 // 3
+    assert cache.evict() == 1
+    assert cache.get("SELECT * FROM b") is None
+    assert cache.get("SELECT * FROM a") is not None
+    assert cache.get("SELECT * FROM c") is not None
+
+
+def test_invalidate_by_table(tmp_path):
+    cache = QueryCache(str(tmp_path))
+    cache.put("SELECT * FROM dbo_mb.orders o JOIN dbo_mb.orders_return r ON 1 = 1", make_result())
+    cache.put("SELECT * FROM dbo_mb.balance_change", make_result())
+
+    assert cache.invalidate("orders_return") == 1
+    assert cache.get("SELECT * FROM dbo_mb.balance_change") is not None
+    assert cache.stats()["entries"] == 1
+
+
+def put_from_process(directory, i):
+    cache = QueryCache(directory, max_bytes=10 ** 9)
+    for j in range(10):
+        cache.put(f"SELECT * FROM t WHERE id IN ({j})", make_result())
+        assert cache.get(f"SELECT * FROM t WHERE id IN ({j})") is not None
+
+
+def test_concurrent_processes(tmp_path):
+    context = get_context("spawn")
+    processes = [context.Process(target=put_from_process, args=(str(tmp_path), i)) for i in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    cache = QueryCache(str(tmp_path))
+    assert cache.stats()["entries"] == 10
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+@pytest.fixture
+def cached_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    pd.DataFrame({"customer_mindbox_id": [1, 2, 3], "price": [10, 20, 30]}).to_sql("orders", engine, index=False)
+    return DatabaseConnection(engine=engine, cache=QueryCache(str(tmp_path / "cache")))
+
+
+def test_select_uses_cache(cached_db):
+    first = cached_db.select("SELECT * FROM orders")
+    with cached_db.engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE orders SET price = 0")
+
+    pd.testing.assert_frame_equal(cached_db.select("SELECT * FROM orders"), first)
+    assert cached_db.select("SELECT * FROM orders", use_cache=False)["price"].sum() == 0
+    cached_db.cache.invalidate("orders")
+    assert cached_db.select("SELECT * FROM orders")["price"].sum() == 0
+
+
+def test_select_skips_cache_for_shipped_ids(cached_db):
+    with cached_db.ship_ids([1, 3]) as id_query:
+        result = cached_db.select(f"SELECT * FROM orders WHERE customer_mindbox_id IN ({id_query})")
+
+    assert len(result) == 2
+    assert cached_db.cache.stats()["entries"] == 0
+
+
+def test_key_of_time_dependent_query_changes_daily():
+    sql = "SELECT customer_mindbox_id, DATEDIFF(DAY, MAX(action_datetime), GETDATE()) AS days FROM dbo_mb.orders"
+    static = "SELECT customer_mindbox_id FROM dbo_mb.orders"
+
+    assert QueryCache.key(sql, today=date(2025, 1, 1)) != QueryCache.key(sql, today=date(2025, 1, 2))
+    assert QueryCache.key(sql, today=date(2025, 1, 1)) == QueryCache.key(sql, today=date(2025, 1, 1))
+    assert QueryCache.key(static, today=date(2025, 1, 1)) == QueryCache.key(static, today=date(2025, 1, 2))
+
+
+def test_cache_from_env_defaults_to_finite_ttl(tmp_path, monkeypatch):
+    monkeypatch.setenv("QUERY_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("QUERY_CACHE_TTL", raising=False)
+    assert cache_from_env().ttl == DEFAULT_QUERY_CACHE_TTL
+
+    monkeypatch.setenv("QUERY_CACHE_TTL", "0")
+    assert cache_from_env().ttl is None
\ No newline at end of file
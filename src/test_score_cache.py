@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+from score_cache import ScoreCache
+
+
+def make_predictions(ids):
+    predictions = pd.DataFrame({
+        "row": range(len(ids)),
+        "Predicted Probability": [customer_id / 1000 for customer_id in ids],
+        "Predicted Class": [int(customer_id > 500) for customer_id in ids],
+    }, index=pd.Index(ids, name="customer_mindbox_id"))
+    return predictions
+
+
+def test_hits_and_misses():
+    cache = ScoreCache()
+    cache.put_many(make_predictions([1, 2]), "m1", "s1")
+    hits, missing = cache.get_many([2, 3, 1], "m1", "s1")
+    assert sorted(hits.index) == [1, 2]
+    assert hits.loc[2, "Predicted Probability"] == 0.002
+    assert list(missing) == [3]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = ScoreCache(max_entries=2)
+    cache.put_many(make_predictions([1, 2]), "m1", "s1")
+    cache.get_many([1], "m1", "s1")
+    cache.put_many(make_predictions([3]), "m1", "s1")
+    _, missing = cache.get_many([1, 2, 3], "m1", "s1")
+    assert list(missing) == [2]
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.parametrize("model_version, snapshot_version", [("m2", "s1"), ("m1", "s2")])
+def test_version_change_invalidates(tmp_path, model_version, snapshot_version):
+    cache = ScoreCache(disk_path=str(tmp_path / "scores.sqlite3"))
+    cache.put_many(make_predictions([1]), "m1", "s1")
+    _, missing = cache.get_many([1], model_version, snapshot_version)
+    assert list(missing) == [1]
+    _, missing = cache.get_many([1], "m1", "s1")
+    assert list(missing) == [1]
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "scores.sqlite3")
+    ScoreCache(disk_path=path).put_many(make_predictions([7, 900]), "m1", "s1")
+
+    cache = ScoreCache(disk_path=path)
+    hits, missing = cache.get_many([900, 7, 8], "m1", "s1")
+    assert hits.loc[900, "Predicted Class"] == 1
+    assert list(missing) == [8]
+    assert cache.stats()["disk_hits"] == 2
+    cache.get_many([900], "m1", "s1")
+    assert cache.stats()["hits"] == 1
\ No newline at end of file
@@ -0,0 +1,108 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from model import Model
+from tree_engine import CompiledEnsemble, WORK_ARRAYS
+
+
+@pytest.fixture
+def trained():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(500, 4)), columns=["a", "b", "c", "d"])
+    y = (X["a"] + X["b"] * X["c"] > 0).astype(int)
+    model = GradientBoostingClassifier(n_estimators=30, max_depth=4, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_matches_sklearn_probabilities(trained):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_reorders_columns_and_chunks(trained):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    expected = model.predict_proba(X)[:, 1]
+    shuffled = X[["d", "c", "b", "a"]]
+    np.testing.assert_allclose(compiled.raw_predict(shuffled, chunk_size=7), compiled.raw_predict(X))
+    np.testing.assert_allclose(compiled.predict_proba(shuffled)[:, 1], expected, atol=1e-12)
+
+
+def test_threshold_ties_follow_sklearn(trained):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    thresholds = model.estimators_[0, 0].tree_.threshold
+    ties = pd.DataFrame(np.repeat(thresholds[thresholds != -2][:, None], 4, axis=1), columns=X.columns)
+    np.testing.assert_allclose(compiled.predict_proba(ties), model.predict_proba(ties), atol=1e-12)
+
+
+def test_rejects_missing_values(trained):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    X = X.copy()
+    X.iloc[0, 0] = np.nan
+    with pytest.raises(ValueError):
+        compiled.predict_proba(X)
+
+
+def test_model_predict_uses_compiled_ensemble(trained):
+    model, X = trained
+    wrapper = Model({})
+    wrapper.model = model
+    expected = wrapper.predict(X)
+    wrapper.compile()
+    pd.testing.assert_frame_equal(wrapper.predict(X), expected, atol=1e-12)
+
+def test_large_batches_fall_back_to_sklearn(trained, monkeypatch):
+    model, X = trained
+    wrapper = Model({})
+    wrapper.model = model
+    wrapper.compile(max_rows=10)
+    monkeypatch.setattr(wrapper.compiled, "predict_proba", lambda X: pytest.fail("compiled used"))
+    assert len(wrapper.predict(X)) == len(X)
+
+
+def test_hist_gradient_boosting_with_missing_values():
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.normal(size=(500, 3)), columns=["a", "b", "c"])
+    y = ((X["a"] > 0) ^ (X["b"] > 0.5)).astype(int)
+    X.loc[::7, "a"] = np.nan
+    model = Model({"max_iter": 30, "early_stopping": False}, engine="hist_gradient_boosting")
+    model.train(X, y)
+
+    compiled = CompiledEnsemble.from_sklearn(model.model)
+    X.loc[::5, "c"] = np.nan  # пропуски в признаке, где их не было при обучении
+    np.testing.assert_allclose(compiled.predict_proba(X), model.model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_saved_tables_are_used_without_copies(trained, tmp_path):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    compiled.save(str(tmp_path / "ensemble"))
+
+    loaded = CompiledEnsemble.load(str(tmp_path / "ensemble"))
+
+    assert all(isinstance(getattr(loaded, name), np.memmap) for name in WORK_ARRAYS)
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+def test_loads_directories_with_node_tables(trained, tmp_path):
+    model, X = trained
+    compiled = CompiledEnsemble.from_sklearn(model)
+    path = tmp_path / "legacy"
+    path.mkdir()
+    nodes = {"feature": np.where(compiled.children[0::2] == np.arange(len(compiled.value)), -1, compiled.node_feature),
+             "threshold": compiled.node_threshold.astype(np.float64), "left": compiled.children[0::2],
+             "right": compiled.children[1::2], "missing_go_to_left": compiled.missing_go_to_left,
+             "value": compiled.value, "roots": compiled.roots}
+    for name, values in nodes.items():
+        np.save(path / f"{name}.npy", values)
+    (path / "meta.json").write_text(json.dumps({"init": compiled.init, "depth": compiled.depth,
+                                                "feature_names": compiled.feature_names}), encoding="utf-8")
+
+    loaded = CompiledEnsemble.load(str(path))
+
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
\ No newline at end of file
@@ -0,0 +1,74 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from model import Model
+from tuning import MISSING_BIN, HyperparameterSearch, bin_dataset, sample_configs
+
+SPACE = {"n_estimators": ("int", 5, 20), "max_depth": ("int", 1, 3), "learning_rate": ("log", 0.05, 0.3)}
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(300, 3)), columns=["a", "b", "c"])
+    y = pd.Series((X["a"] + rng.normal(scale=0.5, size=len(X)) > 0).astype(int))
+    X.loc[::9, "b"] = np.nan
+    return X, y
+
+
+def test_sample_configs_respects_space():
+    configs = sample_configs(SPACE, 10, seed=1)
+    assert len(configs) == 10
+    assert all(5 <= config["n_estimators"] <= 20 and 0.05 <= config["learning_rate"] <= 0.3 for config in configs)
+    assert configs == sample_configs(SPACE, 10, seed=1)
+
+
+def test_bin_dataset_is_cached(data, tmp_path):
+    X, y = data
+    path = bin_dataset(X, y, str(tmp_path))
+    codes = np.load(path / "X.npy")
+    assert codes.dtype == np.uint8
+    assert (codes[::9, 1] == MISSING_BIN).all()
+    assert bin_dataset(X, y, str(tmp_path)) == path
+
+
+def test_search_writes_best_params_and_resumes(data, tmp_path):
+    X, y = data
+    search = HyperparameterSearch(tmp_path, space=SPACE, n_configs=4, eta=2, min_fraction=0.5, cv=2, max_workers=2)
+    result = search.run(X, y)
+
+    trials = search.trials_path.read_text().splitlines()
+    assert len(trials) == 4 + 2
+    assert result["params"] in json.loads((tmp_path / "configs.json").read_text())["configs"]
+    assert 0.5 < result["cv"]["roc_auc"] <= 1.0
+    assert result["cv"]["fraction"] == 1.0
+
+    model = Model.from_params_file(str(search.best_params_path))
+    assert model.model.n_estimators == result["params"]["n_estimators"]
+
+    # Прерванный поиск: последние пробы потеряны, одна строка недописана
+    search.trials_path.write_text("\n".join(trials[:3]) + '\n{"config_id": 3, "ru')
+    resumed = HyperparameterSearch(tmp_path, space=SPACE, n_configs=4, eta=2, min_fraction=0.5, cv=2, max_workers=2)
+    assert resumed.run(X, y)["params"] == result["params"]
+    assert len(resumed.completed_trials()) == 6
+
+
+def test_search_refuses_to_resume_with_other_data_or_engine(data, tmp_path):
+    X, y = data
+    HyperparameterSearch(tmp_path, space=SPACE, n_configs=2, eta=2, min_fraction=0.5, cv=2, max_workers=1).run(X, y)
+
+    with pytest.raises(ValueError, match="другим данным"):
+        HyperparameterSearch(tmp_path, space=SPACE, n_configs=2, eta=2, min_fraction=0.5, cv=2,
+                             max_workers=1).run(X.iloc[:200], y.iloc[:200])
+    with pytest.raises(ValueError, match="другим данным"):
+        HyperparameterSearch(tmp_path, engine="hist_gradient_boosting", n_configs=2, eta=2, min_fraction=0.5,
+                             cv=2, max_workers=1).run(X, y)
+
+
+def test_search_rejects_classes_smaller_than_cv(data, tmp_path):
+    X, y = data
+    y = pd.Series(0, index=y.index)
+    y.iloc[:2] = 1
+    with pytest.raises(ValueError, match="3-фолдовой"):
+        HyperparameterSearch(tmp_path, space=SPACE, cv=3).run(X, y)
\ No newline at end of file
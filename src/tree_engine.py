@@ -0,0 +1,304 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional, Union
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+
+LEAF = -1
+# Исходные таблицы узлов (формат каталогов, сохраненных до появления рабочих таблиц)
+NODE_ARRAYS = ("feature", "threshold", "left", "right", "missing_go_to_left", "value", "roots")
+# Рабочие таблицы обхода — сохраняются и открываются через memory-map без копирования
+WORK_ARRAYS = ("node_feature", "node_threshold", "children", "missing_go_to_left", "value", "roots")
+
+
+class CompiledEnsemble:
+    def __init__(self, node_feature: np.ndarray, node_threshold: np.ndarray, children: np.ndarray,
+                 missing_go_to_left: np.ndarray, value: np.ndarray, roots: np.ndarray, init: float, depth: int,
+                 feature_names: Optional[List[str]] = None, allow_missing: bool = False,
+                 input_dtype: str = "float32") -> None:
+        """
+        Ансамбль деревьев бинарной классификации в виде плоских таблиц узлов.
+
+        Узлы всех деревьев лежат в общих массивах, ссылки на детей — глобальные индексы.
+        Листья ссылаются сами на себя, поэтому обход любой строки занимает ровно depth шагов.
+        Таблицы используются как есть (в том числе memory-mapped из load), без копий,
+        поэтому процессы, загрузившие один каталог, делят одну копию в page cache.
+
+        :param node_feature: Индекс признака узла (0 для листа).
+        :param node_threshold: Порог узла в типе входа: x <= threshold — влево.
+        :param children: Дети вперемешку: children[2 * node] — левый, children[2 * node + 1] — правый.
+        :param missing_go_to_left: 1, если пропуск (NaN) идет влево.
+        :param value: Значение листа, уже умноженное на learning_rate.
+        :param roots: Индекс корня каждого дерева.
+        :param init: Начальное значение логита.
+        :param depth: Максимальная глубина деревьев.
+        :param feature_names: Порядок признаков модели.
+        :param allow_missing: Разрешены ли NaN во входных данных.
+        :param input_dtype: Тип, в котором исходная модель сравнивает признаки с порогами
+            (float32 у GradientBoosting, float64 у HistGradientBoosting).
+        """
+        self.node_feature = node_feature
+        self.node_threshold = node_threshold
+        self.children = children
+        self.missing_go_to_left = missing_go_to_left
+        self.value = value
+        self.roots = roots
+        self.init = init
+        self.depth = depth
+        self.feature_names = feature_names
+        self.allow_missing = allow_missing
+        self.input_dtype = input_dtype
+
+    @classmethod
+    def from_nodes(cls, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                   missing_go_to_left: np.ndarray, value: np.ndarray, roots: np.ndarray, init: float, depth: int,
+                   feature_names: Optional[List[str]] = None, allow_missing: bool = False,
+                   input_dtype: str = "float32") -> "CompiledEnsemble":
+        """
+        Строит рабочие таблицы обхода из исходных таблиц узлов.
+
+        :param feature: Индекс признака узла (LEAF для листа).
+        :param threshold: Порог узла (float64).
+        :param left: Индекс левого ребенка.
+        :param right: Индекс правого ребенка.
+        :param missing_go_to_left: 1, если пропуск (NaN) идет влево.
+        :param value: Значение листа.
+        :param roots: Индекс корня каждого дерева.
+        :param init: Начальное значение логита.
+        :param depth: Максимальная глубина деревьев.
+        :param feature_names: Порядок признаков модели.
+        :param allow_missing: Разрешены ли NaN во входных данных.
+        :param input_dtype: Тип сравнения признаков с порогами.
+        :return: Скомпилированный ансамбль.
+        """
+        children = np.empty(2 * len(left), dtype=np.int32)
+        children[0::2] = left
+        children[1::2] = right
+        # float32-пороги округлены вниз, чтобы x <= threshold совпадало со сравнением в float64
+        if input_dtype == "float32":
+            node_threshold = np.asarray(threshold).astype(np.float32)
+            rounded_up = node_threshold.astype(np.float64) > threshold
+            node_threshold[rounded_up] = np.nextafter(node_threshold[rounded_up], np.float32(-np.inf))
+        else:
+            node_threshold = np.array(threshold, dtype=np.float64)
+        return cls(
+            node_feature=np.maximum(feature, 0).astype(np.int32),
+            node_threshold=node_threshold,
+            children=children,
+            missing_go_to_left=np.asarray(missing_go_to_left, dtype=np.uint8),
+            value=np.asarray(value, dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            init=init,
+            depth=depth,
+            feature_names=feature_names,
+            allow_missing=allow_missing,
+            input_dtype=input_dtype,
+        )
+
+    @property
+    def n_trees(self) -> int:
+        """
+        :return: Количество деревьев в ансамбле.
+        """
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model: Union[GradientBoostingClassifier, HistGradientBoostingClassifier]) -> "CompiledEnsemble":
+        """
+        Компилирует обученный GradientBoostingClassifier или HistGradientBoostingClassifier
+        (бинарный, log_loss).
+
+        :param model: Обученная модель.
+        :return: Скомпилированный ансамбль.
+        """
+        if isinstance(model, HistGradientBoostingClassifier):
+            return cls.from_hist(model)
+        if not isinstance(model, GradientBoostingClassifier):
+            raise ValueError(f"Компиляция {type(model).__name__} не поддерживается")
+        if model.estimators_.shape[1] != 1 or model.loss != "log_loss":
+            raise ValueError("Поддерживается только бинарная классификация с log_loss")
+
+        n_features = model.n_features_in_
+        if model.init_ == "zero":
+            init = 0.0
+        else:
+            eps = np.finfo(np.float32).eps
+            proba = np.clip(model.init_.predict_proba(np.zeros((1, n_features)))[0, 1], eps, 1 - eps)
+            init = float(np.log(proba / (1 - proba)))
+
+        trees = [estimator.tree_ for estimator in model.estimators_[:, 0]]
+        return cls.from_trees(
+            [(tree.feature, tree.threshold, tree.children_left, tree.children_right,
+              np.zeros(tree.node_count, dtype=np.uint8), tree.value[:, 0, 0] * model.learning_rate)
+             for tree in trees],
+            init=init,
+            feature_names=list(getattr(model, "feature_names_in_", [])) or None,
+        )
+
+    @classmethod
+    def from_hist(cls, model: HistGradientBoostingClassifier) -> "CompiledEnsemble":
+        """
+        Компилирует обученный HistGradientBoostingClassifier (бинарный, без категориальных признаков).
+        Листья гистограммного бустинга уже содержат learning_rate, пропуски идут по missing_go_to_left.
+
+        :param model: Обученная модель.
+        :return: Скомпилированный ансамбль.
+        """
+        if model.n_trees_per_iteration_ != 1:
+            raise ValueError("Поддерживается только бинарная классификация")
+        trees = []
+        for (predictor,) in model._predictors:
+            nodes = predictor.nodes
+            if nodes["is_categorical"].any():
+                raise ValueError("Категориальные признаки не поддерживаются")
+            is_leaf = nodes["is_leaf"].astype(bool)
+            trees.append((
+                np.where(is_leaf, LEAF, nodes["feature_idx"]),
+                nodes["num_threshold"],
+                np.where(is_leaf, -1, nodes["left"]),
+                np.where(is_leaf, -1, nodes["right"]),
+                nodes["missing_go_to_left"],
+                nodes["value"],
+            ))
+        return cls.from_trees(
+            trees,
+            init=float(np.ravel(model._baseline_prediction)[0]),
+            feature_names=list(getattr(model, "feature_names_in_", [])) or None,
+            allow_missing=True,
+            input_dtype="float64",
+        )
+
+    @classmethod
+    def from_trees(cls, trees: list, init: float, feature_names: Optional[List[str]] = None,
+                   allow_missing: bool = False, input_dtype: str = "float32") -> "CompiledEnsemble":
+        """
+        Собирает плоские таблицы из таблиц отдельных деревьев.
+
+        :param trees: Список кортежей (feature, threshold, left, right, missing_go_to_left, value) с
+            локальными индексами детей (отрицательный индекс — лист).
+        :param init: Начальное значение логита.
+        :param feature_names: Порядок признаков модели.
+        :param allow_missing: Разрешены ли NaN во входных данных.
+        :param input_dtype: Тип сравнения признаков с порогами.
+        :return: Скомпилированный ансамбль.
+        """
+        sizes = np.array([len(tree[0]) for tree in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        feature, threshold, left, right, missing_go_to_left, value = (
+            np.concatenate(parts) for parts in zip(*trees)
+        )
+        feature = feature.astype(np.int32)
+        node_offsets = np.repeat(offsets, sizes)
+        own = np.arange(len(feature), dtype=np.int64)
+        is_leaf = (left < 0) | (feature < 0)
+        left = np.where(is_leaf, own, left + node_offsets).astype(np.int32)
+        right = np.where(is_leaf, own, right + node_offsets).astype(np.int32)
+        feature[is_leaf] = LEAF
+        value = np.where(is_leaf, value, 0.0).astype(np.float64)
+
+        # Глубина — число переходов от корня до самого глубокого листа
+        depth = np.zeros(len(feature), dtype=np.int64)
+        for node in range(len(feature)):
+            if not is_leaf[node]:
+                depth[left[node]] = depth[node] + 1
+                depth[right[node]] = depth[node] + 1
+
+        return cls.from_nodes(
+            feature=feature,
+            threshold=threshold.astype(np.float64),
+            left=left,
+            right=right,
+            missing_go_to_left=missing_go_to_left.astype(np.uint8),
+            value=value,
+            roots=offsets.astype(np.int32),
+            init=float(init),
+            depth=int(depth.max()) if len(depth) else 0,
+            feature_names=feature_names,
+            allow_missing=allow_missing,
+            input_dtype=input_dtype,
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Сохраняет рабочие таблицы в каталог: по файлу .npy на массив и meta.json.
+        Каталог подменяется атомарно.
+
+        :param path: Каталог ансамбля.
+        """
+        path = Path(path)
+        tmp_dir = path.with_name(path.name + f".tmp{os.getpid()}")
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name in WORK_ARRAYS:
+            np.save(tmp_dir / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"init": self.init, "depth": self.depth, "feature_names": self.feature_names,
+                       "allow_missing": self.allow_missing, "input_dtype": self.input_dtype}, f, ensure_ascii=False)
+        try:
+            os.replace(tmp_dir, path)
+        except OSError:
+            # Ансамбль уже сохранил другой процесс
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "CompiledEnsemble":
+        """
+        Загружает ансамбль, сохраненный save. Рабочие таблицы открываются через memory-map
+        и используются без копирования, поэтому несколько процессов делят одну копию в page cache.
+        Каталоги старого формата (исходные таблицы узлов) пересчитываются в память процесса.
+
+        :param path: Каталог ансамбля.
+        :param mmap_mode: Режим memory-map (None — читать в память).
+        :return: Скомпилированный ансамбль.
+        """
+        path = Path(path)
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if not (path / "children.npy").exists():
+            arrays = {name: np.load(path / f"{name}.npy") for name in NODE_ARRAYS}
+            return cls.from_nodes(**arrays, **meta)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode) for name in WORK_ARRAYS}
+        return cls(**arrays, **meta)
+
+    def raw_predict(self, X: Union[pd.DataFrame, np.ndarray], chunk_size: int = 65536) -> np.ndarray:
+        """
+        Считает логиты векторизованным обходом всех деревьев сразу.
+
+        :param X: Матрица признаков (DataFrame переупорядочивается по feature_names).
+        :param chunk_size: Максимум пар (строка, дерево) в одном проходе — ограничивает память.
+        :return: Массив логитов.
+        """
+        if isinstance(X, pd.DataFrame):
+            X = X[self.feature_names] if self.feature_names else X
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        if not self.allow_missing and not np.isfinite(X).all():
+            raise ValueError("Входные данные содержат NaN или inf")
+
+        n_features = X.shape[1]
+        raw = np.empty(len(X), dtype=np.float64)
+        rows_per_chunk = max(1, chunk_size // max(self.n_trees, 1))
+        for start in range(0, len(X), rows_per_chunk):
+            chunk = X[start:start + rows_per_chunk]
+            flat = chunk.ravel()
+            row_offsets = (np.arange(len(chunk), dtype=np.int32) * n_features)[:, None]
+            nodes = np.broadcast_to(self.roots, (len(chunk), self.n_trees)).copy()
+            for _ in range(self.depth):
+                x = flat.take(row_offsets + self.node_feature.take(nodes))
+                go_right = x > self.node_threshold.take(nodes)
+                if self.allow_missing:
+                    go_right ^= np.isnan(x) & ~self.missing_go_to_left.take(nodes).astype(bool)
+                nodes = self.children.take(2 * nodes + go_right)
+            raw[start:start + len(chunk)] = self.value.take(nodes).sum(axis=1)
+        return raw + self.init
+
+    def predict_proba(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+        """
+        Вероятности классов, как у sklearn predict_proba.
+
+        :param X: Матрица признаков.
+        :return: Массив формы (n, 2).
+        """
+        proba = 1.0 / (1.0 + np.exp(-self.raw_predict(X)))
+        return np.column_stack([1.0 - proba, proba])
\ No newline at end of file
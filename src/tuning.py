@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+from model import create_estimator
+
+MISSING_BIN = 255
+
+# Пространства поиска: ("int" | "float" | "log", нижняя граница, верхняя граница)
+SEARCH_SPACES: Dict[str, Dict[str, Tuple[str, float, float]]] = {
+    "gradient_boosting": {
+        "n_estimators": ("int", 50, 300),
+        "max_depth": ("int", 3, 10),
+        "learning_rate": ("log", 0.01, 0.2),
+        "subsample": ("float", 0.6, 1.0),
+        "min_samples_split": ("int", 2, 10),
+        "min_samples_leaf": ("int", 1, 5),
+    },
+    "hist_gradient_boosting": {
+        "max_iter": ("int", 100, 1000),
+        "learning_rate": ("log", 0.01, 0.3),
+        "max_leaf_nodes": ("int", 8, 128),
+        "min_samples_leaf": ("int", 10, 200),
+        "l2_regularization": ("log", 1e-4, 10.0),
+    },
+    "lightgbm": {
+        "n_estimators": ("int", 100, 1000),
+        "learning_rate": ("log", 0.01, 0.3),
+        "num_leaves": ("int", 8, 128),
+        "min_child_samples": ("int", 10, 200),
+        "subsample": ("float", 0.6, 1.0),
+        "subsample_freq": ("int", 1, 1),
+        "colsample_bytree": ("float", 0.6, 1.0),
+    },
+}
+
+
+def sample_configs(space: Dict[str, Tuple[str, float, float]], n_configs: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Случайно выбирает конфигурации из пространства поиска.
+
+    :param space: Пространство поиска.
+    :param n_configs: Количество конфигураций.
+    :param seed: Seed генератора.
+    :return: Список словарей гиперпараметров.
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_configs):
+        params = {}
+        for name, (kind, low, high) in space.items():
+            if kind == "int":
+                params[name] = int(rng.integers(low, high + 1))
+            elif kind == "log":
+                params[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+            else:
+                params[name] = float(rng.uniform(low, high))
+        configs.append(params)
+    return configs
+
+
+def bin_dataset(X: pd.DataFrame, y: pd.Series, cache_dir: str, max_bins: int = 255) -> Path:
+    """
+    Переводит признаки в коды квантильных бинов (uint8) и кэширует результат на диске.
+    Деревьям важен только порядок значений, поэтому обучение на кодах близко к обучению
+    на исходных данных, а разбиения ищутся среди max_bins значений вместо всех уникальных.
+    Пропуски получают отдельный код MISSING_BIN.
+
+    :param X: Матрица признаков.
+    :param y: Целевая переменная.
+    :param cache_dir: Каталог кэша.
+    :param max_bins: Максимум бинов на признак (не больше 255).
+    :return: Каталог с X.npy, y.npy и meta.json для этого набора данных.
+    """
+    values = X.to_numpy(dtype=np.float64)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(column) for column in X.columns]).encode())
+    digest.update(np.ascontiguousarray(values).tobytes())
+    digest.update(np.ascontiguousarray(y.to_numpy()).tobytes())
+    path = Path(cache_dir) / f"binned_{digest.hexdigest()[:16]}"
+    if (path / "meta.json").exists():
+        return path
+
+    codes = np.full(values.shape, MISSING_BIN, dtype=np.uint8)
+    edges = []
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        present = ~np.isnan(column)
+        column_edges = np.unique(np.quantile(column[present], np.linspace(0, 1, min(max_bins, MISSING_BIN) + 1)[1:-1])) \
+            if present.any() else np.array([])
+        codes[present, j] = np.searchsorted(column_edges, column[present], side="right")
+        edges.append(column_edges.tolist())
+
+    tmp_path = path.with_name(path.name + f".tmp{os.getpid()}")
+    tmp_path.mkdir(parents=True, exist_ok=True)
+    np.save(tmp_path / "X.npy", codes)
+    np.save(tmp_path / "y.npy", y.to_numpy().astype(np.int8))
+    with open(tmp_path / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"columns": [str(column) for column in X.columns], "edges": edges}, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def evaluate_trial(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Кросс-валидация одной конфигурации на доле строк (выполняется в процессе пула).
+
+    :param task: Словарь: dataset, engine, config_id, rung, fraction, params, cv, seed.
+    :return: Результат пробы: task без dataset плюс roc_auc, roc_auc_std, seconds.
+    """
+    start = time.perf_counter()
+    X = np.load(Path(task["dataset"]) / "X.npy", mmap_mode="r")
+    y = np.load(Path(task["dataset"]) / "y.npy", mmap_mode="r")
+
+    rng = np.random.default_rng(task["seed"])
+    rows = []
+    for label in (0, 1):
+        label_rows = np.flatnonzero(y == label)
+        size = min(len(label_rows), max(task["cv"], int(round(len(label_rows) * task["fraction"]))))
+        rows.append(rng.choice(label_rows, size=size, replace=False))
+    rows = np.sort(np.concatenate(rows))
+    X_rung, y_rung = np.asarray(X[rows]), np.asarray(y[rows])
+
+    scores = []
+    folds = StratifiedKFold(n_splits=task["cv"], shuffle=True, random_state=task["seed"])
+    for train_idx, test_idx in folds.split(X_rung, y_rung):
+        estimator = create_estimator(task["engine"], task["params"])
+        estimator.fit(X_rung[train_idx], y_rung[train_idx])
+        scores.append(roc_auc_score(y_rung[test_idx], estimator.predict_proba(X_rung[test_idx])[:, 1]))
+
+    result = {key: value for key, value in task.items() if key != "dataset"}
+    result.update(roc_auc=float(np.mean(scores)), roc_auc_std=float(np.std(scores)),
+                  seconds=time.perf_counter() - start)
+    return result
+
+
+class HyperparameterSearch:
+    def __init__(self, output_dir: str, engine: str = "gradient_boosting",
+                 space: Optional[Dict[str, Tuple[str, float, float]]] = None, n_configs: int = 27, eta: int = 3,
+                 min_fraction: float = 1 / 9, cv: int = 3, max_workers: Optional[int] = None, seed: int = 42) -> None:
+        """
+        Поиск гиперпараметров методом последовательного деления (successive halving).
+
+        На первом шаге все n_configs конфигураций проверяются кросс-валидацией на min_fraction строк,
+        на каждом следующем остается лучшая 1/eta часть, а доля строк растет в eta раз, пока не
+        дойдет до всех данных. Пробы одного шага выполняются в пуле процессов. Каждая завершенная
+        проба дописывается в trials.jsonl, поэтому прерванный поиск продолжается с того же места.
+
+        :param output_dir: Каталог поиска (пробы, кэш данных, best_params.json).
+        :param engine: Движок Model.
+        :param space: Пространство поиска (по умолчанию SEARCH_SPACES[engine]).
+        :param n_configs: Количество конфигураций на первом шаге.
+        :param eta: Во сколько раз сокращается число конфигураций на каждом шаге.
+        :param min_fraction: Доля строк на первом шаге.
+        :param cv: Количество фолдов.
+        :param max_workers: Размер пула процессов.
+        :param seed: Seed выбора конфигураций и фолдов.
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.engine = engine
+        self.space = space or SEARCH_SPACES[engine]
+        self.n_configs = n_configs
+        self.eta = eta
+        self.min_fraction = min_fraction
+        self.cv = cv
+        self.max_workers = max_workers
+        self.seed = seed
+        self.trials_path = self.output_dir / "trials.jsonl"
+        self.best_params_path = self.output_dir / "best_params.json"
+
+    def fingerprint(self, dataset: Path) -> str:
+        """
+        Отпечаток поиска: набор данных (хэш из bin_dataset), движок, пространство и параметры
+        деления. Продолжать можно только поиск с тем же отпечатком.
+
+        :param dataset: Каталог набора данных из bin_dataset.
+        :return: Хэш в hex.
+        """
+        settings = {"dataset": dataset.name, "engine": self.engine, "space": self.space, "n_configs": self.n_configs,
+                    "eta": self.eta, "min_fraction": self.min_fraction, "cv": self.cv, "seed": self.seed}
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+
+    def configs(self, fingerprint: str) -> List[Dict[str, Any]]:
+        """
+        Конфигурации поиска. Сохраняются при первом запуске вместе с отпечатком, чтобы продолжение
+        использовало те же. Каталог с поиском по другим данным или параметрам не продолжается.
+
+        :param fingerprint: Отпечаток поиска (см. fingerprint).
+        :return: Список словарей гиперпараметров.
+        """
+        path = self.output_dir / "configs.json"
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if not isinstance(saved, dict) or saved.get("fingerprint") != fingerprint:
+                raise ValueError(f"В {self.output_dir} сохранен поиск по другим данным, движку или пространству; "
+                                 f"укажите другой output_dir или удалите configs.json и trials.jsonl")
+            return saved["configs"]
+        configs = sample_configs(self.space, self.n_configs, self.seed)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "configs": configs}, f, ensure_ascii=False, indent=2)
+        return configs
+
+    def completed_trials(self) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """
+        :return: Уже завершенные пробы по ключу (config_id, rung).
+        """
+        trials = {}
+        if self.trials_path.exists():
+            with open(self.trials_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        trial = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # строка, недописанная при прерывании
+                    trials[(trial["config_id"], trial["rung"])] = trial
+        return trials
+
+    def rungs(self) -> List[float]:
+        """
+        :return: Доля строк на каждом шаге.
+        """
+        fractions = [self.min_fraction]
+        while fractions[-1] < 1.0:
+            fractions.append(min(1.0, fractions[-1] * self.eta))
+        return fractions
+
+    def run(self, X: pd.DataFrame, y: pd.Series) -> Dict[str, Any]:
+        """
+        Выполняет (или продолжает) поиск и записывает best_params.json.
+
+        :param X: Матрица признаков.
+        :param y: Целевая переменная (0/1).
+        :return: Содержимое best_params.json.
+        """
+        class_counts = y.value_counts()
+        if len(class_counts) != 2 or class_counts.min() < self.cv:
+            raise ValueError(f"Для {self.cv}-фолдовой кросс-валидации нужны оба класса по крайней мере "
+                             f"по {self.cv} строк, получено {class_counts.to_dict()}")
+        dataset = bin_dataset(X, y, str(self.output_dir / "cache"))
+        configs = self.configs(self.fingerprint(dataset))
+        trials = self.completed_trials()
+        survivors = list(range(len(configs)))
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool, \
+                open(self.trials_path, "a", encoding="utf-8") as log:
+            if log.tell() and not self.trials_path.read_bytes().endswith(b"\n"):
+                log.write("\n")  # недописанная при прерывании строка не должна склеиться со следующей
+            for rung, fraction in enumerate(self.rungs()):
+                tasks = [
+                    {"dataset": str(dataset), "engine": self.engine, "config_id": config_id, "rung": rung,
+                     "fraction": fraction, "params": configs[config_id], "cv": self.cv, "seed": self.seed}
+                    for config_id in survivors if (config_id, rung) not in trials
+                ]
+                for result in pool.map(evaluate_trial, tasks):
+                    trials[(result["config_id"], rung)] = result
+                    log.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    log.flush()
+
+                ranked = sorted(survivors, key=lambda config_id: trials[(config_id, rung)]["roc_auc"], reverse=True)
+                if fraction >= 1.0 or len(ranked) == 1:
+                    break
+                survivors = ranked[:max(1, len(ranked) // self.eta)]
+
+        best = trials[(ranked[0], rung)]
+        result = {
+            "engine": self.engine,
+            "params": best["params"],
+            "cv": {
+                "roc_auc": best["roc_auc"],
+                "roc_auc_std": best["roc_auc_std"],
+                "folds": self.cv,
+                "fraction": best["fraction"],
+                "rows": int(len(y)),
+            },
+            "trials": len(trials),
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        tmp_path = self.best_params_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.best_params_path)
+        return result
\ No newline at end of file